@@ -0,0 +1,75 @@
+"""
+Compare the readout of all correlation sensors after each sample with the readout of the rows covering the network
+only, including the decoding on the host.
+
+Requires a connection to a BrainScaleS-2 chip.
+"""
+
+import argparse
+import importlib
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pyhxcomm_vx as hxcomm
+
+from strobe.backend import StrobeBackend, LayerSize
+
+# calibrations are managed per setup and targets by the Yin-Yang experiment
+sys.path.append(str(Path(__file__).resolve().parent.parent / "yinyang"))
+from calibrate import get_wafer_calibration  # noqa: E402
+
+
+def measure(backend, inputs, n_samples, repetitions):
+    backend.run(inputs, n_samples=n_samples)
+    start = time.time()
+    for _ in range(repetitions):
+        backend.run(inputs, n_samples=n_samples)
+    return (time.time() - start) / repetitions / len(inputs)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-w", "--wafer", type=int, default=69)
+    parser.add_argument("-f", "--fpga", type=int, default=3)
+    parser.add_argument("-t", "--target", default="yy", help="Module containing `targets` and `calibration_file`.")
+    parser.add_argument("--n-inputs", type=int, default=20)
+    parser.add_argument("--n-hidden", type=int, default=120)
+    parser.add_argument("--n-output", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--n-samples", type=int, default=20)
+    parser.add_argument("--sample-separation", type=float, default=500e-6)
+    parser.add_argument("--repetitions", type=int, default=10)
+    parser.add_argument("--ppu-program", type=Path, default=Path.home() / "workspace/bin/strobe.bin")
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+
+    target = importlib.import_module(args.target)
+    calibration = get_wafer_calibration(target.calibration_file, args.wafer, args.fpga, target.targets)
+
+    with hxcomm.ManagedConnection() as connection:
+        structure = [args.n_inputs, LayerSize(args.n_hidden), LayerSize(args.n_output)]
+        backend = StrobeBackend(
+                connection, structure, calibration, sample_separation=args.sample_separation,
+                measure_correlation=True)
+        backend.configure()
+        backend.load_ppu_program(str(args.ppu_program))
+
+        rng = np.random.default_rng(1234)
+        backend.write_weights(
+                rng.integers(-63, 64, (args.n_inputs, args.n_hidden)),
+                rng.integers(-63, 64, (args.n_hidden, args.n_output)))
+
+        inputs = []
+        for b in range(args.batch_size):
+            times = np.sort(rng.uniform(0, 20e-6, args.n_inputs))
+            inputs.append(np.stack([times, np.arange(args.n_inputs) + 256], axis=1))
+
+        for readout in ("all", "network"):
+            backend.set_correlation_readout(readout)
+            duration = measure(backend, inputs, args.n_samples, args.repetitions)
+            print(f"{readout:>8}: {duration * 1e3:8.3f} ms per sample, {len(backend.correlation_rows):4d} rows")
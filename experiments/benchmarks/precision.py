@@ -0,0 +1,83 @@
+"""
+Compare runtime and memory footprint of software simulations in different precisions.
+"""
+
+import argparse
+import time
+
+import torch
+
+from strobe.base import Precision
+from strobe.lif import LIFLayer, LILayer
+from strobe.projections import Linear
+from strobe.spikes import SpikeTimesToDense
+
+params = {"tau_mem": 6e-6, "tau_syn": 6e-6}
+time_step = 1.7e-6
+
+policies = {
+    "float32": Precision(),
+    "float32/uint8": Precision(torch.float32, torch.uint8),
+    "bfloat16/uint8": Precision(torch.bfloat16, torch.uint8),
+    "float16/uint8": Precision(torch.float16, torch.uint8),
+}
+
+
+def build(n_input, n_hidden, n_output, precision):
+    torch.manual_seed(0)
+    layers = [
+        Linear(n_input, n_hidden), LIFLayer(n_hidden, params),
+        Linear(n_hidden, n_output), LILayer(n_output, params)]
+    for layer in layers:
+        layer.time_step = time_step
+        layer.precision = precision
+    return torch.nn.Sequential(*layers)
+
+
+def benchmark(args, name, precision):
+    model = build(args.n_input, args.n_hidden, args.n_output, precision).to(args.device)
+    encode = SpikeTimesToDense(time_step, args.n_steps, dtype=precision.spikes)
+
+    times = torch.rand(args.batch_size, args.n_input, device=args.device) * time_step * args.n_steps * 2
+    x = encode(times)
+
+    if args.device == "cuda":
+        torch.cuda.reset_peak_memory_stats()
+
+    start = time.time()
+    for _ in range(args.repetitions):
+        model.zero_grad()
+        y = model(x)
+        y.float().max(dim=1)[0].sum().backward()
+    if args.device == "cuda":
+        torch.cuda.synchronize()
+    duration = (time.time() - start) / args.repetitions
+
+    state_bytes = x.element_size() * x.nelement()
+    for layer in model:
+        for tensor in (getattr(layer, "traces", None), getattr(layer, "spikes", None)):
+            if tensor is not None:
+                state_bytes += tensor.element_size() * tensor.nelement()
+
+    report = f"{name:>16}: {duration * 1e3:8.1f} ms/iteration, {state_bytes / 2**20:8.1f} MiB recorded state"
+    if args.device == "cuda":
+        report += f", {torch.cuda.max_memory_allocated() / 2**20:8.1f} MiB peak"
+    print(report)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--n-steps", type=int, default=200)
+    parser.add_argument("--n-input", type=int, default=256)
+    parser.add_argument("--n-hidden", type=int, default=246)
+    parser.add_argument("--n-output", type=int, default=10)
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    for name, precision in policies.items():
+        benchmark(args, name, precision)
@@ -0,0 +1,66 @@
+"""
+Compare the split of recorded spikes into samples and layers against the former mask-based implementation for
+growing hardware batches.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from strobe.spikes import dissect_spikes
+
+
+def masked_dissection(raw_spikes, hw_batch_size, sample_separation, boundaries):
+    """Former implementation, masking all spikes for every sample and layer."""
+
+    spikes = [[] for l in range(len(boundaries) - 1)]
+    for b in range(hw_batch_size):
+        b_begin = b * sample_separation
+        b_end = (b + 1) * sample_separation
+        mask = (raw_spikes[:, 0] > b_begin) & (raw_spikes[:, 0] < b_end)
+        dissected_spikes = raw_spikes[mask, :]
+        for l in range(len(boundaries) - 1):
+            layer_mask = (dissected_spikes[:, 1] >= boundaries[l]) & (dissected_spikes[:, 1] < boundaries[l + 1])
+            s = dissected_spikes[layer_mask, :]
+            s[:, 0] -= b_begin
+            s[:, 1] -= boundaries[l]
+            spikes[l].append(s)
+    return spikes
+
+
+def measure(function, repetitions):
+    function()
+    start = time.time()
+    for _ in range(repetitions):
+        function()
+    return (time.time() - start) / repetitions
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[10, 40, 160, 640])
+    parser.add_argument("--spikes-per-sample", type=int, default=100)
+    parser.add_argument("--sample-separation", type=float, default=500e-6)
+    parser.add_argument("--repetitions", type=int, default=10)
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    boundaries = np.array([0, 243, 246])
+    random = np.random.default_rng(1234)
+
+    for hw_batch_size in args.batch_sizes:
+        n_spikes = hw_batch_size * args.spikes_per_sample
+        times = np.sort(random.uniform(0, hw_batch_size * args.sample_separation, n_spikes))
+        labels = random.integers(0, boundaries[-1], n_spikes).astype(float)
+        raw_spikes = np.stack([times, labels], axis=1)
+
+        masked = measure(
+                lambda: masked_dissection(raw_spikes, hw_batch_size, args.sample_separation, boundaries),
+                args.repetitions)
+        sorted_ = measure(
+                lambda: dissect_spikes(raw_spikes, hw_batch_size, args.sample_separation, boundaries),
+                args.repetitions)
+        print(f"{hw_batch_size:6d} samples: masked {masked * 1e3:8.2f} ms, sorted {sorted_ * 1e3:8.2f} ms")
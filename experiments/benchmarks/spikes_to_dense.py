@@ -0,0 +1,75 @@
+"""
+Compare the conversion of spike times to dense matrices against the former meshgrid-based implementation
+on batches of 16x16 pixel (MNIST) images.
+"""
+
+import argparse
+import time
+
+import torch
+
+from strobe.spikes import PixelsToSpikeTimes, SpikeTimesToDense
+
+
+def meshgrid_to_dense(x, time_step, size):
+    """Former implementation, materializing index tensors for all input dimensions."""
+
+    bins = (x / time_step).long()
+    n_time_steps_tmp = max(size, int(bins.max()) + 1)
+
+    dense = torch.zeros((x.shape[0], n_time_steps_tmp, *x.shape[1:]), device=x.device)
+    mesh = torch.meshgrid([torch.arange(s, device=x.device) for s in x.shape], indexing="ij")
+    slc = (mesh[0], ) + (bins, ) + mesh[1:]
+    dense[slc] = 1
+    return dense[:, :size]
+
+
+def measure(function, times, repetitions, device):
+    function(times)
+    if device == "cuda":
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+
+    start = time.time()
+    for _ in range(repetitions):
+        result = function(times)
+    if device == "cuda":
+        torch.cuda.synchronize()
+    duration = (time.time() - start) / repetitions
+
+    report = f"{duration * 1e3:8.2f} ms"
+    if device == "cuda":
+        report += f", {torch.cuda.max_memory_allocated() / 2**20:8.1f} MiB peak"
+    return report, result
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--n-steps", type=int, default=100)
+    parser.add_argument("--repetitions", type=int, default=20)
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+
+    t_max = 1.0
+    time_step = t_max / args.n_steps
+    pixels = torch.rand(args.batch_size, 1, 16, 16, device=args.device)
+    times = PixelsToSpikeTimes(t_max=t_max)(pixels)
+
+    report, reference = measure(
+            lambda x: meshgrid_to_dense(x, time_step, args.n_steps), times, args.repetitions, args.device)
+    print(f"{'meshgrid':>16}: {report}")
+
+    for name, dtype, sparse in (
+            ("float32", torch.float32, False), ("uint8", torch.uint8, False), ("bool", torch.bool, False),
+            ("sparse", torch.float32, True)):
+        encoder = SpikeTimesToDense(time_step, args.n_steps, dtype=dtype, sparse=sparse)
+        report, result = measure(encoder, times, args.repetitions, args.device)
+        if sparse:
+            result = result.to_dense()
+        assert torch.equal(result.float(), reference)
+        print(f"{name:>16}: {report}")
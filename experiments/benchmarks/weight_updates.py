@@ -0,0 +1,80 @@
+"""
+Compare full synapse array writes with writes of the changed synapse rows only.
+
+Requires a connection to a BrainScaleS-2 chip.
+"""
+
+import argparse
+import importlib
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pyhxcomm_vx as hxcomm
+
+from strobe.backend import StrobeBackend, LayerSize
+
+# calibrations are managed per setup and targets by the Yin-Yang experiment
+sys.path.append(str(Path(__file__).resolve().parent.parent / "yinyang"))
+from calibrate import get_wafer_calibration  # noqa: E402
+
+# 6 bit weight and 6 bit label per synapse, 256 synapses per row
+ROW_PAYLOAD_BYTES = 256 * 12 // 8
+
+
+def measure(backend, weights, dirty_rows_only, repetitions):
+    durations = []
+    for _ in range(repetitions):
+        # change a single weight to trigger a write
+        weights[0][0, 0] = 63 - weights[0][0, 0]
+        start = time.time()
+        backend.write_weights(*weights, dirty_rows_only=dirty_rows_only)
+        durations.append(time.time() - start)
+    return np.mean(durations), backend.written_synapse_rows
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-w", "--wafer", type=int, default=69)
+    parser.add_argument("-f", "--fpga", type=int, default=3)
+    parser.add_argument("-t", "--target", default="yy", help="Module containing `targets` and `calibration_file`.")
+    parser.add_argument("--n-hidden", type=int, default=246)
+    parser.add_argument("--n-output", type=int, default=10)
+    parser.add_argument("--changed-inputs", type=int, nargs="+", default=[1, 8, 64, 256])
+    parser.add_argument("--repetitions", type=int, default=10)
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+
+    target = importlib.import_module(args.target)
+    calibration = get_wafer_calibration(target.calibration_file, args.wafer, args.fpga, target.targets)
+
+    with hxcomm.ManagedConnection() as connection:
+        structure = [256, LayerSize(args.n_hidden), LayerSize(args.n_output)]
+        backend = StrobeBackend(connection, structure, calibration)
+        backend.configure()
+
+        rng = np.random.default_rng(1234)
+        weights = [
+                rng.integers(-63, 64, (256, args.n_hidden)),
+                rng.integers(-63, 64, (args.n_hidden, args.n_output))]
+        backend.write_weights(*weights)
+
+        duration, rows = measure(backend, weights, False, args.repetitions)
+        print(f"{'full':>12}: {duration * 1e3:8.2f} ms, {rows:4d} rows, {rows * ROW_PAYLOAD_BYTES:6d} bytes")
+
+        for changed in args.changed_inputs:
+            durations = []
+            for _ in range(args.repetitions):
+                # emulate an optimizer step modifying the weights of some inputs
+                inputs = rng.choice(256, changed, replace=False)
+                weights[0][inputs, :] = rng.integers(-63, 64, (changed, args.n_hidden))
+                start = time.time()
+                backend.write_weights(*weights)
+                durations.append(time.time() - start)
+            rows = backend.written_synapse_rows
+            print(f"{changed:>5} inputs: {np.mean(durations) * 1e3:8.2f} ms, {rows:4d} rows, "
+                  f"{rows * ROW_PAYLOAD_BYTES:6d} bytes")
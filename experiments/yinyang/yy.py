@@ -11,6 +11,8 @@ from torch.utils.tensorboard import SummaryWriter
 from numba import njit
 import argparse
 
+from strobe.spikes import SpikeTrains
+
 test_correlation = True
 
 n_input: int = 2 if test_correlation else 5
@@ -364,7 +366,7 @@ def run_n_times(
     import pyhxcomm_vx as hxcomm
     from functools import partial
     from strobe.datasets.yinyang import YinYangDataset
-    from strobe.backend import FPGA_MEMORY_SIZE, StrobeBackend, LayerSize
+    from strobe.backend import StrobeBackend, LayerSize
 
     synapse_bias: int = 1000
     # fix seed
@@ -445,9 +447,9 @@ def run_n_times(
             train_loader = torch.utils.data.DataLoader(data_train, batch_size=batch_size, shuffle=True)
             test_loader = torch.utils.data.DataLoader(data_test, batch_size=len(data_test), shuffle=False)
 
-            max_hw_batch_size = int(np.floor(FPGA_MEMORY_SIZE / n_steps / backend._n_vectors / 128))
-            max_hw_batch_size //= 16
-            print(f"Max batch size: {max_hw_batch_size}")
+            hw_batch_plan = backend.plan_hw_batch(n_steps // interpolation, madc_rec != SampleMADC.off)
+            max_hw_batch_size = hw_batch_plan.size
+            print(f"Max batch size: {max_hw_batch_size} ({hw_batch_plan.duration * 1e3:.1f} ms on chip)")
 
             m_output = np.zeros_like(weights_output)
             v_output = np.zeros_like(weights_output)
@@ -544,6 +546,12 @@ def forward(
     dataset_size = len(data_loader.dataset)
     batch_size = data_loader.batch_size
     batches_per_epoch = dataset_size // batch_size
+
+    # membrane traces are only evaluated by the potential classifier, otherwise spikes suffice
+    record_traces = classifier == Classifier.potential
+    if not record_traces:
+        max_hw_batch_size = backend.plan_hw_batch(
+            n_steps // interpolation, madc_rec != SampleMADC.off, record_traces=False).size
     hw_batch_size = min(batch_size, max_hw_batch_size)
     hw_batch_bounds = np.arange(0, batch_size, hw_batch_size)
 
@@ -587,7 +595,6 @@ def forward(
 
     for batch_idx, (batch_x, batch_y) in enumerate(data_loader):
 
-        input_spikes = []
         hidden_spikes = []
         output_spikes = []
 
@@ -613,35 +620,44 @@ def forward(
         c_all[:] =  batch_y
         y_all[np.arange(batch_size), batch_y] = 1
 
-        for b in range(batch_size):
-            times = batch_x[b, :]
-            in_all[b, :] = times
-            times += input_shift
-            times = np.hstack(input_repetitions * [times])
-            order = np.argsort(times)
-            input_spikes.append(np.vstack([times[order], labels[order]]).T)
+        # encode the repeated inputs of the whole batch at once
+        in_all[:] = batch_x
+        times = np.tile(in_all + input_shift, input_repetitions).flatten()
+        samples = np.repeat(np.arange(batch_size), input_repetitions * n_input)
+        input_spikes = SpikeTrains.from_events(samples, times, np.tile(labels, batch_size), batch_size)
 
         backend.write_weights(*[w*hw_scale for w in weight_layers])
 
         traces_dev.fill(np.NaN)
         traces_hidden_dev.fill(np.NaN)
         traces_output_dev.fill(np.NaN)
-        for s in [slice(i, min(batch_size, i + hw_batch_size)) for i in hw_batch_bounds]:
+        hw_batches = [slice(i, min(batch_size, i + hw_batch_size)) for i in hw_batch_bounds]
+        run_kwargs = dict(
+                n_samples=n_steps // interpolation,
+                record_madc=madc_rec != SampleMADC.off,
+                trigger_reset=reset_cadc_each_sample,
+                record_traces=record_traces,)
+
+        t_start_b = time.time()
+        if madc_rec == SampleMADC.off:
+            # build and decode hardware batches while the chip executes the current one
+            results = backend.run_pipelined([input_spikes[s] for s in hw_batches], **run_kwargs)
+        else:
+            # MADC samples are only kept for the most recent run
+            results = (backend.run(input_spikes[s], **run_kwargs) for s in hw_batches)
+        t_backend += time.time() - t_start_b
+
+        for s, (spikes, membrane_traces, durations, causal_traces) in zip(hw_batches, results):
             # batch_durations = np.zeros((batch_size, 2))
             t_start_b = time.time()
-            for _ in range(5):
-                spikes, membrane_traces, durations, causal_traces = backend.run(
-                        input_spikes[s],
-                        n_samples=n_steps // interpolation,
-                        record_madc=madc_rec != SampleMADC.off,
-                        trigger_reset=reset_cadc_each_sample,)
+            for _ in range(4):
                 # batch_durations[:] = np.array(durations)
                 if not (np.array(durations) > 85200).any():
                     # print("Success!")
                     break
                 else:
                     print(f"Took too long! {np.max(durations)}")
-                    pass
+                    spikes, membrane_traces, durations, causal_traces = backend.run(input_spikes[s], **run_kwargs)
             t_backend += time.time() - t_start_b
 
             times_hidden = [b_tu[:, 0] - input_shift for b_tu in spikes[0]]
@@ -668,7 +684,8 @@ def forward(
                         for j in range(input_repetitions):
                             thd[b, j, :, :] = ct_hidden[j*n_input: (j+1)*n_input, :]
                         tod[b, ...] = ct_output
-                        tr[b, ...] = raw
+                        # only the rows covering the network are read out
+                        tr[b, backend.correlation_rows, :] = raw
                     else:
                         # Backend did not preprocess the correlation array
                         for j in range(input_repetitions):
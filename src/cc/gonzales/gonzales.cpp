@@ -116,6 +116,15 @@ cadc_tickets_type measure_correlation(PlaybackProgramBuilder& builder) {
 	return tickets;
 }
 
+cadc_tickets_type measure_correlation_rows(
+	PlaybackProgramBuilder& builder,
+	std::vector<CADCSampleRowOnDLS> const& rows) {
+	cadc_tickets_type tickets;
+	for(auto row : rows)
+		tickets.push_back(builder.read(row));
+	return tickets;
+}
+
 PYBIND11_MODULE(gonzales, m) {
 	py::module::import("pystadls_vx_v2");
 	m.def("generate_spiketrain", &generate_spiketrain, "Generate a playback program builder for inserting spikes.");
@@ -124,4 +133,5 @@ PYBIND11_MODULE(gonzales, m) {
 	m.def("get_fpga_memory_ticket", &get_fpga_memory_ticket, "Parse FPGA memoryPPUMemoryBlock into individual words of type uint8_t.");
 	m.def("reset_correlation", &reset_correlation, "Reset all correlation rows.");
 	m.def("measure_correlation", &measure_correlation, "Measure correlation for all synapses.");
+	m.def("measure_correlation_rows", &measure_correlation_rows, "Measure correlation for the given rows only.");
 }
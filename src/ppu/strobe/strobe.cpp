@@ -7,14 +7,18 @@
 
 using namespace libnux::vx::v2;
 
+// written by the host after starting the program, `n_ppus` last, i.e. it stays zero until the readout is configured
 volatile size_t ppu_id = 0;
-volatile size_t n_ppus = 1;
+volatile size_t n_ppus = 0;
 
 volatile size_t n_samples = 20;
 volatile size_t batch_offset = 0;
 volatile size_t duration;
 
-enum Command {RUN, NONE, HALT, RESET_BATCH, RUN_AND_RESET};
+// time base ticks per sample of the recording readout, paces the readout without recording
+volatile size_t sample_period = 0;
+
+enum Command {RUN, NONE, HALT, RESET_BATCH, RUN_AND_RESET, RUN_WITHOUT_RECORDING, RUN_WITHOUT_RECORDING_AND_RESET};
 volatile Command command = NONE;
 
 #define SYN_DEBUG_CUT 0
@@ -59,9 +63,24 @@ inline void reset() {
     );
 }
 
-void cadc_sampling_fast(size_t n_samples, size_t offset, bool trigger_reset) {
+void cadc_sampling_fast(size_t n_samples, size_t offset, bool trigger_reset, bool record = true) {
     uint32_t row = 0;
+    time_base_t begin = get_time_base();
     for(size_t sample=0; sample < n_samples; ++sample){
+        if(!record) {
+            // sample without writing the traces to the FPGA memory, which shortens the iteration, hence wait for
+            // the period of the recording readout to keep the timing of samples and reset unchanged
+            asm volatile(
+                "fxvinx %1, %[cadc_trigger_read], %[row_part_0]\n"
+                :
+                : [cadc_trigger_read] "b" (dls_acausal_base),
+                  [external_base] "b" (dls_extmem_base),
+                  [row_part_0] "r" (2*row + 0)
+                :
+            );
+            while(get_time_base() - begin < (sample + 1) * sample_period) {}
+            continue;
+        }
         asm volatile(
             "fxvinx %1, %[cadc_trigger_read], %[row_part_0]\n"
             "fxvoutx %1, %[external_base], %[sample_index]\n"
@@ -82,6 +101,17 @@ void cadc_sampling_fast(size_t n_samples, size_t offset, bool trigger_reset) {
 int start(void) {
     time_base_t start;
 
+    // wait for the host configuration, an unused PPU is halted right away
+    while(n_ppus == 0) {
+        if(command == HALT) return 0;
+    }
+
+    // measure the period of the recording readout, the traces written are overwritten by the first recording run
+    // and the period per sample does not depend on the number of samples set by the host later on
+    start = get_time_base();
+    cadc_sampling_fast(n_samples, 0, false);
+    sample_period = (get_time_base() - start) / n_samples;
+
     while(command != HALT){
         if(command == RESET_BATCH) {
 	        batch_offset = 0;
@@ -92,6 +122,7 @@ int start(void) {
             cadc_sampling_fast(n_samples, batch_offset, false);
             batch_offset++;
             duration = get_time_base() - start;
+            sample_period = duration / n_samples;
         }
         else if(command == RUN_AND_RESET) {
             command = NONE;
@@ -100,6 +131,18 @@ int start(void) {
             batch_offset++;
             duration = get_time_base() - start;
         }
+        else if(command == RUN_WITHOUT_RECORDING) {
+            command = NONE;
+            start = get_time_base();
+            cadc_sampling_fast(n_samples, batch_offset, false, false);
+            duration = get_time_base() - start;
+        }
+        else if(command == RUN_WITHOUT_RECORDING_AND_RESET) {
+            command = NONE;
+            start = get_time_base();
+            cadc_sampling_fast(n_samples, batch_offset, true, false);
+            duration = get_time_base() - start;
+        }
     }
     
     return 0;
@@ -12,6 +12,10 @@ class SuperSpike(torch.autograd.Function):
         defaults.update(kwargs)
         return [defaults["scale"]]
 
+    @staticmethod
+    def derivative(v: torch.Tensor, scale: float) -> torch.Tensor:
+        return 1.0/(scale*torch.abs(v) + 1.0)**2
+
     @staticmethod
     def forward(ctx, v: torch.Tensor, scale: float):
         ctx.scale = scale
@@ -23,6 +27,5 @@ class SuperSpike(torch.autograd.Function):
     def backward(ctx, grad_output):
         v, = ctx.saved_tensors
 
-        grad_input = grad_output.clone()
-        grad = grad_input/(ctx.scale*torch.abs(v) + 1.0)**2
+        grad = grad_output*SuperSpike.derivative(v, ctx.scale)
         return grad, None
@@ -0,0 +1,68 @@
+from typing import NamedTuple
+
+import numpy as np
+
+
+class RoutingAddresses(NamedTuple):
+    """
+    Event addresses of the neurons and their assignment to synapse rows, cf. `RoutingGenerator`.
+    """
+
+    neuron_addresses: np.ndarray
+    neuron_buses: np.ndarray
+    neuron_lookup: np.ndarray
+    driver_masks: np.ndarray
+    synapse_labels: np.ndarray
+    lookup: np.ndarray
+
+
+def routing_addresses(neuron_size: int = 1, signed_synapses: bool = False) -> RoutingAddresses:
+    """
+    Compute the event addresses of all sources and the source assigned to each synapse row. Does not depend on
+    the chip, hence it is shared by the routing and the emulation.
+
+    :param neuron_size: Number of neuron circuits forming a logical neuron.
+    :param signed_synapses: Pairs of synapse rows form signed synapses.
+    """
+
+    sources = np.arange(1024)
+    blocks = (sources // (32 // neuron_size)) % 8
+    sources_on_block = (sources - blocks * (32 // neuron_size)) % 256
+    neuron_buses = blocks % 4
+    unshifted_addresses = (sources_on_block % (32 // neuron_size) + (32 // neuron_size)
+                           * ((sources % 256) // (128 // neuron_size))) % 256
+    neuron_addresses = ((unshifted_addresses >> 2) + ((unshifted_addresses & 0b11) << 4)) << 2
+    neuron_addresses += 1*(sources // 256)
+
+    neuron_lookup = np.zeros((neuron_addresses.max() + 1, 4), dtype=int)
+    for a in np.unique(neuron_addresses):
+        for b in np.unique(neuron_buses):
+            neuron_lookup[a, b] = np.where((neuron_addresses == a) & (neuron_buses == b))[0][0]
+
+    # specification of synapse row assignment
+    rows = np.arange(256)
+    drivers = rows // 2
+    odds = rows % 2
+
+    padi_buses = drivers % 4
+
+    driver_masks = (drivers // 4) % 4
+    labels = (2*(drivers // 16)) << 2
+
+    if not signed_synapses:
+        labels += odds << 2
+
+    new = ((labels >> 5) & 0b1) << 2
+    new += ((labels >> 4) & 0b1) << 3
+    new += ((labels >> 3) & 0b1) << 4
+    new += ((labels >> 2) & 0b1) << 5
+
+    synapse_labels = new
+
+    addresses = (driver_masks << 6) + synapse_labels
+
+    lookup = np.empty_like(addresses)
+    for i, (address, bus) in enumerate(zip(addresses, padi_buses)):
+        lookup[i] = np.where((neuron_addresses == address) & (neuron_buses == bus))[0][0]
+
+    return RoutingAddresses(neuron_addresses, neuron_buses, neuron_lookup, driver_masks, synapse_labels, lookup)
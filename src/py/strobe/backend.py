@@ -1,5 +1,9 @@
+import copy
 import enum
+import hashlib
+import pickle
 import warnings
+from typing import Any, Dict, List, NamedTuple
 import numpy as np
 
 import pyhxcomm_vx as hxcomm
@@ -13,6 +17,12 @@ import calix.spiking
 import gonzales
 
 from .routing import RoutingGenerator
+from .pipeline import merge_results, run_pipelined
+from .correlation import (
+    BaselineCache, correlation_blocks, correlation_index, select_correlation_rows, subset_index, unroll_correlation)
+from .planning import FPGA_MEMORY_SIZE, TIMING_OFFSET, HWBatchPlan, plan_hw_batch
+from .spikes import dissect_spikes
+from .structure import LayerSize, layer_boundaries, structure_key, unroll_weights
 
 
 class PPUSignal(enum.Enum):
@@ -21,14 +31,8 @@ class PPUSignal(enum.Enum):
     HALT = 2
     RESET_BATCH = 3
     RUN_AND_RESET = 4
-
-
-class LayerSize(int):
-    def __new__(cls, size, recurrent=False, spiking=True):
-        self = int.__new__(cls, size)
-        self.recurrent = recurrent
-        self.spiking = spiking
-        return self
+    RUN_WITHOUT_RECORDING = 5
+    RUN_WITHOUT_RECORDING_AND_RESET = 6
 
 
 active_crossbar_node = haldls.CrossbarNode()
@@ -64,14 +68,54 @@ for i in range(8):
                 ), silent_crossbar_node)
 
 
-FPGA_MEMORY_SIZE = 131072  # bytes
+class _Slot(enum.Enum):
+    """
+    Entries of a program template: copied segments and the positions filled per call, cf.
+    `StrobeBackend._program_template`.
+    """
+
+    SEGMENT = 0
+    SPIKES = 1
+    CORRELATION = 2
+    POWER = 3
+    READS = 4
+
+
+# configuration builders of all backends in this process, keyed by calibration, structure and settings
+_configuration_cache = {}
+
+
+def clear_configuration_cache():
+    _configuration_cache.clear()
+
+
+class _PendingRun(NamedTuple):
+    """
+    Playback program of a hardware batch together with everything needed to decode its results.
+    """
+
+    program: Any
+    hw_batch_size: int
+    timing_offset: float
+    n_samples: int
+    measure_power: bool
+    record_madc: bool
+    record_traces: bool
+    power_tickets: Dict
+    duration_tickets: List
+    fpga_mem_ticket: Any
+    corr_tickets: List
 
 
 class StrobeBackend:
-    def __init__(self, connection, structure=[256, 118, 10], calibration=None, synapse_bias=1000, sample_separation=500e-6, measure_correlation=False):
+    def __init__(self, connection, structure=[256, 118, 10], calibration=None, synapse_bias=1000, sample_separation=500e-6, measure_correlation=False,
+                 debug=False, baseline_cache=None, correlation_readout="network"):
         self._connection = connection
         self.structure = structure
 
+        # synapse array contents of the last weight write, unknown until the first one
+        self._synram_state = None
+
         self.synapse_bias = synapse_bias
         self.sample_separation = sample_separation
         self._measure_correlation = measure_correlation
@@ -84,11 +128,13 @@ class StrobeBackend:
         else:
             self._input_shift = 0
 
-        self.max_hw_batch_size = 40
-
         # calib = np.load(calibration, allow_pickle=True)
-        self._cadc_calib = calibration["cadc"]
-        self._neuron_calib = calibration["neuron"]
+        # the neuron configs are patched during configuration, keep the caller's calibration untouched
+        self._cadc_calib = copy.deepcopy(calibration["cadc"])
+        self._neuron_calib = copy.deepcopy(calibration["neuron"])
+
+        # identifies the unpatched calibration within the keys of the configuration cache
+        self._calibration_digest = hashlib.sha256(pickle.dumps((self._cadc_calib, self._neuron_calib))).hexdigest()
 
         # this is kinda fixed for the model, we keep it here only for the sake of completeness
         self._neuron_size = 2
@@ -100,64 +146,60 @@ class StrobeBackend:
 
         self._routing = RoutingGenerator(neuron_size=self._neuron_size, signed_synapses=self._signed_synapses)
 
-    def configure(self, reduce_power=False, initialize=True):
-        if initialize:
-            init = stadls.ExperimentInit()
+        # the routing is fixed, hence correlation readouts of all samples are unrolled by the same gather
+        self._correlation_index = correlation_index(self._routing._lookup)
 
-            shiftreg = init.shift_register
-            shiftreg.select_analog_readout_mux_1_input = shiftreg.AnalogReadoutMux1Input.readout_chain_1
-            shiftreg.select_analog_readout_mux_2_input = shiftreg.AnalogReadoutMux2Input.mux_dac_25
+        # verify the decoding of correlation measurements against the written weights
+        self.debug = debug
 
-            if reduce_power:
-                # disable MADC clock
-                madc_clock = haldls.PLLClockOutputBlock.ClockOutput()
-                madc_clock.enable_output = False
-                init.pll_clock_output_block.set_clock_output(halco.PLLClockOutputOnDLS.madc_clk, madc_clock)
+        # correlation baseline, by default re-measured before every run
+        self.baseline_cache = baseline_cache if baseline_cache is not None else BaselineCache()
 
-                # reduce PPU clock
-                ppu_clock = init.pll_clock_output_block.get_clock_output(halco.PLLClockOutputOnDLS.ppu_clk)
-                init.adplls[ppu_clock.select_adpll].core_div_m1 = haldls.ADPLL.CoreDivM1(5)
+        self.set_correlation_readout(correlation_readout)
 
-                # reduce supply voltages
-                init.dac_channel_block.value[halco.DACChannelOnBoard.vdd25_digital] = 0
-                init.dac_channel_block.value[halco.DACChannelOnBoard.vdd25_analog] = 0
-                init.dac_channel_block.value[halco.DACChannelOnBoard.vdd12_digital] = 700
-                init.dac_channel_block.value[halco.DACChannelOnBoard.vdd12_pll] = 0
+        # program templates per hardware batch settings, cf. `_program_template`
+        self._program_templates = {}
 
-                # disable links (two links remaining)
-                enable_links = np.zeros(8, dtype=np.bool)
-                enable_links[3, 4] = True
-                for i, value in enumerate(enable_links):
-                    fpga_coord = halco.PhyConfigFPGAOnDLS(i)
-                    chip_coord = halco.PhyConfigChipOnDLS(7 - i)
-                    init.highspeed_link.common_phy_config_fpga.set_enable_phy(fpga_coord, value)
-                    init.highspeed_link.phy_configs_fpga[i].enable_manual_training_mode = not value
-                    init.highspeed_link.common_phy_config_chip.set_enable_phy(chip_coord, value)
-                    init.highspeed_link.phy_configs_chip[7-i].enable_manual_training_mode = not value
-                    init.highspeed_link.phy_configs_chip[7-i].vbias = haldls.PhyConfigChip.VBias(7)
+    def set_correlation_readout(self, rows="network"):
+        """
+        Select the rows of correlation sensors that are read out after each sample. Synapses of rows that are not
+        read out are reported without any correlation.
 
-            # TEMP DISABLED FOR TESTING
-            # Configuration of DAC for synaptic trace measurement?
-            dac_config = init.dac_channel_block
-            dac_config.value[halco.DACChannelOnBoard.v_res_meas] = 4095
-            dac_config.value[halco.DACChannelOnBoard.mux_dac_25] = 2900
+        :param rows: Either `network`, reading only the rows covering synapses that carry weights of the network,
+            `all`, or the indices of the `CADCSampleRowOnDLS` to read out.
+        """
 
-            init_builder, _ = init.generate()
-        else:
-            init_builder = stadls.PlaybackProgramBuilder()
+        rows = select_correlation_rows(rows, self.structure, self._correlation_index, self._input_shift)
 
-        # apply external DAC to synapse debug line
-        pad_mux = haldls.PadMultiplexerConfig()
-        pad_mux.synin_debug_excitatory_to_synapse_intermediate_mux = True
-        pad_mux.synin_debug_inhibitory_to_synapse_intermediate_mux = True
-        pad_mux.synapse_intermediate_mux_to_pad = True
-        init_builder.write(halco.PadMultiplexerConfigOnDLS(1), pad_mux)
+        self.correlation_rows = rows
+        self._correlation_row_coordinates = [halco.CADCSampleRowOnDLS(int(r)) for r in rows]
+        self._correlation_subset_index = subset_index(self._correlation_index, rows)
 
-        # TEMP ENABLED FOR TESTING
-        # Needed for resetting when in fast inference mode (incompatible with simultaneous readout of synaptic traces)
-        # channel = haldls.DACChannel()
-        # channel.value = int(1.2 / 2.5 * 4095)
-        # init_builder.write(halco.DACChannelOnBoard.mux_dac_25, channel)
+        # the baseline covers the rows read out
+        self.baseline_cache.invalidate()
+
+    def configure(self, reduce_power=False, initialize=True):
+        # the synapse array has to be written completely after a (re)configuration
+        self._synram_state = None
+        self.baseline_cache.invalidate()
+
+        # the patched configs are also used outside of the configuration, e.g. by `set_readout`
+        self._patch_configuration()
+
+        key = (self._calibration_digest, structure_key(self.structure), self.synapse_bias, reduce_power, initialize)
+        if key not in _configuration_cache:
+            _configuration_cache[key] = self._build_configuration(reduce_power, initialize)
+
+        # replay the whole configuration in a single program
+        builder = stadls.PlaybackProgramBuilder()
+        builder.copy_back(_configuration_cache[key])
+        stadls.run(self._connection, builder.done())
+
+    def _patch_configuration(self):
+        """
+        Adapt the neuron configs of the calibration and the neuron backend configs of the routing to the network
+        structure. The patches are applied in place on every configuration, including those served from the cache.
+        """
 
         # modify neuron config
         boundaries = np.hstack([np.zeros(1, dtype=int), np.array(self.structure[1:]).cumsum()])
@@ -197,12 +239,6 @@ class StrobeBackend:
         #     config = self._neuron_calib.neurons[c]
         #     print(c, config)
 
-        # apply calibration
-        self._cadc_calib.apply(init_builder)
-        self._neuron_calib.apply(init_builder)
-        # calix.common.cadc.apply_calibration(init_builder, self._cadc_calib)
-        # calix.spiking.neuron.apply_calibration(init_builder, self._neuron_calib)
-
         for c in halco.iter_all(halco.CommonNeuronBackendConfigOnDLS):
             # config = haldls.CommonNeuronBackendConfig()
             config = self._neuron_calib.cocos[c]
@@ -215,10 +251,6 @@ class StrobeBackend:
             for block in range(4):
                 config.set_sample_positive_edge(block, True)
 
-            init_builder.write(c, config)
-
-        stadls.run(self._connection, init_builder.done())
-
         # patch neuron backend configfrom calibration result
         for c in halco.iter_all(halco.NeuronBackendConfigOnDLS):
             calib_neuron_backend = self._neuron_calib.neurons[c.toAtomicNeuronOnDLS()]
@@ -228,6 +260,79 @@ class StrobeBackend:
             config.select_input_clock = calib_neuron_backend.refractory_period.input_clock
             config.reset_holdoff = calib_neuron_backend.refractory_period.reset_holdoff
 
+    def _build_configuration(self, reduce_power, initialize):
+        """
+        Build the configuration of the chip, including calibration, routing and readout, into a single builder.
+        Expects the configs to be patched by `_patch_configuration`.
+        """
+
+        if initialize:
+            init = stadls.ExperimentInit()
+
+            shiftreg = init.shift_register
+            shiftreg.select_analog_readout_mux_1_input = shiftreg.AnalogReadoutMux1Input.readout_chain_1
+            shiftreg.select_analog_readout_mux_2_input = shiftreg.AnalogReadoutMux2Input.mux_dac_25
+
+            if reduce_power:
+                # disable MADC clock
+                madc_clock = haldls.PLLClockOutputBlock.ClockOutput()
+                madc_clock.enable_output = False
+                init.pll_clock_output_block.set_clock_output(halco.PLLClockOutputOnDLS.madc_clk, madc_clock)
+
+                # reduce PPU clock
+                ppu_clock = init.pll_clock_output_block.get_clock_output(halco.PLLClockOutputOnDLS.ppu_clk)
+                init.adplls[ppu_clock.select_adpll].core_div_m1 = haldls.ADPLL.CoreDivM1(5)
+
+                # reduce supply voltages
+                init.dac_channel_block.value[halco.DACChannelOnBoard.vdd25_digital] = 0
+                init.dac_channel_block.value[halco.DACChannelOnBoard.vdd25_analog] = 0
+                init.dac_channel_block.value[halco.DACChannelOnBoard.vdd12_digital] = 700
+                init.dac_channel_block.value[halco.DACChannelOnBoard.vdd12_pll] = 0
+
+                # disable links (two links remaining)
+                enable_links = np.zeros(8, dtype=np.bool)
+                enable_links[3, 4] = True
+                for i, value in enumerate(enable_links):
+                    fpga_coord = halco.PhyConfigFPGAOnDLS(i)
+                    chip_coord = halco.PhyConfigChipOnDLS(7 - i)
+                    init.highspeed_link.common_phy_config_fpga.set_enable_phy(fpga_coord, value)
+                    init.highspeed_link.phy_configs_fpga[i].enable_manual_training_mode = not value
+                    init.highspeed_link.common_phy_config_chip.set_enable_phy(chip_coord, value)
+                    init.highspeed_link.phy_configs_chip[7-i].enable_manual_training_mode = not value
+                    init.highspeed_link.phy_configs_chip[7-i].vbias = haldls.PhyConfigChip.VBias(7)
+
+            # TEMP DISABLED FOR TESTING
+            # Configuration of DAC for synaptic trace measurement?
+            dac_config = init.dac_channel_block
+            dac_config.value[halco.DACChannelOnBoard.v_res_meas] = 4095
+            dac_config.value[halco.DACChannelOnBoard.mux_dac_25] = 2900
+
+            init_builder, _ = init.generate()
+        else:
+            init_builder = stadls.PlaybackProgramBuilder()
+
+        # apply external DAC to synapse debug line
+        pad_mux = haldls.PadMultiplexerConfig()
+        pad_mux.synin_debug_excitatory_to_synapse_intermediate_mux = True
+        pad_mux.synin_debug_inhibitory_to_synapse_intermediate_mux = True
+        pad_mux.synapse_intermediate_mux_to_pad = True
+        init_builder.write(halco.PadMultiplexerConfigOnDLS(1), pad_mux)
+
+        # TEMP ENABLED FOR TESTING
+        # Needed for resetting when in fast inference mode (incompatible with simultaneous readout of synaptic traces)
+        # channel = haldls.DACChannel()
+        # channel.value = int(1.2 / 2.5 * 4095)
+        # init_builder.write(halco.DACChannelOnBoard.mux_dac_25, channel)
+
+        # apply calibration
+        self._cadc_calib.apply(init_builder)
+        self._neuron_calib.apply(init_builder)
+        # calix.common.cadc.apply_calibration(init_builder, self._cadc_calib)
+        # calix.spiking.neuron.apply_calibration(init_builder, self._neuron_calib)
+
+        for c in halco.iter_all(halco.CommonNeuronBackendConfigOnDLS):
+            init_builder.write(c, self._neuron_calib.cocos[c])
+
         builder = self._routing.generate()
 
         # set synapse bias
@@ -280,7 +385,7 @@ class StrobeBackend:
             ccc.reset_duration = 5
             builder.write(c, ccc)
 
-        stadls.run(self._connection, builder.done())
+        init_builder.merge_back(builder)
 
         # configure MADC
         builder = stadls.PlaybackProgramBuilder()
@@ -307,7 +412,9 @@ class StrobeBackend:
         for coord in halco.iter_all(halco.PadMultiplexerConfigOnDLS):
             builder.write(coord, haldls.PadMultiplexerConfig())
 
-        stadls.run(self._connection, builder.done())
+        init_builder.merge_back(builder)
+
+        return init_builder
 
     def set_readout(self, neuron_index: int, target="membrane"):
         neuron_coord = halco.AtomicNeuronOnDLS(halco.EnumRanged_512_(neuron_index * self._neuron_size))
@@ -336,57 +443,20 @@ class StrobeBackend:
 
         stadls.run(self._connection, builder.done())
 
-    def write_weights(self, *weights):
+    def write_weights(self, *weights, dirty_rows_only=True):
+        """
+        Write the weights of all layers to the synapse array.
+
+        :param weights: Weight matrices of shape `(inputs, size)` per layer.
+        :param dirty_rows_only: Only rewrite the synapse rows that changed since the previous call.
+        """
+
         # we from now on assume that we have up to 256 inputs per neuron
         assert self._neuron_size == 2
 
         self._weights = weights
 
-        shapes = []
-        for l, layer in enumerate(self.structure[:-1]):
-            next_layer = self.structure[l + 1]
-            if not isinstance(next_layer, LayerSize) or not next_layer.recurrent:
-                shape = (layer, next_layer)
-            else:
-                shape = (layer + next_layer, next_layer)
-            shapes.append(shape)
-
-        weights_unrolled = np.zeros((256, 256), dtype=int)
-        offsets_unrolled = np.zeros((256, 256), dtype=int)
-
-        boundaries = np.hstack([np.zeros(1, dtype=int), np.array(self.structure[1:]).cumsum()])
-
-        assert len(weights) == len(shapes)
-        for l, (shape, w, layer) in enumerate(zip(shapes, weights, self.structure[1:])):
-            if shape != w.shape:
-                msg = f"Shape of weights for layer {layer} is not compatible with the layer specification."
-                raise IndexError(msg)
-
-            recurrent = isinstance(layer, LayerSize) and layer.recurrent
-            if recurrent:
-                a = boundaries[l]
-                b = boundaries[l + 1]
-                offset = 0
-
-                c = boundaries[l]
-                d = boundaries[l + 1]
-                weights_unrolled[a:b, c:d] = w[a - b:, :]
-                offsets_unrolled[a:b, c:d] = offset
-
-            # non-reccurent weights
-            if l == 0:
-                a = self._input_shift + 0
-                b = self._input_shift + self.structure[0]
-                offset = 1
-            else:
-                a = boundaries[l - 1]
-                b = boundaries[l]
-                offset = 0
-
-            c = boundaries[l]
-            d = boundaries[l + 1]
-            weights_unrolled[a:b, c:d] = w[0:b - a, :]
-            offsets_unrolled[a:b, c:d] = offset
+        weights_unrolled, offsets_unrolled = unroll_weights(self.structure, weights, self._input_shift)
 
         # synapses
         weights = np.empty((2, 128, 256), dtype=int)
@@ -396,7 +466,21 @@ class StrobeBackend:
         offsets[0, :, :] = offsets_unrolled[:128, :]
         offsets[1, :, :] = offsets_unrolled[128:, :] + (1 << 5)
 
-        synram_top, synram_bottom = self._routing.transform_weights(weights, offsets)
+        builder = stadls.PlaybackProgramBuilder()
+        if self._synram_state is None or not dirty_rows_only:
+            synram_top, synram_bottom = self._routing.transform_weights(weights, offsets)
+            builder.write(halco.SynramOnDLS.top, synram_top)
+            builder.write(halco.SynramOnDLS.bottom, synram_bottom)
+            self.written_synapse_rows = 2 * halco.SynapseRowOnSynram.size
+        else:
+            # only rewrite synapse rows which changed since the previous write
+            rows = self._routing.transform_weight_rows(weights, offsets, *self._synram_state)
+            for coord, row in rows:
+                builder.write(coord, row)
+            self.written_synapse_rows = len(rows)
+
+        # the routing assigns new arrays on every write, they are not modified afterwards
+        self._synram_state = (self._routing.weights_assigned, self._routing.labels_assigned)
 
         self.weights_unrolled = weights_unrolled
         # import sys
@@ -409,10 +493,8 @@ class StrobeBackend:
         #     print(f"{offsets=}")
         #     print("="*80)
 
-        builder = stadls.PlaybackProgramBuilder()
-        builder.write(halco.SynramOnDLS.top, synram_top)
-        builder.write(halco.SynramOnDLS.bottom, synram_bottom)
-        stadls.run(self._connection, builder.done())
+        if self.written_synapse_rows:
+            stadls.run(self._connection, builder.done())
 
     def extract_measurements(self, *weights, measurements):
         # we from now on assume that we have up to 256 inputs per neuron
@@ -522,26 +604,90 @@ class StrobeBackend:
         # measure correlation baseline
         builder = stadls.PlaybackProgramBuilder()
         gonzales.reset_correlation(builder)
-        tickets = gonzales.measure_correlation(builder)
+        tickets = gonzales.measure_correlation_rows(builder, self._correlation_row_coordinates)
         builder.block_until(halco.BarrierOnFPGA(), haldls.Barrier.omnibus)
         stadls.run(self._connection, builder.done())
 
-        baseline = np.zeros(
-                (halco.SynapseRowOnDLS.size, halco.NeuronColumnOnDLS.size),
-                dtype=np.int)
-        for ticket_id, ticket in enumerate(tickets):
-            baseline[ticket_id, :] = ticket.get().causal.to_numpy()
+        baseline = np.array([ticket.get().causal.to_numpy() for ticket in tickets], dtype=int)
+        baseline = baseline.reshape((len(self.correlation_rows), halco.NeuronColumnOnDLS.size))
         
         # print(f"Measured causal trace baseline: {baseline.min()} - {baseline.max()}, mean: {np.mean(baseline)}")
         return baseline
 
 
-    def run(self, input_spikes, n_samples=None, duration=None, measure_power=False, trigger_reset=False, record_madc=False):
-        if self._measure_correlation:
-            self.baseline = self._measure_correlation_baseline()
+    def plan_hw_batch(self, n_samples, record_madc=False, record_traces=True) -> HWBatchPlan:
+        """
+        Largest number of samples recorded with `n_samples` CADC samples each that fits into a single playback
+        program, together with its estimated duration on chip.
+        """
+
+        return plan_hw_batch(
+                n_samples, self._n_vectors, self.sample_separation, self._measure_correlation, record_madc,
+                record_traces=record_traces)
+
+    def run(
+            self, input_spikes, n_samples=None, duration=None, measure_power=False, trigger_reset=False,
+            record_madc=False, record_traces=True):
+        """
+        Execute a batch of samples on chip.
+
+        :param record_traces: Record and return CADC traces. Otherwise, the PPUs skip writing the traces to the
+            FPGA memory and only spikes are returned, allowing for larger hardware batches. The traces of all
+            layers are then empty along the time axis.
+        """
 
+        # split oversized requests into hardware batches fitting into single playback programs
+        hw_batch_size = self.plan_hw_batch(n_samples, record_madc, record_traces).size
+        if len(input_spikes) > hw_batch_size:
+            batches = [input_spikes[i:i + hw_batch_size] for i in range(0, len(input_spikes), hw_batch_size)]
+            return merge_results(self.run_pipelined(
+                    batches, n_samples, measure_power, trigger_reset, record_madc, record_traces))
+
+        pending = self._build_program(input_spikes, n_samples, measure_power, trigger_reset, record_madc, record_traces)
+        baseline = self._execute(pending)
+        return self._decode(pending, baseline)
+
+    def run_pipelined(
+            self, batches, n_samples=None, measure_power=False, trigger_reset=False, record_madc=False,
+            record_traces=True):
+        """
+        Execute several hardware batches back to back. While the chip executes a batch, the playback program of
+        the next one is built and the results of the previous one are decoded on worker threads.
+
+        :param batches: Input spikes of each hardware batch, as passed to `run`.
+
+        Returns the results of `run` for each batch, in order.
+        """
+
+        def build(input_spikes):
+            return self._build_program(
+                    input_spikes, n_samples, measure_power, trigger_reset, record_madc, record_traces)
+
+        return run_pipelined(build, self._execute, self._decode, batches)
+
+    def _program_template(self, hw_batch_size, n_samples, trigger_reset, record_madc, record_traces):
+        """
+        Playback program of a hardware batch without its spike trains and reads, compiled once per combination of
+        settings. The template is a sequence of `(_Slot, payload)` pairs: `_Slot.SEGMENT` carries a write-only
+        builder to be copied, all other slots mark the positions of the per-call contents and carry the index of
+        the sample they belong to, if any.
+        """
+
+        key = (hw_batch_size, n_samples, self.sample_separation, trigger_reset, record_madc, record_traces,
+               self._measure_correlation)
+        if key in self._program_templates:
+            return self._program_templates[key]
+
+        template = []
         builder = stadls.PlaybackProgramBuilder()
 
+        def slot(kind, payload=None):
+            # close the current segment, consecutive writes end up in a single one
+            nonlocal builder
+            template.append((_Slot.SEGMENT, builder))
+            template.append((kind, payload))
+            builder = stadls.PlaybackProgramBuilder()
+
         # configure the number of samples to be recorded
         self._signal_ppus(builder, self._ppu_n_samples_coordinate[0], haldls.PPUMemoryWord.Value(n_samples))
 
@@ -577,35 +723,23 @@ class StrobeBackend:
         event_config.enable_event_recording = True
         builder.write(halco.EventRecordingConfigOnFPGA(), event_config)
 
-        corr_tickets = []
+        timing_offset = TIMING_OFFSET
 
-        timing_offset = 100e-6
+        # without traces, the PPUs sample with unchanged timing but do not write to the FPGA memory
+        if record_traces:
+            signal = PPUSignal.RUN_AND_RESET if trigger_reset else PPUSignal.RUN
+        else:
+            signal = PPUSignal.RUN_WITHOUT_RECORDING_AND_RESET if trigger_reset else PPUSignal.RUN_WITHOUT_RECORDING
+        run_command = haldls.PPUMemoryWord(haldls.PPUMemoryWord.Value(signal.value))
 
-        hw_batch_size = len(input_spikes)
         for b in range(hw_batch_size):
             builder.block_until(
                 halco.TimerOnDLS(),
                 int((b * self.sample_separation + timing_offset) * 1e6 * fisch.fpga_clock_cycles_per_us))
-            # print(f"BLOCK UNTIL: {b * self.sample_separation + timing_offset }", flush=True)
-            # TEMP DISABLED FOR TESTING
             # start CADC recording via PPU
-            if trigger_reset:
-                command = haldls.PPUMemoryWord(haldls.PPUMemoryWord.Value(PPUSignal.RUN_AND_RESET.value))
-            else:
-                command = haldls.PPUMemoryWord(haldls.PPUMemoryWord.Value(PPUSignal.RUN.value))
-            self._signal_ppus(builder, self._ppu_signal_coordinate[0], command)
-
-            if (input_spikes[b][:, 0] >= self.sample_separation).any():
-                warnings.warn("Not all spikes are injected within the timing separation window. Expecting faulty timing. Please increase sample separation.")
-
-            times = input_spikes[b][:, 0] + timing_offset + b * self.sample_separation
-            labels = input_spikes[b][:, 1].astype(np.int)
+            self._signal_ppus(builder, self._ppu_signal_coordinate[0], run_command)
 
-            # shift inputs in case the first layer is recurrent
-            labels += self._input_shift
-
-            # TEMP DISABLED FOR TESTING
-            builder.merge_back(self._routing.generate_spike_train(times, labels))
+            slot(_Slot.SPIKES, b)
 
             # Need to block so that PPU can finish reading out membrane potentials
             builder.block_until(
@@ -614,10 +748,8 @@ class StrobeBackend:
 
             if self._measure_correlation:
                 builder.block_until(halco.BarrierOnFPGA(), haldls.Barrier.omnibus)
-                tickets = gonzales.measure_correlation(builder)
-                # TEMP DISABLED FOR TESTING
+                slot(_Slot.CORRELATION, b)
                 gonzales.reset_correlation(builder)
-                corr_tickets.append(tickets)
 
         builder.block_until(
             halco.TimerOnDLS(),
@@ -630,10 +762,7 @@ class StrobeBackend:
             builder.write(halco.MADCControlOnDLS(), madc_control)
 
         # measure power consumption
-        if measure_power:
-            tickets = {}
-            for ina in halco.iter_all(halco.INA219StatusOnBoard):
-                tickets[ina] = builder.read(ina)
+        slot(_Slot.POWER)
 
         builder.block_until(halco.BarrierOnFPGA(), haldls.Barrier.omnibus)
 
@@ -644,20 +773,96 @@ class StrobeBackend:
         # disable recurrent connections
         builder.copy_back(disable_recurrency_builder)
 
-        n_vectors = hw_batch_size * n_samples * self._n_vectors
-        fpga_mem_ticket = gonzales.get_fpga_memory_ticket(builder, n_vectors)
-
-        duration_tickets = []
-        for p in range(2):
-            duration_tickets.append(
-                    builder.read(halco.PPUMemoryWordOnDLS(self._ppu_duration_coordinate[0], halco.PPUOnDLS(p))))
+        slot(_Slot.READS)
 
         builder.write(halco.TimerOnDLS(), haldls.Timer())
         builder.block_until(halco.TimerOnDLS(), 10000)
+        template.append((_Slot.SEGMENT, builder))
+
+        self._program_templates[key] = template
+        return template
+
+    def _build_program(self, input_spikes, n_samples, measure_power, trigger_reset, record_madc, record_traces=True):
+        """
+        Build the playback program for a hardware batch without accessing the chip. Only the spike trains and
+        reads are generated per call, everything else is copied from the cached template.
+        """
+
+        hw_batch_size = len(input_spikes)
+        timing_offset = TIMING_OFFSET
+        template = self._program_template(hw_batch_size, n_samples, trigger_reset, record_madc, record_traces)
+
+        builder = stadls.PlaybackProgramBuilder()
+        tickets = None
+        corr_tickets = []
+        fpga_mem_ticket = None
+        duration_tickets = []
+
+        for kind, payload in template:
+            if kind == _Slot.SEGMENT:
+                builder.copy_back(payload)
+
+            elif kind == _Slot.SPIKES:
+                b = payload
+                if (input_spikes[b][:, 0] >= self.sample_separation).any():
+                    warnings.warn("Not all spikes are injected within the timing separation window. Expecting faulty timing. Please increase sample separation.")
+
+                times = input_spikes[b][:, 0] + timing_offset + b * self.sample_separation
+                labels = input_spikes[b][:, 1].astype(int)
+
+                # shift inputs in case the first layer is recurrent
+                labels += self._input_shift
+
+                builder.merge_back(self._routing.generate_spike_train(times, labels))
+
+            elif kind == _Slot.CORRELATION:
+                corr_tickets.append(gonzales.measure_correlation_rows(builder, self._correlation_row_coordinates))
+
+            elif kind == _Slot.POWER and measure_power:
+                tickets = {}
+                for ina in halco.iter_all(halco.INA219StatusOnBoard):
+                    tickets[ina] = builder.read(ina)
+
+            elif kind == _Slot.READS:
+                if record_traces:
+                    n_vectors = hw_batch_size * n_samples * self._n_vectors
+                    fpga_mem_ticket = gonzales.get_fpga_memory_ticket(builder, n_vectors)
+
+                for p in range(2):
+                    duration_tickets.append(
+                            builder.read(halco.PPUMemoryWordOnDLS(self._ppu_duration_coordinate[0], halco.PPUOnDLS(p))))
 
         program = builder.done()
 
-        stadls.run(self._connection, program)
+        return _PendingRun(
+                program, hw_batch_size, timing_offset, n_samples, measure_power, record_madc, record_traces,
+                tickets, duration_tickets, fpga_mem_ticket, corr_tickets)
+
+    def _execute(self, pending):
+        """
+        Execute a built program on the chip. Returns the correlation baseline valid for it, if any. The baseline is
+        re-measured beforehand according to the policy of `baseline_cache`.
+        """
+
+        baseline = None
+        if self._measure_correlation:
+            baseline = self.baseline_cache.get(self._measure_correlation_baseline)
+        # set on the calling thread, the baseline of the most recently executed run
+        self.baseline = baseline
+
+        stadls.run(self._connection, pending.program)
+
+        return baseline
+
+    def _decode(self, pending, baseline):
+        """
+        Decode spikes, traces, PPU durations and correlation measurements of an executed program. May run on the
+        decoder thread of `run_pipelined`, hence the baseline state is only updated via the thread-safe
+        `baseline_cache`.
+        """
+
+        program, hw_batch_size, timing_offset, n_samples, measure_power, record_madc, record_traces, tickets, \
+            duration_tickets, fpga_mem_ticket, corr_tickets = pending
 
         durations = []
         for t in duration_tickets:
@@ -674,35 +879,24 @@ class StrobeBackend:
         raw_spikes = np.stack([spike_times, spike_labels]).T
         raw_spikes[:, 0] -= timing_offset
 
-        # group spikes according to layers
-        spikes = [[] for l in range(len(self.structure) - 1)]
-        for b in range(hw_batch_size):
-            b_begin = b * self.sample_separation
-            b_end = (b + 1) * self.sample_separation
-            mask = (raw_spikes[:, 0] > b_begin) & (raw_spikes[:, 0] < b_end)
-
-            dissected_spikes = raw_spikes[mask, :]
+        # group spikes according to samples and layers, subtracting sample offsets and population indices
+        boundaries = layer_boundaries(self.structure)
+        spikes = dissect_spikes(raw_spikes, hw_batch_size, self.sample_separation, boundaries)
 
-            boundaries = np.hstack([np.zeros(1, dtype=int), np.array(self.structure[1:]).cumsum()])
-            for l in range(len(self.structure) - 1):
-                layer_mask = (dissected_spikes[:, 1] >= boundaries[l]) & (dissected_spikes[:, 1] < boundaries[l + 1])
-                s = dissected_spikes[layer_mask, :]
-
-                # subtract timing offset and population indices
-                s[:, 0] -= b_begin
-                s[:, 1] -= boundaries[l]
-                spikes[l].append(s)
-
-            if (raw_spikes[:, 1] >= boundaries[-1]).any():
-                print("Received spikes from unused neurons!")
+        if (raw_spikes[:, 1] >= boundaries[-1]).any():
+            print("Received spikes from unused neurons!")
 
         # TEMP DISABLED FOR TESTING
         # FPGA
-        fpga_data = gonzales.parse_fpga_memory_u8(fpga_mem_ticket)
-        trace_data = fpga_data.reshape((hw_batch_size, -1, 128*self._n_vectors))[:, :, ::-1]
-        cadc_data = np.stack([trace_data[b, :, :] for b in range(hw_batch_size)]).astype(np.float)
+        if record_traces:
+            fpga_data = gonzales.parse_fpga_memory_u8(fpga_mem_ticket)
+            trace_data = fpga_data.reshape((hw_batch_size, -1, 128*self._n_vectors))[:, :, ::-1]
+            # 8 bit samples are represented exactly in the default trace precision, cf. `Precision`
+            cadc_data = np.stack([trace_data[b, :, :] for b in range(hw_batch_size)]).astype(np.float32)
 
-        cadc_data = cadc_data / 256 * 1.2
+            cadc_data = cadc_data / 256 * 1.2
+        else:
+            cadc_data = np.empty((hw_batch_size, 0, 128 * self._n_vectors), dtype=np.float32)
 
         traces = []
         for l in range(len(self.structure) - 1):
@@ -710,78 +904,34 @@ class StrobeBackend:
 
         causal_traces = []
         if self._measure_correlation:
-            inputs = halco.SynapseRowOnSynram.size
-            ordering = np.argsort(self._routing._lookup)
-            raw_measurement = np.zeros(
-                (halco.SynapseRowOnDLS.size, halco.NeuronColumnOnDLS.size),
-                dtype=np.int)
-            for sample_idx, tickets in enumerate(corr_tickets):
-                # b_begin = sample_idx * self.sample_separation + timing_offset
-                # first_ticket = int(tickets[0].fpga_time) / fisch.fpga_clock_cycles_per_us / 1e6
-                # last_ticket = int(tickets[-1].fpga_time) / fisch.fpga_clock_cycles_per_us / 1e6
-                # print(f"Since sample start: {last_ticket - b_begin:.3e}", flush=True)
-                # print(f"Correlation readout: {last_ticket - first_ticket:.3e}", flush=True)
-
-                for ticket_id, ticket in enumerate(tickets):
-                    raw_measurement[ticket_id, :] = ticket.get().causal.to_numpy()
-                # print(f"Raw {sample_idx}: {measurement[0,:]}")
-                
-                measurement = self.baseline - raw_measurement
-                if 0:
-                    measurement[:inputs, :] = measurement[:inputs, :][ordering, :]
-                    measurement[inputs:, :] = measurement[inputs:, :][ordering, :]
-                else:
-                    weights_assigned = self._routing.weights_assigned
-                    measurement = measurement.T
-                    assert measurement.shape == weights_assigned.shape == (256, 512)
-
-                    weights_assigned[1::2, :] = -weights_assigned[1::2, :]  # Give negative synapses the correct sign
-                    
-                    weights_reassigned = weights_assigned[ordering, :]
-                    measurement = measurement[ordering, :]
-                    assert weights_reassigned.shape == measurement.shape == (256, 512)
-
-                    weights_reflattened = np.zeros((128, 512))
-                    measure_flattened = np.zeros_like(weights_reflattened)
-
-                    weights_reflattened[:, :] += weights_reassigned[0::2, :]
-                    weights_reflattened[:, :] += weights_reassigned[1::2, :]
-                    measure_flattened[...] += measurement[0::2, :]
-                    measure_flattened[...] += measurement[1::2, :]
-
-                    weights_inverted = np.swapaxes(weights_reflattened.reshape(128, 2, 256, order="F"), 0, 1)
-                    measure_inverted = np.swapaxes(measure_flattened.reshape(128, 2, 256, order="F"), 0, 1)
-
-                    weights_unrolled = np.empty((256, 256))
-                    measurement = np.empty_like(weights_unrolled)
-                    weights_unrolled[:128, :] = weights_inverted[0, ...]
-                    weights_unrolled[128:, :] = weights_inverted[1, ...]
-                    measurement[:128, :] = measure_inverted[0, ...]
-                    measurement[128:, :] = measure_inverted[1, ...]
-                    # Compare this "recovered" weights_unrolled to the ones generated by the backend.
-                    assert np.allclose(self.weights_unrolled, weights_unrolled)
-                    self.weights_unrolled = weights_unrolled
-
-                    weights_hidden, weights_output = self._weights
-                    input_total, n_hidden = weights_hidden.shape
-                    n_output = weights_output.shape[1]
-                    weights_hidden_inverted = weights_unrolled[:input_total, :n_hidden]
-                    weights_output_inverted = weights_unrolled[:n_hidden, n_hidden:n_hidden+n_output]
-                    assert np.allclose(weights_hidden_inverted, weights_hidden)
-                    assert np.allclose(weights_output_inverted, weights_output)
-
-                    measure_hidden = measurement[:input_total, :n_hidden]
-                    measure_output = measurement[:n_hidden, n_hidden:n_hidden+n_output]
-                    measurement = (measurement, measure_hidden, measure_output, raw_measurement.copy())
-
-                # print(f"Shuffled {sample_idx}: {meas[0,:]}")
-
-                causal_traces.append(measurement)
+            # readouts of all samples, shape (batch, rows, 256)
+            raw_measurement = np.array(
+                    [[ticket.get().causal.to_numpy() for ticket in tickets] for tickets in corr_tickets], dtype=int)
+            raw_measurement = raw_measurement.reshape(
+                    (len(corr_tickets), len(self.correlation_rows), halco.NeuronColumnOnDLS.size))
+
+            measurement = baseline - raw_measurement
+            self.baseline_cache.observe(baseline, measurement)
+
+            # rows that are not read out are decoded from a single row without correlation
+            measurement = np.concatenate([measurement, np.zeros_like(measurement[:, :1, :])], axis=1)
+            measurement = unroll_correlation(measurement, self._correlation_subset_index)
+
+            if self.debug:
+                # compare the weights recovered by the same gather to the ones generated by the backend
+                weights_assigned = self._routing.weights_assigned.copy()
+                weights_assigned[1::2, :] = -weights_assigned[1::2, :]  # give negative synapses the correct sign
+                weights_unrolled = unroll_correlation(weights_assigned.T, self._correlation_index)
+                assert np.allclose(self.weights_unrolled, weights_unrolled)
+
+            blocks = correlation_blocks(self.structure, measurement)
+            for b in range(len(corr_tickets)):
+                causal_traces.append((measurement[b], *[m[b] for m in blocks], raw_measurement[b]))
 
         if record_madc:
             samples = program.madc_samples.to_numpy()
             time = samples["chip_time"][10:] / 125 * 1e-6
-            trace = samples["value"][10:].astype(np.float) * 2e-3
+            trace = samples["value"][10:].astype(np.float64) * 2e-3
 
             self._madc_samples = np.stack([time, trace]).T
 
@@ -798,6 +948,9 @@ class StrobeBackend:
         self._ppu_signal_coordinate = elf_symbols["command"].coordinate
         self._ppu_n_samples_coordinate = elf_symbols["n_samples"].coordinate
 
+        # templates address the PPU symbols of the previous program
+        self._program_templates = {}
+
         # load and prepare ppu program
         builder = stadls.PlaybackProgramBuilder()
 
@@ -830,14 +983,19 @@ class StrobeBackend:
             builder.write(program_on_dls, program)
             builder.write(halco.PPUControlRegisterOnDLS(ppu), ppu_control_reg_run)
 
-            builder.write(
-                halco.PPUMemoryWordOnDLS(self._ppu_n_ppus[0], halco.PPUOnDLS(ppu)),
-                haldls.PPUMemoryWord(haldls.PPUMemoryWord.Value(self._n_vectors)))
+            # the PPU starts its readout once `n_ppus` is set, hence it is written last and not at all for an
+            # unused PPU, which is halted below
+            if ppu >= self._n_vectors:
+                continue
 
             builder.write(
                 halco.PPUMemoryWordOnDLS(self._ppu_ppu_id[0], halco.PPUOnDLS(ppu)),
                 haldls.PPUMemoryWord(haldls.PPUMemoryWord.Value(ppu)))
 
+            builder.write(
+                halco.PPUMemoryWordOnDLS(self._ppu_n_ppus[0], halco.PPUOnDLS(ppu)),
+                haldls.PPUMemoryWord(haldls.PPUMemoryWord.Value(self._n_vectors)))
+
         # stop second PPU if it is not used
         if self._n_vectors == 1:
             builder.write(program_on_dls, program)
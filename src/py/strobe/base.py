@@ -1,12 +1,109 @@
-from typing import Dict
+from typing import Callable, Dict, NamedTuple, Sequence, Tuple, Union
 
+import numpy as np
 import torch
 
 
+class Precision(NamedTuple):
+    """
+    Data types used to store the state of strobe layers.
+
+    traces -- membrane traces and synaptic currents, also used for spikes that carry gradients
+    spikes -- spikes that do not require gradients, e.g. measured on hardware or encoded inputs
+    """
+
+    traces: torch.dtype = torch.float32
+    spikes: torch.dtype = torch.float32
+
+
 class StrobeLayer(torch.nn.Module):
     def __init__(self):
         super(StrobeLayer, self).__init__()
         self.on_hx = False
+        self.precision = Precision()
+        self._derived = {}
+
+    def _derive(self, name: str, sources: Sequence, key: Tuple, compute: Callable):
+        """
+        Cache a quantity derived from neuron parameters. It is recomputed if `key` changes or if one of the
+        `sources` is replaced by another object (in-place modifications are not detected).
+        """
+
+        cached = self._derived.get(name)
+        if cached is None or cached[0] != key or any(a is not b for a, b in zip(cached[1], sources)):
+            cached = (key, tuple(sources), compute())
+            self._derived[name] = cached
+        return cached[2]
+
+    def _per_neuron(self, value, device: torch.device) -> Union[float, torch.Tensor]:
+        """
+        Return a scalar neuron parameter as float and a per-neuron one as float64 tensor of shape `(size,)`.
+        """
+
+        if isinstance(value, dict):
+            # sub-populations of calibration targets are indexed by neuron circuits of the whole chip, which can not
+            # be resolved without the placement of the layer
+            raise ValueError("Neuron parameters of sub-populations are not supported, pass one value per neuron.")
+        if np.ndim(value) == 0:
+            return float(value)
+
+        value = torch.as_tensor(value, dtype=torch.float64, device=device)
+        if value.shape != (self.size, ):
+            raise ValueError(f"Per-neuron parameters must be of shape ({self.size},), got {tuple(value.shape)}.")
+        return value
+
+    def decay_factors(self, device: torch.device = None, dtype: torch.dtype = torch.float32) -> Tuple:
+        """
+        Synaptic and membrane decay factors per time step. They are floats for scalar time constants and
+        tensors of shape `(size,)` for per-neuron ones, cached per `time_step`, device and data type.
+        """
+
+        def compute():
+            decays = []
+            for tau in (self.params["tau_syn"], self.params["tau_mem"]):
+                tau = self._per_neuron(tau, device)
+                if isinstance(tau, float):
+                    decays.append(np.exp(-self.time_step/tau))
+                else:
+                    decays.append(torch.exp(-self.time_step/tau).to(dtype))
+            return tuple(decays)
+
+        sources = (self.params["tau_syn"], self.params["tau_mem"])
+        return self._derive("decay_factors", sources, (self.time_step, device, dtype), compute)
+
+    def refractory_steps(self, device: torch.device = None) -> torch.Tensor:
+        """
+        Number of time steps units are refractory after a spike (scalar or of shape `(size,)`), or `None`
+        if the parameters do not specify a `refractory_time`.
+        """
+
+        refractory_time = self.params.get("refractory_time")
+        if refractory_time is None:
+            return None
+
+        def compute():
+            steps = self._per_neuron(refractory_time, device)/self.time_step
+            return torch.round(torch.as_tensor(steps, device=device)).long()
+
+        return self._derive("refractory_steps", (refractory_time, ), (self.time_step, device), compute)
+
+    def _dense_input(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        Convert a (possibly sparse) input to a dense tensor of the floating point type used for the integration.
+        """
+
+        if x.is_sparse:
+            x = x.to_dense()
+        return x.to(self.precision.traces)
+
+    def _cast_measurements(self):
+        """
+        Convert compactly stored (or sparse) measurements to the dense floating point type used for the integration.
+        """
+
+        self.traces = self.traces.to(self.precision.traces)
+        if getattr(self, "spikes", None) is not None:
+            self.spikes = self._dense_input(self.spikes)
 
     def inject(
             self,
@@ -20,8 +117,6 @@ class StrobeLayer(torch.nn.Module):
         self.traces = traces
         self.time_step = time_step
 
-        if parameters["tau_mem"] != self.params["tau_mem"]:
-            raise ValueError("Neuron parameter 'tau_mem' does not match calibration target!")
-
-        if parameters["tau_syn"] != self.params["tau_syn"]:
-            raise ValueError("Neuron parameter 'tau_syn' does not match calibration target!")
+        for name in ("tau_mem", "tau_syn"):
+            if torch.any(torch.as_tensor(parameters[name]).cpu() != torch.as_tensor(self.params[name]).cpu()):
+                raise ValueError(f"Neuron parameter '{name}' does not match calibration target!")
@@ -0,0 +1,227 @@
+import threading
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from .structure import layer_boundaries, unroll_weights, weight_shapes
+
+
+def correlation_index(lookup: np.ndarray) -> np.ndarray:
+    """
+    Precompute the gather that unrolls causal correlation readouts of shape `(512, 256)` onto the `(256, 256)`
+    grid of sources and neurons used for the weights, cf. `unroll_weights`. The readout is transposed, its synapse
+    rows are brought into the order of the sources by inverting the routing `lookup`, the signed pairs of synapse
+    rows are summed and both synapse arrays are stacked along the sources.
+
+    :param lookup: Assignment of synapse rows to sources, as generated by the `RoutingGenerator`.
+
+    Returns flat indices of shape `(2, 256, 256)` into a readout, one for each synapse of a signed pair.
+    """
+
+    ordering = np.argsort(lookup)
+    assert ordering.shape == (256,)
+
+    # entry (h * 128 + i, c) collects the ordered synapse rows 2 * i and 2 * i + 1 from readout row h + 2 * c
+    sources = np.arange(256)
+    readout_rows = (sources // 128)[:, np.newaxis] + 2 * np.arange(256)[np.newaxis, :]
+    synapse_rows = np.stack([ordering[0::2], ordering[1::2]])[:, sources % 128]
+
+    return readout_rows[np.newaxis, :, :] * 256 + synapse_rows[:, :, np.newaxis]
+
+
+def unroll_correlation(measurement: np.ndarray, index: np.ndarray) -> np.ndarray:
+    """
+    Unroll correlation readouts of a whole batch with a single gather.
+
+    :param measurement: Readouts of shape `(512, 256)` or `(batch, 512, 256)`. Readouts of a subset of rows
+        are padded by a row of zeros, cf. `subset_index`.
+    :param index: Gather as computed by `correlation_index` or `subset_index`.
+
+    Returns the unrolled measurements of shape `(256, 256)` or `(batch, 256, 256)`, respectively.
+    """
+
+    flat = measurement.reshape(measurement.shape[:-2] + (-1,))
+    return np.take(flat, index, axis=-1).sum(axis=-3).astype(float)
+
+
+def correlation_rows(structure: List[int], index: np.ndarray, input_shift: int = 0) -> np.ndarray:
+    """
+    Readout rows covering all synapses that carry weights of the network, cf. `unroll_weights`.
+
+    :param structure: Number of inputs followed by the sizes of all layers.
+    :param index: Gather as computed by `correlation_index`.
+    :param input_shift: Row of the first external input.
+
+    Returns the sorted indices of the readout rows.
+    """
+
+    weights = [np.ones(shape, dtype=int) for shape in weight_shapes(structure)]
+    used = unroll_weights(structure, weights, input_shift)[0] != 0
+
+    read = np.zeros(512 * 256, dtype=bool)
+    read[index[:, used]] = True
+    return np.flatnonzero(read.reshape(512, 256).any(axis=1))
+
+
+def select_correlation_rows(rows, structure: List[int], index: np.ndarray, input_shift: int = 0) -> np.ndarray:
+    """
+    Resolve a selection of readout rows, cf. `StrobeBackend.set_correlation_readout`.
+
+    :param rows: Either `network`, selecting the rows covering synapses that carry weights of the network (cf.
+        `correlation_rows`), `all`, or the indices of the readout rows.
+    :param structure: Number of inputs followed by the sizes of all layers.
+    :param index: Gather as computed by `correlation_index`.
+    :param input_shift: Row of the first external input.
+
+    Returns the sorted indices of the readout rows.
+    """
+
+    if isinstance(rows, str):
+        if rows == "network":
+            rows = correlation_rows(structure, index, input_shift)
+        elif rows == "all":
+            rows = np.arange(512)
+        else:
+            raise ValueError(f"Correlation readout {rows} is not supported.")
+
+    rows = np.unique(rows)
+    if len(rows) == 0 or rows[0] < 0 or rows[-1] >= 512:
+        raise ValueError("Correlation readout rows are out of range.")
+    return rows
+
+
+def subset_index(index: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    Restrict the gather of `correlation_index` to readouts of the given `rows`. The readouts are expected to be
+    followed by a single row of zeros, which stands in for all rows that are not read out.
+
+    :param index: Gather as computed by `correlation_index`.
+    :param rows: Indices of the readout rows, in the order they are read out.
+    """
+
+    position = np.full(512, len(rows))
+    position[rows] = np.arange(len(rows))
+    return position[index // 256] * 256 + index % 256
+
+
+def correlation_blocks(structure: List[int], measurement: np.ndarray) -> List[np.ndarray]:
+    """
+    Split unrolled measurements into the blocks of the individual layers, shaped like their weight matrices.
+
+    :param structure: Number of inputs followed by the sizes of all layers.
+    :param measurement: Unrolled measurements of shape `(256, 256)` or `(batch, 256, 256)`.
+    """
+
+    boundaries = layer_boundaries(structure)
+    blocks = []
+    for l, (inputs, size) in enumerate(weight_shapes(structure)):
+        # sources of the first layer start with its recurrent connections, if any, followed by the inputs
+        first = 0 if l == 0 else boundaries[l - 1]
+        blocks.append(measurement[..., first:first + inputs, boundaries[l]:boundaries[l + 1]])
+    return blocks
+
+
+def baseline_drift(measurement: np.ndarray) -> float:
+    """
+    Cheap estimate of the drift of the correlation sensors since their baseline was measured. Most sensors do not
+    accumulate any correlation within a sample, hence the median of each readout row stays at zero as long as the
+    baseline is accurate.
+
+    :param measurement: Baseline subtracted readouts of shape `(rows, 256)` or `(batch, rows, 256)`.
+
+    Returns the mean absolute deviation of the row medians from zero.
+    """
+
+    measurement = measurement.reshape((-1,) + measurement.shape[-2:])
+    return float(np.abs(np.median(measurement, axis=(0, 2))).mean())
+
+
+class BaselineCache:
+    def __init__(
+            self, refresh_runs: Optional[int] = 1, refresh_interval: Optional[float] = None,
+            drift_threshold: Optional[float] = None):
+        """
+        Correlation baseline of a backend, re-measured according to a refresh policy instead of before every run.
+        The baseline is refreshed as soon as any of the enabled criteria is met. The cache may be shared by the
+        stages of `run_pipelined`, i.e. runs are executed and decoded on different threads.
+
+        :param refresh_runs: Re-measure after the baseline has been used for this many runs, `None` disables.
+        :param refresh_interval: Re-measure once the baseline is older than this many seconds, `None` disables.
+        :param drift_threshold: Re-measure once the drift observed in the readouts of a run (cf. `baseline_drift`)
+            exceeds this value, `None` disables.
+        """
+
+        if refresh_runs is not None and refresh_runs < 1:
+            raise ValueError("The baseline has to be used for at least one run before refreshing it.")
+        if refresh_interval is not None and refresh_interval <= 0:
+            raise ValueError("The refresh interval has to be positive.")
+
+        self.refresh_runs = refresh_runs
+        self.refresh_interval = refresh_interval
+        self.drift_threshold = drift_threshold
+
+        self.baseline = None
+        # time of the last refresh, as returned by `time.time()`
+        self.refreshed_at = None
+        self.runs = 0
+        self.drift = 0.0
+
+        # guards the state above, which is updated by the execution and the decoding of runs
+        self._lock = threading.RLock()
+
+    def invalidate(self):
+        """
+        Enforce a re-measurement before the next run, e.g. after the chip was reconfigured.
+        """
+
+        with self._lock:
+            self.baseline = None
+
+    def expired(self) -> bool:
+        with self._lock:
+            return self._expired()
+
+    def _expired(self) -> bool:
+        if self.baseline is None:
+            return True
+        if self.refresh_runs is not None and self.runs >= self.refresh_runs:
+            return True
+        if self.refresh_interval is not None and time.time() - self.refreshed_at >= self.refresh_interval:
+            return True
+        if self.drift_threshold is not None and self.drift > self.drift_threshold:
+            return True
+        return False
+
+    def get(self, measure: Callable[[], np.ndarray]) -> np.ndarray:
+        """
+        Baseline for the next run, calling `measure` to refresh it if required by the policy.
+        """
+
+        with self._lock:
+            if self._expired():
+                self.baseline = measure()
+                self.refreshed_at = time.time()
+                self.runs = 0
+                self.drift = 0.0
+
+            self.runs += 1
+            return self.baseline
+
+    def observe(self, baseline: np.ndarray, measurement: np.ndarray):
+        """
+        Track the drift of the sensors from the baseline subtracted readouts of a run.
+
+        :param baseline: Baseline the readouts were corrected with. Readouts of runs using an outdated baseline are
+            ignored.
+        :param measurement: Baseline subtracted readouts of shape `(batch, rows, 256)`.
+        """
+
+        if len(measurement) == 0:
+            return
+
+        # the estimate is computed outside of the lock, the next execution does not wait for it
+        drift = baseline_drift(measurement)
+        with self._lock:
+            if baseline is self.baseline:
+                self.drift = drift
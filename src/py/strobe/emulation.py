@@ -0,0 +1,393 @@
+import warnings
+
+import numpy as np
+
+from .addressing import routing_addresses
+from .correlation import (
+    BaselineCache, correlation_blocks, correlation_index, select_correlation_rows, subset_index, unroll_correlation)
+from .planning import TIMING_OFFSET, HWBatchPlan, plan_hw_batch
+from .structure import LayerSize, layer_boundaries, unroll_weights
+
+# period of the CADC readout performed by the PPUs
+CADC_SAMPLE_PERIOD = 1.7e-6  # s
+
+# calibration targets used if none are given, cf. `experiments/yinyang/calibrate.py` for the format
+DEFAULT_TARGETS = {
+    "leak": 80,
+    "reset": 80,
+    "threshold": 150,
+    "tau_mem": 6e-6,
+    "tau_syn": 6e-6,
+    "refractory_time": 2e-6,
+}
+
+
+def expand_target(value, n_neurons: int, neuron_size: int = 2) -> np.ndarray:
+    """
+    Expand a calibration target to one value per neuron.
+
+    :param value: Either a single value or a dictionary of sub-populations mapping the index of the first neuron
+        circuit of every sub-population to its value.
+    :param n_neurons: Number of (logical) neurons.
+    :param neuron_size: Number of neuron circuits forming a logical neuron.
+    """
+
+    circuits = np.empty(n_neurons * neuron_size)
+    if isinstance(value, dict):
+        bounds = sorted(value.keys())
+        if bounds[0] != 0:
+            raise ValueError("Sub-populations must cover all neurons, starting at index 0.")
+        for b0, b1 in zip(bounds, bounds[1:] + [len(circuits)]):
+            circuits[b0:b1] = value[b0]
+    else:
+        circuits[:] = value
+    return circuits[::neuron_size]
+
+
+def _seconds(values: np.ndarray) -> np.ndarray:
+    # time constants are given in seconds, larger values are interpreted as microseconds (as done by the calibration)
+    return values if np.all(values < 1e-2) else values * 1e-6
+
+
+class EmulatedStrobeBackend:
+    def __init__(
+            self,
+            connection=None,
+            structure=[256, 118, 10],
+            calibration=None,
+            synapse_bias=1000,
+            sample_separation=500e-6,
+            measure_correlation=False,
+            time_step=CADC_SAMPLE_PERIOD / 10,
+            weight_gain=1.0,
+            correlation_tau=6.8e-6,
+            correlation_gain=10.0,
+            correlation_baseline=200,
+            baseline_cache=None,
+            correlation_readout="network"):
+        """
+        Software emulation of the `StrobeBackend`, for development and testing without access to a chip.
+        Leaky integrate-and-fire neurons with current-based synapses are simulated on the calibrated parameters,
+        vectorized across all samples of a hardware batch. Results are returned in the formats of the
+        `StrobeBackend`, i.e. quantized CADC traces, spike events and correlation measurements.
+
+        Membranes and synaptic currents are simulated in units of CADC LSB. The emulation captures the nominal
+        behavior of the chip, fixed-pattern deviations and noise are not modeled.
+
+        :param connection: Ignored, accepted for compatibility with the `StrobeBackend`.
+        :param structure: Number of inputs followed by the sizes of all layers.
+        :param calibration: Calibration targets (`leak`, `reset`, `threshold` in CADC LSB, `tau_mem`, `tau_syn`,
+            `refractory_time` in seconds), each either a single value or a dictionary of sub-populations.
+            Missing targets default to `DEFAULT_TARGETS`.
+        :param synapse_bias: Bias setting for the synapse circuits, scales the synaptic input linearly.
+        :param sample_separation: Separation of samples in a harware batch.
+        :param measure_correlation: Emulate the causal correlation readout after every sample.
+        :param time_step: Integration time step, has to divide the CADC sample period.
+        :param weight_gain: Synaptic current in CADC LSB evoked by a spike across a synapse with a weight of 1 at
+            a synapse bias of 1000.
+        :param correlation_tau: Time constant of the causal correlation sensors.
+        :param correlation_gain: Correlation in LSB accumulated per causal pair of spikes in immediate succession.
+        :param correlation_baseline: Reading of a correlation sensor without any accumulated correlation.
+        :param baseline_cache: Refresh policy of the correlation baseline, cf. `StrobeBackend`.
+        :param correlation_readout: Rows of correlation sensors read out after each sample, cf.
+            `set_correlation_readout`.
+        """
+
+        self._connection = connection
+        self.structure = structure
+
+        self.synapse_bias = synapse_bias
+        self.sample_separation = sample_separation
+        self._measure_correlation = measure_correlation
+
+        self.time_step = time_step
+        self._substeps = int(round(CADC_SAMPLE_PERIOD / time_step))
+        if not np.isclose(self._substeps * time_step, CADC_SAMPLE_PERIOD):
+            raise ValueError("The time step has to divide the CADC sample period.")
+
+        self.weight_gain = weight_gain
+        self.correlation_tau = correlation_tau
+        self.correlation_gain = correlation_gain
+        self.correlation_baseline = correlation_baseline
+
+        # check if first layer is recurrent
+        first_recurrent = isinstance(self.structure[1], LayerSize) and self.structure[1].recurrent
+        self._input_shift = self.structure[1] if first_recurrent else 0
+
+        self.targets = dict(DEFAULT_TARGETS, **(calibration or {}))
+
+        self._neuron_size = 2
+        self._n_neurons = int(np.sum(self.structure[1:]))
+        self._n_vectors = int(np.ceil(self._n_neurons / 128))
+        assert self._n_vectors < 3
+
+        # correlation sensors are read out in the layout of the chip, given by the routing of the synapse rows
+        self._correlation_index = correlation_index(routing_addresses(self._neuron_size, True).lookup)
+        self.baseline_cache = baseline_cache if baseline_cache is not None else BaselineCache()
+        self.set_correlation_readout(correlation_readout)
+
+        self._weights = None
+        self._readout = None
+        self.configure()
+
+    def set_correlation_readout(self, rows="network"):
+        """
+        Select the rows of correlation sensors that are read out after each sample, cf.
+        `StrobeBackend.set_correlation_readout`.
+        """
+
+        self.correlation_rows = select_correlation_rows(
+                rows, self.structure, self._correlation_index, self._input_shift)
+        self._correlation_subset_index = subset_index(self._correlation_index, self.correlation_rows)
+        self.baseline_cache.invalidate()
+
+    def configure(self, reduce_power=False, initialize=True):
+        """
+        Set up the neuron parameters from the calibration targets. The synapse array is cleared.
+        """
+
+        n = self._n_neurons
+        self._leak = expand_target(self.targets["leak"], n, self._neuron_size)
+        self._reset = expand_target(self.targets["reset"], n, self._neuron_size)
+        self._threshold = expand_target(self.targets["threshold"], n, self._neuron_size)
+
+        tau_mem = _seconds(expand_target(self.targets["tau_mem"], n, self._neuron_size))
+        tau_syn = _seconds(expand_target(self.targets["tau_syn"], n, self._neuron_size))
+        self._alpha = np.exp(-self.time_step / tau_syn)
+        self._beta = np.exp(-self.time_step / tau_mem)
+
+        refractory_time = _seconds(expand_target(self.targets["refractory_time"], n, self._neuron_size))
+        self._refractory_steps = np.round(refractory_time / self.time_step).astype(int)
+
+        # neurons of non-spiking layers never reach their threshold
+        boundaries = layer_boundaries(self.structure)
+        for l, layer in enumerate(self.structure[1:]):
+            if isinstance(layer, LayerSize) and not layer.spiking:
+                self._threshold[boundaries[l]:boundaries[l + 1]] = np.inf
+
+        self.baseline_cache.invalidate()
+
+        self._weights = None
+        self._source_weights = np.zeros((512, n))
+        self.weights_unrolled = np.zeros((256, 256), dtype=int)
+        self._offsets_unrolled = np.zeros((256, 256), dtype=int)
+
+    def set_readout(self, neuron_index: int, target="membrane"):
+        if target not in ("membrane", "exc_synin", "inh_synin"):
+            raise ValueError(f"Readout of {target} is not supported by the emulation.")
+        self._readout = (neuron_index, target)
+
+    def write_weights(self, *weights, dirty_rows_only=True):
+        """
+        Write the weights of all layers to the emulated synapse array.
+
+        :param weights: Weight matrices of shape `(inputs, size)` per layer.
+        :param dirty_rows_only: Ignored, accepted for compatibility with the `StrobeBackend`.
+        """
+
+        self._weights = weights
+
+        weights_unrolled, offsets_unrolled = unroll_weights(self.structure, weights, self._input_shift)
+        weights_unrolled = np.clip(weights_unrolled, -63, 63)
+
+        # rows of the synapse array are shared by neurons and external inputs and told apart by their offsets,
+        # sources are addressed like the events on chip, i.e. by `offset << 8 | row`
+        n = self._n_neurons
+        gain = self.weight_gain * self.synapse_bias / 1000
+        self._source_weights = gain * np.vstack([
+                np.where(offsets_unrolled[:, :n] == 0, weights_unrolled[:, :n], 0),
+                np.where(offsets_unrolled[:, :n] == 1, weights_unrolled[:, :n], 0)])
+
+        self.weights_unrolled = weights_unrolled
+        self._offsets_unrolled = offsets_unrolled
+
+    def load_ppu_program(self, program_path):
+        # the readout is emulated as well, no program is loaded
+        self._ppu_program_path = program_path
+
+    def plan_hw_batch(self, n_samples, record_madc=False, record_traces=True) -> HWBatchPlan:
+        """
+        Hardware batch a chip with the emulated configuration could run, cf. `StrobeBackend.plan_hw_batch`.
+        """
+
+        return plan_hw_batch(
+                n_samples, self._n_vectors, self.sample_separation, self._measure_correlation, record_madc,
+                record_traces=record_traces)
+
+    def run(
+            self, input_spikes, n_samples=None, duration=None, measure_power=False, trigger_reset=False,
+            record_madc=False, record_traces=True):
+        """
+        Emulate a hardware batch. Neurons start each sample at rest, i.e. as if the samples were well separated.
+
+        Returns spikes, CADC traces, PPU durations and correlation measurements in the formats of
+        `StrobeBackend.run`. Without `record_traces`, the traces are empty along the time axis.
+        """
+
+        if measure_power:
+            warnings.warn("Power consumption is not emulated.")
+
+        hw_batch_size = len(input_spikes)
+        n = self._n_neurons
+        n_steps = n_samples * self._substeps
+
+        # input events per time step, sample and source
+        counts = np.zeros((n_steps, hw_batch_size, 512))
+        for b in range(hw_batch_size):
+            if (input_spikes[b][:, 0] >= self.sample_separation).any():
+                warnings.warn("Not all spikes are injected within the timing separation window. Expecting faulty timing. Please increase sample separation.")
+
+            steps = (input_spikes[b][:, 0] // self.time_step).astype(int)
+            labels = input_spikes[b][:, 1].astype(int)
+
+            # shift inputs in case the first layer is recurrent
+            labels += self._input_shift
+            mask = (steps >= 0) & (steps < n_steps)
+            np.add.at(counts, (steps[mask], b, labels[mask]), 1)
+
+        membrane = np.repeat(self._leak[np.newaxis, :], hw_batch_size, axis=0)
+        current = np.zeros((hw_batch_size, n))
+        spikes = np.zeros((hw_batch_size, n), dtype=bool)
+        refractory = np.zeros((hw_batch_size, n), dtype=int)
+
+        cadc_data = np.empty((hw_batch_size, n_samples if record_traces else 0, n))
+        events = []
+
+        if record_madc:
+            madc_data = np.empty((hw_batch_size, n_steps))
+
+        if self._measure_correlation:
+            decay = np.exp(-self.time_step / self.correlation_tau)
+            presynaptic_trace = np.zeros((hw_batch_size, 512))
+            correlation = np.zeros((hw_batch_size, 512, n))
+
+        for t in range(n_steps):
+            if record_traces and t % self._substeps == 0:
+                cadc_data[:, t // self._substeps, :] = membrane
+
+            if record_madc:
+                madc_data[:, t] = self._probe(membrane, current)
+
+            # presynaptic traces of the correlation sensors include events of the current step
+            sources = counts[t]
+            sources[:, :n] += spikes
+
+            if self._measure_correlation:
+                presynaptic_trace *= decay
+                presynaptic_trace += sources
+
+            # spikes are delivered to their targets within one time step
+            current *= self._alpha
+            current += sources @ self._source_weights
+
+            membrane = self._leak + self._beta * (membrane - self._leak) + (1 - self._beta) * current
+            membrane[refractory > 0] = self._reset[np.nonzero(refractory > 0)[1]]
+            refractory[refractory > 0] -= 1
+
+            spikes = membrane > self._threshold
+            membrane[spikes] = self._reset[np.nonzero(spikes)[1]]
+            refractory[spikes] = self._refractory_steps[np.nonzero(spikes)[1]]
+
+            if spikes.any():
+                batch, unit = np.nonzero(spikes)
+                events.append(np.stack([batch, np.full(len(batch), t + 1), unit]))
+
+                if self._measure_correlation:
+                    correlation += presynaptic_trace[:, :, np.newaxis] * spikes[:, np.newaxis, :]
+
+        # group spikes according to samples and layers, times are relative to the start of each sample
+        events = np.hstack([np.empty((3, 0), dtype=int)] + events)
+        boundaries = layer_boundaries(self.structure)
+        spikes = [[] for l in range(len(self.structure) - 1)]
+        for b in range(hw_batch_size):
+            sample_events = events[:, events[0] == b]
+            for l in range(len(self.structure) - 1):
+                layer_mask = (sample_events[2] >= boundaries[l]) & (sample_events[2] < boundaries[l + 1])
+                s = np.stack([
+                        sample_events[1, layer_mask] * self.time_step,
+                        sample_events[2, layer_mask] - boundaries[l]], axis=1).astype(float)
+                spikes[l].append(s)
+
+        # CADC readout is quantized to 8 bit
+        cadc_data = (np.clip(np.round(cadc_data), 0, 255) / 256 * 1.2).astype(np.float32)
+
+        traces = []
+        for l in range(len(self.structure) - 1):
+            traces.append(cadc_data[:, :, boundaries[l]:boundaries[l + 1]])
+
+        # no PPU program is executed
+        durations = [0, 0]
+
+        causal_traces = []
+        if self._measure_correlation:
+            baseline = self.baseline_cache.get(self._measure_correlation_baseline)
+            self.baseline = baseline
+            causal_traces = self._correlation_measurement(correlation, baseline)
+
+        if record_madc:
+            sample_starts = TIMING_OFFSET + np.arange(hw_batch_size) * self.sample_separation
+            time = (sample_starts[:, np.newaxis] + np.arange(n_steps) * self.time_step).flatten()
+            self._madc_samples = np.stack([time, madc_data.flatten() / 256 * 1.2]).T
+
+        return spikes, traces, durations, causal_traces
+
+    def run_pipelined(
+            self, batches, n_samples=None, measure_power=False, trigger_reset=False, record_madc=False,
+            record_traces=True):
+        """
+        Emulate several hardware batches, cf. `StrobeBackend.run_pipelined`.
+        """
+
+        return [
+                self.run(b, n_samples, None, measure_power, trigger_reset, record_madc, record_traces)
+                for b in batches]
+
+    def _probe(self, membrane, current):
+        neuron_index, target = self._readout if self._readout is not None else (0, "membrane")
+        if target == "membrane":
+            return membrane[:, neuron_index]
+        elif target == "exc_synin":
+            return np.maximum(current[:, neuron_index], 0)
+        return np.maximum(-current[:, neuron_index], 0)
+
+    def _measure_correlation_baseline(self):
+        return np.full((len(self.correlation_rows), 256), self.correlation_baseline, dtype=int)
+
+    def _correlation_readout(self, source_correlation):
+        """
+        Readout of all correlation sensors in the layout of the chip, shape `(batch, 512, 256)`. Both synapses of a
+        signed pair observe the same events.
+        """
+
+        batch = len(source_correlation)
+        n = self._n_neurons
+        correlation = np.zeros((batch, 256, 256))
+        correlation[:, :, :n] = np.where(
+                self._offsets_unrolled[:, :n] == 1, source_correlation[:, 256:], source_correlation[:, :256])
+
+        # sensors saturate at zero
+        raw = np.round(self.correlation_baseline - self.correlation_gain * correlation)
+        raw = np.clip(raw, 0, self.correlation_baseline).astype(int).reshape(batch, -1)
+
+        readout = np.full((batch, 512 * 256), self.correlation_baseline, dtype=int)
+        for synapse in self._correlation_index:
+            readout[:, synapse.flatten()] = raw
+        return readout.reshape(batch, 512, 256)
+
+    def _correlation_measurement(self, source_correlation, baseline):
+        """
+        Read out the correlation sensors and decode the readouts like the `StrobeBackend`, i.e. summed across signed
+        pairs of synapses, arranged like the weights and split into the blocks of the individual layers.
+        """
+
+        raw_measurement = self._correlation_readout(source_correlation)[:, self.correlation_rows, :]
+
+        measurement = baseline - raw_measurement
+        self.baseline_cache.observe(baseline, measurement)
+
+        # rows that are not read out are decoded from a single row without correlation
+        measurement = np.concatenate([measurement, np.zeros_like(measurement[:, :1, :])], axis=1)
+        measurement = unroll_correlation(measurement, self._correlation_subset_index)
+
+        blocks = correlation_blocks(self.structure, measurement)
+        return [(measurement[b], *[m[b] for m in blocks], raw_measurement[b]) for b in range(len(measurement))]
@@ -0,0 +1,388 @@
+from typing import Callable, Sequence, Tuple
+
+import numpy as np
+import torch
+import torch.utils.checkpoint
+
+__all__ = [
+        "exponential_filter", "prepend_zero_step", "FusedLIF", "EventPropLIF", "integrate_checkpointed",
+        "integrate_events", "SparseSpikeProjection"]
+
+
+def exponential_filter(x: torch.Tensor, decay: float, dim: int = 1) -> torch.Tensor:
+    """
+    Solve the linear recurrence `y[t] = decay * y[t - 1] + x[t]` with `y[-1] = 0` along `dim` in one shot.
+
+    The recurrence is evaluated as a parallel prefix scan (Hillis-Steele), i.e. in `ceil(log2(n_steps))`
+    vectorized passes instead of `n_steps` sequential ones. All operations are differentiable, autograd
+    hence yields the same gradients as for the unrolled recurrence.
+
+    :param x: Input tensor.
+    :param decay: Decay factor applied per step.
+    :param dim: Dimension along which the recurrence runs.
+    """
+
+    n_steps = x.shape[dim]
+
+    y = x
+    shift = 1
+    factor = decay
+    while shift < n_steps:
+        y = torch.cat([
+            y.narrow(dim, 0, shift),
+            y.narrow(dim, shift, n_steps - shift) + factor * y.narrow(dim, 0, n_steps - shift)
+            ], dim=dim)
+        factor = factor * factor
+        shift *= 2
+
+    return y
+
+
+def prepend_zero_step(x: torch.Tensor) -> torch.Tensor:
+    """
+    Prepend a zeroed first time step to a tensor of shape `(batch_size, time_steps, units)`.
+    """
+
+    return torch.nn.functional.pad(x, (0, 0, 1, 0))
+
+
+def integrate_checkpointed(
+        step: Callable,
+        x: torch.Tensor,
+        state: Tuple,
+        measured: Tuple,
+        checkpoint_steps: int) -> Tuple:
+    """
+    Integrate a layer step by step, but only keep the autograd graph of chunks of `checkpoint_steps` steps
+    while they are recomputed during the backward pass. Activation memory hence scales with the chunk
+    length instead of the number of time steps.
+
+    :param step: Function mapping the input of step `t`, the state of step `t` and the measured values of step
+        `t + 1` to the state and a tuple of outputs of step `t + 1`.
+    :param x: Input of shape `(batch_size, time_steps, units)`.
+    :param state: Initial state of the first time step.
+    :param measured: Measured trajectories of shape `(batch_size, time_steps, size)` (may be empty).
+    :param checkpoint_steps: Number of time steps per recomputed chunk.
+
+    Returns a tuple of stacked outputs of shape `(batch_size, time_steps - 1, size)` for all but the first step.
+    """
+
+    n_steps = x.shape[1]
+
+    def integrate_chunk(start, stop, state):
+        outputs = []
+        for t in range(start, stop):
+            state, output = step(x[:, t, :], state, tuple(m[:, t + 1, :] for m in measured))
+            outputs.append(output)
+        return state, tuple(torch.stack(o, dim=1) for o in zip(*outputs))
+
+    chunks = []
+    for start in range(0, n_steps - 1, checkpoint_steps):
+        stop = min(start + checkpoint_steps, n_steps - 1)
+        state, outputs = torch.utils.checkpoint.checkpoint(
+                integrate_chunk, start, stop, state, use_reentrant=False)
+        chunks.append(outputs)
+
+    return tuple(torch.cat(o, dim=1) for o in zip(*chunks))
+
+
+def _integrate_lif(x: torch.Tensor, alpha, beta) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Integrate a layer of leaky integrate-and-fire neurons over preallocated buffers without autograd graph.
+
+    Returns spikes and membrane traces of shape `(batch_size, time_steps, size)`.
+    """
+
+    batch_size, n_steps, size = x.shape
+
+    # buffers are kept time-major such that every step operates on contiguous memory
+    traces = x.new_zeros((n_steps, batch_size, size))
+    spikes = x.new_zeros((n_steps, batch_size, size))
+    current = x.new_zeros((batch_size, size))
+    spike_mask = torch.empty((batch_size, size), dtype=torch.bool, device=x.device)
+
+    for t in range(n_steps - 1):
+        current.mul_(alpha).add_(x[:, t, :])
+
+        # membrane update including the reset of units that spiked in the previous step
+        torch.mul(traces[t], beta, out=traces[t + 1])
+        traces[t + 1].add_(current).sub_(spikes[t])
+
+        torch.gt(traces[t + 1], 1.0, out=spike_mask)
+        spikes[t + 1].copy_(spike_mask)
+
+    return spikes.transpose(0, 1), traces.transpose(0, 1)
+
+
+def _backpropagate_membrane(grad_membrane: torch.Tensor, alpha, beta) -> torch.Tensor:
+    """
+    Propagate gradients arriving at the membranes backward in time through membranes and synaptic currents
+    and return the gradient with respect to the input. Resets do not carry gradients.
+    """
+
+    # the first time step is not integrated
+    grad_membrane = grad_membrane[:, 1:, :].flip(1)
+    grad_currents = exponential_filter(exponential_filter(grad_membrane, beta), alpha).flip(1)
+
+    # the input of step t enters the current of step t + 1
+    return torch.nn.functional.pad(grad_currents, (0, 0, 0, 1))
+
+
+class FusedLIF(torch.autograd.Function):
+    """
+    Fused integration of a layer of leaky integrate-and-fire neurons.
+
+    The forward pass updates synaptic currents, membranes, resets and spikes in a single pass over
+    preallocated buffers without recording an autograd graph. Only the membranes are kept for the backward
+    pass, which recomputes the surrogate gradient of the activation function from them and propagates it
+    backward in time in closed form. Resets do not carry gradients, exactly as in the reference integration.
+
+    If measured `traces` and `spikes` are supplied, they are returned as forward values and the model
+    dynamics only determine the gradients (cf. `unterjubel`).
+    """
+
+    @staticmethod
+    def forward(
+            ctx,
+            x: torch.Tensor,
+            alpha: float,
+            beta: float,
+            activation: torch.autograd.Function,
+            activation_args: Sequence,
+            traces: torch.Tensor = None,
+            spikes: torch.Tensor = None):
+        if traces is None:
+            spikes, traces = _integrate_lif(x, alpha, beta)
+
+        ctx.alpha = alpha
+        ctx.beta = beta
+        ctx.activation = activation
+        ctx.activation_args = activation_args
+        ctx.save_for_backward(traces)
+
+        return spikes, traces
+
+    @staticmethod
+    def backward(ctx, grad_spikes, grad_traces):
+        traces, = ctx.saved_tensors
+
+        # gradient arriving at the membranes
+        grad_membrane = grad_traces + grad_spikes*ctx.activation.derivative(traces - 1.0, *ctx.activation_args)
+        grad_x = _backpropagate_membrane(grad_membrane, ctx.alpha, ctx.beta)
+
+        return grad_x, None, None, None, None, None, None
+
+
+class EventPropLIF(torch.autograd.Function):
+    """
+    Spike-time gradients of a layer of leaky integrate-and-fire neurons computed with the adjoint method
+    (cf. EventProp, Wunderlich and Pehle 2021), discretized like the Euler integration.
+
+    Gradients only enter at spike events: shifting spike `k` by one step changes the loss by
+    `g[t_k + 1] - g[t_k]`, where `g` is the gradient with respect to the dense spikes, and its crossing time
+    depends on the membrane via `-1/dv`, with `dv` the membrane slope at the crossing. The resulting adjoint
+    impulses are propagated backward in time through membranes and synaptic currents. Only the events and
+    their slopes are kept for the backward pass, i.e. memory scales with the number of spikes. Silent units
+    do not receive gradients and resets do not carry gradients.
+
+    If measured `traces` and `spikes` are supplied, they are returned as forward values, otherwise the layer is
+    simulated without autograd graph. The returned traces do not carry gradients.
+    """
+
+    @staticmethod
+    def forward(
+            ctx,
+            x: torch.Tensor,
+            alpha,
+            beta,
+            min_slope: float = 1e-2,
+            traces: torch.Tensor = None,
+            spikes: torch.Tensor = None):
+        if traces is None:
+            spikes, traces = _integrate_lif(x, alpha, beta)
+
+        batch, step, unit = torch.nonzero(spikes[:, 1:, :], as_tuple=True)
+        step = step + 1
+
+        # slope of the membrane at the threshold crossing, bounded to avoid diverging gradients
+        slopes = (traces[batch, step, unit] - traces[batch, step - 1, unit]).clamp(min=min_slope)
+
+        ctx.alpha = alpha
+        ctx.beta = beta
+        ctx.shape = spikes.shape
+        ctx.save_for_backward(batch, step, unit, slopes)
+        ctx.mark_non_differentiable(traces)
+
+        return spikes, traces
+
+    @staticmethod
+    def backward(ctx, grad_spikes, grad_traces):
+        batch, step, unit, slopes = ctx.saved_tensors
+
+        # loss change when delaying each spike by one step, spikes leaving the window do not contribute
+        grad_later = torch.nn.functional.pad(grad_spikes[:, 1:, :], (0, 0, 0, 1))
+        grad_times = grad_later[batch, step, unit] - grad_spikes[batch, step, unit]
+
+        grad_membrane = grad_spikes.new_zeros(ctx.shape)
+        grad_membrane[batch, step, unit] = -grad_times/slopes.to(grad_spikes.dtype)
+
+        return _backpropagate_membrane(grad_membrane, ctx.alpha, ctx.beta), None, None, None, None, None
+
+
+class SparseSpikeProjection(torch.autograd.Function):
+    """
+    Project binary spikes of shape `(batch_size, units)` through transposed weights of shape `(units, size)`,
+    only gathering the weights of the `active` units.
+
+    Gradients with respect to the spikes are computed densely, such that silent units still receive their
+    (surrogate) gradients exactly as for the dense projection.
+    """
+
+    @staticmethod
+    def forward(ctx, spikes: torch.Tensor, weight_t: torch.Tensor, active: torch.Tensor):
+        ctx.save_for_backward(spikes, weight_t, active)
+        return torch.mm(spikes[:, active], weight_t[active, :])
+
+    @staticmethod
+    def backward(ctx, grad_output):
+        spikes, weight_t, active = ctx.saved_tensors
+
+        grad_spikes = grad_weight_t = None
+        if ctx.needs_input_grad[0]:
+            grad_spikes = torch.mm(grad_output, weight_t.t())
+        if ctx.needs_input_grad[1]:
+            # silent units do not contribute to the weight gradient
+            grad_weight_t = torch.zeros_like(weight_t)
+            grad_weight_t[active, :] = torch.mm(spikes[:, active].t(), grad_output)
+
+        return grad_spikes, grad_weight_t, None
+
+
+def _free_membrane(current, membrane, k, alpha, beta):
+    """
+    Membrane potential `k` steps ahead in the absence of inputs, spikes and resets.
+    """
+
+    alpha_k = alpha**k
+    beta_k = beta**k
+    if alpha == beta:
+        gain = k*alpha_k
+    else:
+        gain = alpha*(alpha_k - beta_k)/(alpha - beta)
+    return beta_k*membrane + gain*current
+
+
+def _first_crossing(current, membrane, lo, hi, alpha, beta):
+    """
+    Smallest step `k` in `[lo, hi]` for which the free membrane exceeds the threshold (`inf` if there is none).
+    The free membrane has to be monotonic on the interval.
+    """
+
+    valid = lo <= hi
+    above_lo = _free_membrane(current, membrane, lo, alpha, beta) > 1.0
+    above_hi = _free_membrane(current, membrane, hi, alpha, beta) > 1.0
+
+    crossing = torch.where(valid & above_lo, lo, torch.full_like(lo, float("inf")))
+
+    # bisect increasing intervals, maintaining `f(lo) <= 1 < f(hi)`
+    search = valid & ~above_lo & above_hi
+    if search.any():
+        lo = lo.clone()
+        hi = hi.clone()
+        while (search & (hi - lo > 1)).any():
+            mid = torch.floor((lo + hi)/2)
+            above = _free_membrane(current, membrane, mid, alpha, beta) > 1.0
+            hi = torch.where(search & above, mid, hi)
+            lo = torch.where(search & ~above, mid, lo)
+        crossing = torch.where(search, hi, crossing)
+
+    return crossing
+
+
+def _next_crossing(current, membrane, n, alpha, beta):
+    """
+    Smallest step `k` in `[1, n]` for which the free membrane exceeds the threshold (`inf` if there is none).
+    """
+
+    # the free membrane is a sum of two exponentials and thus has at most one extremum
+    log_alpha = np.log(alpha)
+    log_beta = np.log(beta)
+    if alpha == beta:
+        extremum = -1.0/log_alpha - membrane/current
+    else:
+        ratio = -log_beta*((alpha - beta)*membrane - alpha*current)/(alpha*log_alpha*current)
+        extremum = torch.log(ratio)/(log_alpha - log_beta)
+
+    split = torch.where(torch.isnan(extremum), torch.full_like(extremum, n), torch.floor(extremum).clamp(0, n))
+
+    # search the monotonic segments left and right of the extremum
+    crossing = _first_crossing(current, membrane, torch.ones_like(split), split, alpha, beta)
+    return torch.where(
+            torch.isinf(crossing),
+            _first_crossing(current, membrane, split + 1, torch.full_like(split, n), alpha, beta),
+            crossing)
+
+
+def integrate_events(x: torch.Tensor, alpha: float, beta: float, sparse: bool = False) -> torch.Tensor:
+    """
+    Event-driven simulation of a layer of leaky integrate-and-fire neurons.
+
+    Time steps with input or pending resets are integrated exactly like the Euler reference. In between, the
+    synaptic currents and membranes are advanced analytically with the exact exponential solution, jumping
+    directly to the next input or threshold crossing. The cost hence scales with the number of events instead
+    of the number of time steps. No autograd graph is recorded.
+
+    :param x: Input of shape `(batch_size, time_steps, units)`.
+    :param alpha: Synaptic decay factor per time step.
+    :param beta: Membrane decay factor per time step.
+    :param sparse: Return the spikes as sparse COO tensor instead of a dense one.
+    """
+
+    batch_size, n_steps, size = x.shape
+
+    with torch.no_grad():
+        current = torch.zeros((batch_size, size), dtype=torch.float64, device=x.device)
+        membrane = torch.zeros_like(current)
+        spikes = torch.zeros_like(current)
+
+        input_steps = torch.nonzero(x[:, :-1, :].ne(0).any(dim=2).any(dim=0)).flatten().tolist()
+        input_steps.append(n_steps - 1)
+
+        events = []
+        t = 0
+        next_input = 0
+        while t < n_steps - 1:
+            if input_steps[next_input] == t or spikes.any():
+                # inputs and resets are integrated step by step
+                current = alpha*current + x[:, t, :]
+                membrane = beta*membrane + current - spikes
+                t += 1
+                if input_steps[next_input] < t:
+                    next_input += 1
+            else:
+                # advance analytically up to the next input or threshold crossing
+                gap = input_steps[next_input] - t
+                crossing = _next_crossing(current, membrane, gap, alpha, beta).min()
+                n = int(min(crossing, gap))
+
+                membrane = _free_membrane(current, membrane, n, alpha, beta)
+                current = alpha**n*current
+                t += n
+
+            spikes = (membrane > 1.0).to(membrane.dtype)
+            if spikes.any():
+                batch, unit = torch.nonzero(spikes, as_tuple=True)
+                events.append(torch.stack([batch, torch.full_like(batch, t), unit]))
+
+        if events:
+            indices = torch.cat(events, dim=1)
+        else:
+            indices = torch.empty((3, 0), dtype=torch.long, device=x.device)
+        values = torch.ones(indices.shape[1], dtype=x.dtype, device=x.device)
+
+        if sparse:
+            return torch.sparse_coo_tensor(indices, values, (batch_size, n_steps, size))
+
+        dense = torch.zeros_like(x)
+        dense[tuple(indices)] = values
+        return dense
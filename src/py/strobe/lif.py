@@ -1,4 +1,4 @@
-from typing import Dict
+from typing import Dict, Sequence, Tuple
 
 import numpy as np
 import torch
@@ -6,29 +6,86 @@ import torch
 from .base import StrobeLayer
 from .activations import SuperSpike
 from .unterjubel import unterjubel
+from .integration import exponential_filter, prepend_zero_step, integrate_checkpointed, integrate_events
+from .integration import FusedLIF, EventPropLIF, SparseSpikeProjection
 
 
 class LILayer(StrobeLayer):
-    def __init__(self, size: int, params: Dict) -> None:
+    def __init__(self, size: int, params: Dict, integration: str = "euler", checkpoint_steps: int = None) -> None:
+        """
+        A layer of non-spiking leaky integrators.
+
+        :param size: Size of the layer.
+        :param params: Neuron parameters 'tau_mem' and 'tau_syn', each either a scalar or given per neuron with
+            shape `(size,)`.
+        :param integration: Either "euler" for the step-by-step reference integration or "scan" to
+            compute the whole trajectory at once via a parallel prefix scan.
+        :param checkpoint_steps: Recompute the Euler integration in chunks of this many time steps during the
+            backward pass instead of storing the whole autograd graph.
+        """
+
         super(LILayer, self).__init__()
         self.size = size
         self.params = params
 
+        if integration not in ("euler", "scan"):
+            raise ValueError(f"Unknown integration mode '{integration}'.")
+        if checkpoint_steps is not None and integration != "euler":
+            raise ValueError("Checkpointing is only supported for the Euler integration.")
+        self.integration = integration
+        self.checkpoint_steps = checkpoint_steps
+
+    def _step(
+            self,
+            x: torch.Tensor,
+            state: Tuple[torch.Tensor, torch.Tensor],
+            measured: Sequence[torch.Tensor],
+            alpha: float,
+            beta: float):
+        current, membrane = state
+
+        current = alpha*current + x
+        membrane_model = beta*membrane + current
+        if self.on_hx:
+            membrane = unterjubel(membrane_model, measured[0])
+        else:
+            membrane = membrane_model
+
+        return (current, membrane), (membrane, )
+
     def forward(self, x: torch.Tensor) -> torch.Tensor:
         n_steps = x.shape[1]
         if self.on_hx and not self.training:
             return self.traces
         elif not self.on_hx:
-            self.traces = torch.empty((x.shape[0], n_steps, self.size), device=x.device)
+            self.traces = torch.empty((x.shape[0], n_steps, self.size), device=x.device, dtype=self.precision.traces)
             self.traces[:, 0, :] = 0
+        else:
+            self._cast_measurements()
 
-        currents = torch.empty_like(self.traces, device=x.device)
-        currents[:, 0, :] = 0
+        x = self._dense_input(x)
 
         assert (self.traces[:, 0, :] == 0).all()
 
-        alpha = np.exp(-self.time_step/self.params["tau_syn"])
-        beta = np.exp(-self.time_step/self.params["tau_mem"])
+        alpha, beta = self.decay_factors(x.device, x.dtype)
+
+        if self.integration == "scan":
+            # the leaky integrator is a linear filter, integrate currents and membrane in one shot
+            currents = exponential_filter(x[:, :-1], alpha)
+            membrane_model = prepend_zero_step(exponential_filter(currents, beta))
+            self.traces = unterjubel(membrane_model, self.traces, self.on_hx)
+            return self.traces
+
+        if self.checkpoint_steps is not None:
+            state = (torch.zeros_like(self.traces[:, 0, :]), self.traces[:, 0, :])
+            measured = (self.traces, ) if self.on_hx else ()
+            traces, = integrate_checkpointed(
+                    lambda *args: self._step(*args, alpha, beta), x, state, measured, self.checkpoint_steps)
+            self.traces = torch.cat([self.traces[:, :1, :], traces], dim=1)
+            return self.traces
+
+        currents = torch.empty_like(self.traces, device=x.device)
+        currents[:, 0, :] = 0
 
         for t in range(n_steps - 1):
             currents[:, t+1, :] = alpha*currents[:, t, :] + x[:, t]
@@ -44,19 +101,58 @@ class LIFLayer(StrobeLayer):
             size: int,
             params: Dict,
             activation: torch.autograd.Function = SuperSpike,
-            activation_kwargs: Dict = {}) -> None:
+            activation_kwargs: Dict = {},
+            integration: str = "euler",
+            checkpoint_steps: int = None,
+            sparse_spikes: bool = False,
+            gradient: str = "surrogate") -> None:
         """
         A feedforward layer if leaky integrate-and-fire neurons.
 
         :param size: Size of the layer.
+        :param params: Neuron parameters 'tau_mem', 'tau_syn' and optionally 'refractory_time', each either a
+            scalar or given per neuron with shape `(size,)`.
         :param activation: The activation function to be used in the forward and backward pass.
         :param activation_kwargs: Parameters to be given to the activation function.
+        :param integration: Either "euler" for the step-by-step reference integration, "scan" to
+            compute the synaptic currents (and, on measured traces, also the membrane) at once, "fused"
+            to integrate with the `FusedLIF` kernel, or "event" for an event-driven simulation without gradients.
+        :param checkpoint_steps: Recompute the Euler integration in chunks of this many time steps during the
+            backward pass instead of storing the whole autograd graph.
+        :param sparse_spikes: Return spikes as sparse COO tensor (event-driven integration only).
+        :param gradient: Either "surrogate" to back-propagate through all time steps with the surrogate gradient
+            of the activation function or "adjoint" for spike-time gradients only evaluated at spike events
+            (`EventPropLIF`), whose memory scales with the number of spikes.
         """
 
         super(LIFLayer, self).__init__()
         self.size = size
         self.params = params
 
+        if integration not in ("euler", "scan", "fused", "event"):
+            raise ValueError(f"Unknown integration mode '{integration}'.")
+        if integration == "fused" and not hasattr(activation, "derivative"):
+            raise ValueError("Fused integration requires an activation function providing its derivative.")
+        if checkpoint_steps is not None and integration != "euler":
+            raise ValueError("Checkpointing is only supported for the Euler integration.")
+        if sparse_spikes and integration != "event":
+            raise ValueError("Sparse spikes are only supported for the event-driven integration.")
+        if integration == "event" and (np.ndim(params["tau_syn"]) or np.ndim(params["tau_mem"])):
+            raise ValueError("The event-driven integration requires time constants shared by all neurons.")
+        if "refractory_time" in params and (integration not in ("euler", "scan") or checkpoint_steps is not None):
+            raise ValueError("Refractoriness is only supported for the Euler and scan integrations.")
+        if gradient not in ("surrogate", "adjoint"):
+            raise ValueError(f"Unknown gradient mode '{gradient}'.")
+        if gradient == "adjoint" and (integration != "euler" or checkpoint_steps is not None):
+            raise ValueError("Adjoint gradients replace the Euler integration and can not be combined with others.")
+        if gradient == "adjoint" and "refractory_time" in params:
+            raise ValueError("Adjoint gradients do not support refractoriness.")
+        self.integration = integration
+        self.checkpoint_steps = checkpoint_steps
+        self.sparse_spikes = sparse_spikes
+        self.gradient = gradient
+
+        self.activation = activation
         self.activation_function = activation.apply
         self.activation_args = activation.process_arguments(activation_kwargs)
 
@@ -68,6 +164,27 @@ class LIFLayer(StrobeLayer):
 
         return self.activation_function(*args, *self.activation_args)
 
+    def _step(
+            self,
+            x: torch.Tensor,
+            state: Tuple[torch.Tensor, torch.Tensor, torch.Tensor],
+            measured: Sequence[torch.Tensor],
+            alpha: float,
+            beta: float):
+        current, membrane, spikes = state
+
+        current = alpha*current + x
+        model_membrane = beta*membrane + current
+        if self.on_hx:
+            membrane = unterjubel(model_membrane, measured[0])
+            spikes = unterjubel(self.spike(membrane - 1.0), measured[1])
+        else:
+            # reset units that spiked in the previous step
+            membrane = model_membrane - spikes.detach()
+            spikes = self.spike(membrane - 1.0)
+
+        return (current, membrane, spikes), (membrane, spikes)
+
     def forward(self, x: torch.Tensor) -> torch.Tensor:
         """
         The forward pass of a feedforward layer of leaky integrate-and-fire neurons.
@@ -81,27 +198,77 @@ class LIFLayer(StrobeLayer):
         # check if we need the forward intergration (i.e. for backward or if not on hardware)
         if self.on_hx and not self.training:
             return self.spikes
-        elif not self.on_hx:
+        elif self.on_hx:
+            self._cast_measurements()
+
+        x = self._dense_input(x)
+
+        # fetch (cached) synaptic and membrane decay factors
+        alpha, beta = self.decay_factors(x.device, x.dtype)
+
+        if self.integration == "fused":
+            # the fused kernel allocates its own buffers unless they were populated by a hardware run
+            measured = (self.traces, self.spikes) if self.on_hx else ()
+            self.spikes, self.traces = FusedLIF.apply(
+                    x, alpha, beta, self.activation, tuple(self.activation_args), *measured)
+            return self.spikes
+
+        if self.gradient == "adjoint":
+            # only spike events are kept for the backward pass
+            measured = (self.traces, self.spikes) if self.on_hx else ()
+            self.spikes, self.traces = EventPropLIF.apply(x, alpha, beta, 1e-2, *measured)
+            return self.spikes
+
+        if self.integration == "event":
+            if self.on_hx or (self.training and torch.is_grad_enabled()):
+                raise RuntimeError("The event-driven integration does not provide gradients, use it for evaluation.")
+            # membranes are only evaluated at events and hence not recorded
+            self.traces = None
+            self.spikes = integrate_events(x, alpha, beta, self.sparse_spikes).to(self.precision.spikes)
+            return self.spikes
+
+        if not self.on_hx:
             # initialize trace and spike data structures if they were not populated by a hardware run
-            self.traces = torch.empty((x.shape[0], n_steps, self.size), device=x.device)
+            self.traces = torch.empty((x.shape[0], n_steps, self.size), device=x.device, dtype=self.precision.traces)
             self.traces[:, 0, :] = 0
 
             self.spikes = torch.zeros_like(self.traces, device=x.device)
 
-        currents = torch.empty_like(self.traces, device=x.device)
-        currents[:, 0, :] = 0
-
         # all units should have a zeroed first timestep
         assert (self.traces[:, 0, :] == 0).all()
 
-        # calculate synaptic and membrane decay factors
-        alpha = np.exp(-self.time_step/self.params["tau_syn"])
-        beta = np.exp(-self.time_step/self.params["tau_mem"])
+        if self.integration == "scan":
+            # synaptic currents are not affected by resets and can be integrated in one shot
+            currents = prepend_zero_step(exponential_filter(x[:, :-1], alpha))
+
+            if self.on_hx:
+                # without resets in the model, the membrane is a linear filter of the currents as well
+                model_membrane = prepend_zero_step(exponential_filter(currents[:, 1:], beta))
+                self.traces = unterjubel(model_membrane, self.traces)
+                self.spikes = unterjubel(self.spike(self.traces - 1.0), self.spikes)
+                return self.spikes
+        elif self.checkpoint_steps is not None:
+            state = (torch.zeros_like(self.traces[:, 0, :]), self.traces[:, 0, :], self.spikes[:, 0, :])
+            measured = (self.traces, self.spikes) if self.on_hx else ()
+            traces, spikes = integrate_checkpointed(
+                    lambda *args: self._step(*args, alpha, beta), x, state, measured, self.checkpoint_steps)
+            self.traces = torch.cat([self.traces[:, :1, :], traces], dim=1)
+            self.spikes = torch.cat([self.spikes[:, :1, :], spikes], dim=1)
+            return self.spikes
+        else:
+            currents = torch.empty_like(self.traces, device=x.device)
+            currents[:, 0, :] = 0
+
+        # remaining refractory steps per unit, measured traces already include refractoriness
+        refractory_steps = None if self.on_hx else self.refractory_steps(x.device)
+        if refractory_steps is not None:
+            refractory = torch.zeros(self.traces[:, 0, :].shape, dtype=torch.long, device=x.device)
 
         # Euler integration
         for t in range(n_steps - 1):
             # update synaptic currents
-            currents[:, t+1, :] = alpha*currents[:, t, :] + x[:, t, :]
+            if self.integration == "euler":
+                currents[:, t+1, :] = alpha*currents[:, t, :] + x[:, t, :]
 
             # calculate membrane update
             model_membrane = beta*self.traces[:, t, :] + currents[:, t+1, :]
@@ -115,6 +282,10 @@ class LIFLayer(StrobeLayer):
                 spike_mask = self.spikes[:, t, :] == 1
                 self.traces[:, t+1, :][spike_mask] -= 1.0
 
+            # clamp refractory units to the reset potential
+            if refractory_steps is not None:
+                self.traces[:, t+1, :][refractory > 0] = 0.0
+
             # calculate/apply spikes
             model_spikes = self.spike(self.traces[:, t+1, :] - 1.0)
             if self.on_hx:
@@ -122,6 +293,9 @@ class LIFLayer(StrobeLayer):
             else:
                 self.spikes[:, t+1, :] = model_spikes
 
+            if refractory_steps is not None:
+                refractory = torch.where(self.spikes[:, t+1, :] == 1, refractory_steps, (refractory - 1).clamp(min=0))
+
         return self.spikes
 
 
@@ -132,20 +306,33 @@ class RecurrentLIFLayer(StrobeLayer):
             params: Dict,
             recurrent_projection: StrobeLayer,
             activation: torch.autograd.Function = SuperSpike,
-            activation_kwargs: Dict = {}) -> None:
+            activation_kwargs: Dict = {},
+            checkpoint_steps: int = None,
+            sparse_threshold: float = None) -> None:
         """
         A feedforward layer if leaky integrate-and-fire neurons.
 
         :param size: Size of the layer.
+        :param params: Neuron parameters 'tau_mem', 'tau_syn' and optionally 'refractory_time', each either a
+            scalar or given per neuron with shape `(size,)`.
         :param recurrent_projection: Weight layer of shape `(size, size)` for recurrency.
         :param activation: The activation function to be used in the forward and backward pass.
         :param activation_kwargs: Parameters to be given to the activation function.
+        :param checkpoint_steps: Recompute the integration in chunks of this many time steps during the
+            backward pass instead of storing the whole autograd graph.
+        :param sparse_threshold: Only gather the recurrent weights of units that spiked in the previous time
+            step whenever their fraction is at most this value.
         """
 
         super(RecurrentLIFLayer, self).__init__()
         self.size = size
         self.params = params
+
+        if "refractory_time" in params and checkpoint_steps is not None:
+            raise ValueError("Refractoriness is not supported for the checkpointed integration.")
         self.recurrent_projection = recurrent_projection
+        self.checkpoint_steps = checkpoint_steps
+        self.sparse_threshold = sparse_threshold
 
         self.activation_function = activation.apply
         self.activation_args = activation.process_arguments(activation_kwargs)
@@ -158,6 +345,46 @@ class RecurrentLIFLayer(StrobeLayer):
 
         return self.activation_function(*args, *self.activation_args)
 
+    def _recurrent_current(
+            self,
+            current: torch.Tensor,
+            spikes: torch.Tensor,
+            weight_t: torch.Tensor = None) -> torch.Tensor:
+        """
+        Add the recurrent input caused by `spikes` of the previous time step to `current`.
+        """
+
+        if weight_t is None:
+            return current + self.recurrent_projection(spikes).to(current.dtype)
+
+        if self.sparse_threshold is not None:
+            active = spikes.detach().any(dim=0)
+            if active.sum() <= self.sparse_threshold*self.size:
+                return current + SparseSpikeProjection.apply(spikes, weight_t, torch.nonzero(active).flatten())
+
+        return torch.addmm(current, spikes, weight_t)
+
+    def _step(
+            self,
+            x: torch.Tensor,
+            state: Tuple[torch.Tensor, torch.Tensor, torch.Tensor],
+            measured: Sequence[torch.Tensor],
+            alpha: float,
+            beta: float):
+        current, membrane, spikes = state
+
+        current = alpha*current + x + self.recurrent_projection(spikes).to(x.dtype)
+        model_membrane = beta*membrane + current
+        if self.on_hx:
+            membrane = unterjubel(model_membrane, measured[0])
+            spikes = unterjubel(self.spike(membrane - 1.0), measured[1])
+        else:
+            # reset units that spiked in the previous step
+            membrane = model_membrane - spikes.detach()
+            spikes = self.spike(membrane - 1.0)
+
+        return (current, membrane, spikes), (membrane, spikes)
+
     def forward(self, x: torch.Tensor) -> torch.Tensor:
         """
         The forward pass of a layer of leaky integrate-and-fire neurons.
@@ -173,23 +400,49 @@ class RecurrentLIFLayer(StrobeLayer):
             return self.spikes
         elif not self.on_hx:
             # initialize trace and spike data structures if they were not populated by a hardware run
-            self.traces = torch.empty((x.shape[0], n_steps, self.size), device=x.device)
+            self.traces = torch.empty((x.shape[0], n_steps, self.size), device=x.device, dtype=self.precision.traces)
             self.traces[:, 0, :] = 0
 
             self.spikes = torch.zeros_like(self.traces, device=x.device)
+        else:
+            self._cast_measurements()
+
+        x = self._dense_input(x)
 
         # all units should have a zeroed first timestep
         assert (self.traces[:, 0, :] == 0).all()
 
-        # calculate synaptic and membrane decay factors
-        alpha = np.exp(-self.time_step/self.params["tau_syn"])
-        beta = np.exp(-self.time_step/self.params["tau_mem"])
+        # fetch (cached) synaptic and membrane decay factors
+        alpha, beta = self.decay_factors(x.device, x.dtype)
+
+        if self.checkpoint_steps is not None:
+            state = (torch.zeros_like(self.traces[:, 0, :]), self.traces[:, 0, :], self.spikes[:, 0, :])
+            measured = (self.traces, self.spikes) if self.on_hx else ()
+            traces, spikes = integrate_checkpointed(
+                    lambda *args: self._step(*args, alpha, beta), x, state, measured, self.checkpoint_steps)
+            self.traces = torch.cat([self.traces[:, :1, :], traces], dim=1)
+            self.spikes = torch.cat([self.spikes[:, :1, :], spikes], dim=1)
+            return self.spikes
+
+        # fetch the recurrent weights once, such that they can be fused with the feedforward input, in the data
+        # type of the integration (gradients are cast back to the type of the weights)
+        weight = getattr(self.recurrent_projection, "weight", None)
+        weight_t = weight.t().to(self.precision.traces) if weight is not None else None
+
+        # spikes are written to a preallocated output, measured spikes are only read
+        spikes = torch.empty_like(self.traces)
+        spikes[:, 0, :] = self.spikes[:, 0, :]
+
+        s = self.spikes[:, 0, :]
+        current = torch.zeros_like(self.traces[:, 0, :])
+
+        # remaining refractory steps per unit, measured traces already include refractoriness
+        refractory_steps = None if self.on_hx else self.refractory_steps(x.device)
+        if refractory_steps is not None:
+            refractory = torch.zeros(current.shape, dtype=torch.long, device=x.device)
 
-        spikes = [self.spikes[:, 0]]
-        current = 0
         for t in range(1, n_steps):
-            current = alpha*current + x[:, t - 1, :]
-            current += self.recurrent_projection(spikes[-1])
+            current = self._recurrent_current(alpha*current + x[:, t - 1, :], s, weight_t)
             model_trace = beta*self.traces[:, t - 1, :] + current
             if self.on_hx:
                 self.traces[:, t, :] = unterjubel(model_trace, self.traces[:, t, :])
@@ -198,8 +451,12 @@ class RecurrentLIFLayer(StrobeLayer):
 
             # apply reset in case we do not operate on measured traces
             if not self.on_hx:
-                spike_mask = self.spikes[:, t, :] == 1
-                self.traces[:, t+1, :][spike_mask] -= 1.0
+                spike_mask = s == 1
+                self.traces[:, t, :][spike_mask] -= 1.0
+
+            # clamp refractory units to the reset potential
+            if refractory_steps is not None:
+                self.traces[:, t, :][refractory > 0] = 0.0
 
             # calculate/apply spikes
             model_spikes = self.spike(self.traces[:, t, :] - 1.0)
@@ -207,7 +464,10 @@ class RecurrentLIFLayer(StrobeLayer):
                 s = unterjubel(model_spikes, self.spikes[:, t, :])
             else:
                 s = model_spikes
-            spikes.append(s)
-        self.spikes = torch.stack(spikes).permute(1, 0, 2)
+            spikes[:, t, :] = s
+
+            if refractory_steps is not None:
+                refractory = torch.where(s == 1, refractory_steps, (refractory - 1).clamp(min=0))
+        self.spikes = spikes
 
         return self.spikes
@@ -1,25 +1,33 @@
 import os.path
+from typing import TYPE_CHECKING, Sequence, Union
 import numpy as np
 import torch
 
-import pyhxcomm_vx as hxcomm
-
-from .base import StrobeLayer
-from .projections import Linear, SigmoidalWeights, Dropout
+from .base import StrobeLayer, Precision
+from .parallel import DataParallelBackend
+from .projections import Linear, SigmoidalWeights, Dropout, weight_version
+from .spikes import SpikeTrains
 from .lif import LILayer, LIFLayer, RecurrentLIFLayer
+from .structure import LayerSize
+
+if TYPE_CHECKING:
+    import pyhxcomm_vx as hxcomm
 
 
 class Network(torch.nn.Sequential):
     def __init__(
             self,
             *layers: StrobeLayer,
-            interpolation: int = 1):
+            interpolation: int = 1,
+            precision: Precision = Precision()):
         """
         A network of sequential layers of spiking neurons, trained with the STROBE framework.
 
         :param layers: Layers of the network.
         :param interpolation: Interpolate between CADC samples to achieve a finer grained integration.
             In case of hardware-less this simply results in a smaller integration time step.
+        :param precision: Data types of traces and spikes, propagated to all layers. Reduced precision
+            (e.g. `torch.bfloat16` traces and `torch.uint8` spikes) lowers memory footprint and bandwidth.
         """
 
         super(Network, self).__init__(*layers)
@@ -27,6 +35,9 @@ class Network(torch.nn.Sequential):
         for name, layer in self.named_children():
             if not isinstance(layer, StrobeLayer):
                 raise TypeError("The layer you are trying to register is not a StrobeLayer. Good luck!")
+            layer.precision = precision
+
+        self.precision = precision
 
         self.backend = None
         self.neuron_parameters = None
@@ -40,30 +51,50 @@ class Network(torch.nn.Sequential):
         # alignment of traces and spikes from chip
         self._spike_shift = 1.7e-6 / self._interpolation
         self._weights = []
+        self._weights_version = None
 
         self._record_madc = False
 
     def connect(
             self,
-            connection: hxcomm.ManagedConnection,
-            calibration: str = None,
+            connection: Union["hxcomm.ManagedConnection", Sequence["hxcomm.ManagedConnection"]],
+            calibration: Union[str, Sequence[str]] = None,
             synapse_bias: int = 1000,
             sample_separation: float = 500e-6,
-            inference_mode: bool = False):
+            inference_mode: bool = False,
+            pipelined: bool = False,
+            emulate: bool = False):
         """
         A network of sequential layers of spiking neurons, trained with the STROBE framework.
 
-        :param calibration: Path to the calibration file generated via calix.
+        :param connection: Connection to a chip. Passing several connections trains data-parallel across all of
+            them, distributing the hardware batches to the chips running concurrently.
+        :param calibration: Path to the calibration file generated via calix, or one path per connection. When
+            emulating, the calibration targets can be passed directly as a dictionary.
         :param synapse_bias: Bias setting for the synapse circuits to module their overall strength.
         :param sample_separation: Separation of samples in a harware batch.
+        :param pipelined: Build and decode hardware batches on worker threads while the chip executes. With
+            several connections, hardware batches are then assigned to the chips in turns instead of by load.
+        :param emulate: Simulate the chip in software via the `EmulatedStrobeBackend` instead of using the
+            connection.
         """
 
         self.inference_mode = inference_mode
-
-        from .backend import StrobeBackend, LayerSize, FPGA_MEMORY_SIZE
-
-        self.fpga_memory_size = FPGA_MEMORY_SIZE
-        self.neuron_parameters = np.load(calibration, allow_pickle=True)["targets"].item()
+        self.pipelined = pipelined
+
+        connections = list(connection) if isinstance(connection, (list, tuple)) else [connection]
+        if isinstance(calibration, (list, tuple)):
+            if len(calibration) != len(connections):
+                raise ValueError("A calibration is required for each connection.")
+            calibrations = list(calibration)
+        else:
+            calibrations = [calibration] * len(connections)
+
+        # all chips are calibrated to the same targets
+        if isinstance(calibrations[0], dict):
+            self.neuron_parameters = calibrations[0]
+        else:
+            self.neuron_parameters = np.load(calibrations[0], allow_pickle=True)["targets"].item()
 
         weight_layers, self.neuron_layers = self.squash()
         structure = [weight_layers[0].shape[1]]
@@ -74,7 +105,25 @@ class Network(torch.nn.Sequential):
             spiking = not isinstance(n, LILayer)
             structure.append(LayerSize(w.shape[0], recurrent=recurrent, spiking=spiking))
 
-        self.backend = StrobeBackend(connection, structure, calibration, synapse_bias, sample_separation)
+        backends = []
+        for c, calib in zip(connections, calibrations):
+            if emulate:
+                from .emulation import EmulatedStrobeBackend
+                targets = calib if isinstance(calib, dict) else self.neuron_parameters
+                backends.append(EmulatedStrobeBackend(c, structure, targets, synapse_bias, sample_separation))
+            else:
+                from .backend import StrobeBackend
+                backends.append(StrobeBackend(c, structure, calib, synapse_bias, sample_separation))
+
+        if len(backends) > 1:
+            self.backend = DataParallelBackend(
+                    backends, schedule="round_robin" if pipelined else "load", pipelined=pipelined)
+        else:
+            self.backend = backends[0]
+
+        # the weights have to be written to the freshly configured chip
+        self._weights = []
+        self._weights_version = None
 
         self.backend.configure()
         self.backend.load_ppu_program(os.path.join(os.path.dirname(__file__), "../../bin/strobe.bin"))
@@ -115,6 +164,12 @@ class Network(torch.nn.Sequential):
         return weight_layers, neuron_layers
 
     def synchronize_hardware(self, force=False):
+        # skip squashing and comparing the weights if none of them changed since the last synchronization
+        version = weight_version(self.modules())
+        if not force and version == self._weights_version:
+            return
+        self._weights_version = version
+
         weights, _ = self.squash()
         weights = [np.round(w.T.detach().numpy().copy()) for w in weights]
 
@@ -126,7 +181,7 @@ class Network(torch.nn.Sequential):
 
         if update:
             self._weights = weights
-            self.backend.write_weights(*weights)
+            self.backend.write_weights(*weights, dirty_rows_only=not force)
 
     def forward(self, x):
         if self.backend is not None:
@@ -134,65 +189,97 @@ class Network(torch.nn.Sequential):
             batch_size = x.shape[0]
             n_steps = x.shape[1]
 
-            # calculate maximum batch size where traces fit into FPGA memory
-            max_hw_batch_size = int(np.floor(self.fpga_memory_size / n_steps / self.backend._n_vectors / 128))
+            # evaluating spiking layers in inference mode requires their spikes only, skipping the trace readout
+            record_traces = not (
+                    self.inference_mode and not self.training
+                    and not any(isinstance(layer, LILayer) for layer in self.neuron_layers))
+
+            # calculate maximum batch size fitting into a single playback program
+            max_hw_batch_size = self.backend.plan_hw_batch(
+                    n_steps // self._interpolation, self._record_madc, record_traces).size
             hw_batch_size = min(batch_size, max_hw_batch_size)
+            if isinstance(self.backend, DataParallelBackend):
+                # spread the batch across all chips
+                n_hw_batches = max(int(np.ceil(batch_size / hw_batch_size)), len(self.backend))
+                hw_batch_size = int(np.ceil(batch_size / n_hw_batches))
 
             self.synchronize_hardware()
 
             self.batch_durations = np.zeros((batch_size, 2))
 
+            # sparse inputs are answered with sparse spikes, avoiding dense conversions in both directions
+            sparse = x.is_sparse
+
             layered_traces = []
             layered_spikes = []
+            layered_events = []
             for l, layer in enumerate(self.neuron_layers):
-                layered_traces.append(torch.zeros((batch_size, n_steps, layer.size), device=x.device))
-                layered_spikes.append(torch.zeros((batch_size, n_steps, layer.size), device=x.device))
+                layered_traces.append(torch.zeros(
+                        (batch_size, n_steps, layer.size), device=x.device, dtype=self.precision.traces)
+                        if record_traces else None)
+                if sparse:
+                    layered_events.append([])
+                else:
+                    layered_spikes.append(torch.zeros(
+                            (batch_size, n_steps, layer.size), device=x.device, dtype=self.precision.spikes))
+
+            # encode all input spike trains at once, sub-batches are views
+            input_spikes = SpikeTrains.from_tensor(x, self.time_step, self._spike_shift, 256)
 
             hw_batch_bounds = np.arange(0, batch_size, hw_batch_size)
-            for s in [slice(i, min(batch_size + 1, i + hw_batch_size)) for i in hw_batch_bounds]:
-                hw_x = x[s, :, :]
-
-                input_spikes = []
-                for b in range(hw_x.shape[0]):
-                    spike_bins = np.where(hw_x[b].T.cpu())
-                    labels = spike_bins[0] + 256
-                    times = spike_bins[1].astype(np.float) * self.time_step + self._spike_shift
-
-                    # sort spike train according to injection times
-                    order = np.argsort(times)
-                    input_spikes.append(np.vstack([times[order], labels[order]]).T)
-
-                for trial in range(5):
-                    spikes, traces, durations = self.backend.run(
-                            input_spikes,
-                            n_samples=n_steps // self._interpolation,
-                            record_madc=self._record_madc,
-                            trigger_reset=self.inference_mode)
-                    self.batch_durations[s, :] = np.array(durations)
+            hw_batches = [slice(i, min(batch_size, i + hw_batch_size)) for i in hw_batch_bounds]
+            run_kwargs = dict(
+                    n_samples=n_steps // self._interpolation,
+                    record_madc=self._record_madc,
+                    trigger_reset=self.inference_mode,
+                    record_traces=record_traces)
+
+            if self.pipelined or isinstance(self.backend, DataParallelBackend):
+                # overlap host-side program generation and decoding with the execution on chip(s)
+                results = self.backend.run_pipelined([input_spikes[s] for s in hw_batches], **run_kwargs)
+            else:
+                results = (self.backend.run(input_spikes[s], **run_kwargs) for s in hw_batches)
+
+            for s, (spikes, traces, durations, _) in zip(hw_batches, results):
+                for trial in range(4):
                     if not (np.array(durations) > 85200).any():
                         break
-                    else:
-                        pass
+                    spikes, traces, durations, _ = self.backend.run(input_spikes[s], **run_kwargs)
+                self.batch_durations[s, :] = np.array(durations)
 
-                # normalize membrane traces
-                for t in traces:
-                    t -= self._trace_offset
-                    t *= self._trace_scale
-                    t -= t[:, 0, None]
+                if record_traces:
+                    # normalize membrane traces
+                    for t in traces:
+                        t -= self._trace_offset
+                        t *= self._trace_scale
+                        t -= t[:, 0, None]
 
+                    for l, layer in enumerate(self.neuron_layers):
+                        for i in range(self._interpolation):
+                            layered_traces[l][s, i::self._interpolation, :] = torch.from_numpy(traces[l])
+
+                # decode the spikes of all samples of a layer at once
                 for l, layer in enumerate(self.neuron_layers):
-                    for i in range(self._interpolation):
-                        layered_traces[l][s, i::self._interpolation, :] = torch.from_numpy(traces[l])
+                    events = np.concatenate([np.empty((0, 2))] + list(spikes[l]))
+                    samples = np.repeat(np.arange(s.start, s.stop), [len(e) for e in spikes[l]])
 
-                for b in range(hw_x.shape[0]):
-                    for l, layer in enumerate(self.neuron_layers):
-                        if spikes[l][b].size:
-                            hist = np.zeros((n_steps, layer.size))
-                            spike_times = spikes[l][b][:, 0] - self._spike_shift
-                            mask = spike_times < self.time_step * n_steps
-                            units = spikes[l][b][:, 1].astype(np.int)
-                            hist[(spike_times[mask] // self.time_step).astype(np.int), units[mask]] = 1
-                            layered_spikes[l][s, :, :][b, :, :] = torch.from_numpy(hist)
+                    spike_times = events[:, 0] - self._spike_shift
+                    mask = (spike_times >= 0) & (spike_times < self.time_step * n_steps)
+                    steps = (spike_times[mask] // self.time_step).astype(int)
+                    indices = np.vstack([samples[mask], steps, events[mask, 1].astype(int)])
+
+                    if sparse:
+                        layered_events[l].append(indices)
+                    else:
+                        layered_spikes[l][tuple(torch.from_numpy(indices).to(x.device))] = 1
+
+            if sparse:
+                for l, layer in enumerate(self.neuron_layers):
+                    indices = np.hstack(layered_events[l]) if layered_events[l] else np.empty((3, 0), dtype=int)
+                    indices = torch.from_numpy(indices).to(x.device)
+                    values = torch.ones(indices.shape[1], device=x.device, dtype=self.precision.spikes)
+                    layered_spikes.append(torch.sparse_coo_tensor(
+                            indices, values, (batch_size, n_steps, layer.size)).coalesce())
 
             for l, layer in enumerate(self.neuron_layers):
                 layer.inject(layered_spikes[l], layered_traces[l], self.neuron_parameters, self.time_step)
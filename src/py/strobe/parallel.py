@@ -0,0 +1,144 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Sequence
+
+import numpy as np
+
+from .pipeline import merge_results
+from .planning import HWBatchPlan
+
+
+class DataParallelBackend:
+    def __init__(self, backends: Sequence, schedule: str = "load", pipelined: bool = False):
+        """
+        Distribute hardware batches across several backends, e.g. one `StrobeBackend` per chip, each with its own
+        connection and calibration. The backends run concurrently, results are returned in the order of the
+        batches.
+
+        :param backends: Backends sharing the same network structure.
+        :param schedule: Either `load`, where each backend fetches the next pending batch as soon as it is idle,
+            or `round_robin`, where batch `i` is assigned to backend `i % len(backends)`.
+        :param pipelined: Process the batches assigned to a backend via its `run_pipelined`. Requires the
+            `round_robin` schedule, as the batches have to be known in advance.
+        """
+
+        if len(backends) == 0:
+            raise ValueError("At least one backend is required.")
+        if schedule not in ("load", "round_robin"):
+            raise ValueError(f"Schedule {schedule} is not supported.")
+        if pipelined and schedule != "round_robin":
+            raise ValueError("Pipelined execution requires the round_robin schedule.")
+
+        self.backends = list(backends)
+        self.schedule = schedule
+        self.pipelined = pipelined
+
+        # batches submitted via `run` are spread across the backends as well
+        self._next_backend = 0
+
+    def __len__(self):
+        return len(self.backends)
+
+    @property
+    def structure(self):
+        return self.backends[0].structure
+
+    def _broadcast(self, method: str, *args, **kwargs):
+        # every backend talks to its own chip, hence they are addressed concurrently
+        with ThreadPoolExecutor(max_workers=len(self.backends)) as executor:
+            futures = [executor.submit(getattr(b, method), *args, **kwargs) for b in self.backends]
+            return [f.result() for f in futures]
+
+    def configure(self, reduce_power=False, initialize=True):
+        self._broadcast("configure", reduce_power, initialize)
+
+    def load_ppu_program(self, program_path):
+        self._broadcast("load_ppu_program", program_path)
+
+    def set_readout(self, neuron_index: int, target="membrane"):
+        self._broadcast("set_readout", neuron_index, target)
+
+    def write_weights(self, *weights, dirty_rows_only=True):
+        """
+        Write the same weights to all backends.
+
+        :param weights: Weight matrices of shape `(inputs, size)` per layer.
+        :param dirty_rows_only: Only rewrite the synapse rows that changed since the previous call.
+        """
+
+        self._broadcast("write_weights", *weights, dirty_rows_only=dirty_rows_only)
+
+    def plan_hw_batch(self, n_samples, record_madc=False, record_traces=True) -> HWBatchPlan:
+        """
+        Hardware batch fitting into a single playback program on each of the backends.
+        """
+
+        plans = [b.plan_hw_batch(n_samples, record_madc, record_traces) for b in self.backends]
+        return HWBatchPlan(min(p.size for p in plans), max(p.duration for p in plans))
+
+    def run(
+            self, input_spikes, n_samples=None, duration=None, measure_power=False, trigger_reset=False,
+            record_madc=False, record_traces=True):
+        """
+        Execute a batch of samples. It is split evenly across all backends, respecting the size of hardware
+        batches. Smaller batches are passed to the backends in turns.
+        """
+
+        hw_batch_size = self.plan_hw_batch(n_samples, record_madc, record_traces).size
+        hw_batch_size = min(hw_batch_size, int(np.ceil(len(input_spikes) / len(self.backends))))
+
+        if len(input_spikes) <= hw_batch_size:
+            backend = self.backends[self._next_backend]
+            self._next_backend = (self._next_backend + 1) % len(self.backends)
+            return backend.run(
+                    input_spikes, n_samples, duration, measure_power, trigger_reset, record_madc, record_traces)
+
+        batches = [input_spikes[i:i + hw_batch_size] for i in range(0, len(input_spikes), hw_batch_size)]
+        return merge_results(self.run_pipelined(
+                batches, n_samples, measure_power, trigger_reset, record_madc, record_traces))
+
+    def run_pipelined(
+            self, batches, n_samples=None, measure_power=False, trigger_reset=False, record_madc=False,
+            record_traces=True):
+        """
+        Execute several hardware batches, distributed across all backends which run concurrently.
+
+        :param batches: Input spikes of each hardware batch, as passed to `run`.
+
+        Returns the results of `run` for each batch, in order.
+        """
+
+        run_kwargs = dict(
+                n_samples=n_samples, measure_power=measure_power, trigger_reset=trigger_reset, record_madc=record_madc,
+                record_traces=record_traces)
+        results = [None] * len(batches)
+
+        if self.schedule == "round_robin":
+            def work(b):
+                indices = range(b, len(batches), len(self.backends))
+                backend = self.backends[b]
+                if self.pipelined:
+                    share = backend.run_pipelined([batches[i] for i in indices], **run_kwargs)
+                else:
+                    share = [backend.run(batches[i], **run_kwargs) for i in indices]
+                for i, result in zip(indices, share):
+                    results[i] = result
+        else:
+            pending = queue.Queue()
+            for i in range(len(batches)):
+                pending.put(i)
+
+            def work(b):
+                while True:
+                    try:
+                        i = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    results[i] = self.backends[b].run(batches[i], **run_kwargs)
+
+        with ThreadPoolExecutor(max_workers=len(self.backends)) as executor:
+            futures = [executor.submit(work, b) for b in range(len(self.backends))]
+            for f in futures:
+                f.result()
+
+        return results
@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+
+def run_pipelined(build: Callable, execute: Callable, decode: Callable, batches: Sequence) -> List:
+    """
+    Process batches in a three-stage pipeline. While batch `i` is executed on the calling thread, batch `i + 1` is
+    built on one worker thread and batch `i - 1` is decoded on another. Each stage processes the batches in order
+    on a single thread, such that e.g. access to the hardware stays exclusive and decoding may update shared
+    state, while host-side preparation and post-processing overlap with the execution.
+
+    :param build: Function mapping a batch to a pending execution.
+    :param execute: Function executing a pending execution, returning an intermediate result.
+    :param decode: Function mapping a pending execution and its intermediate result to the final result.
+    :param batches: Batches to process.
+
+    Returns the decoded results of all batches in order.
+    """
+
+    if len(batches) == 0:
+        return []
+
+    with ThreadPoolExecutor(max_workers=1) as builder, ThreadPoolExecutor(max_workers=1) as decoder:
+        decoded = []
+        next_build = builder.submit(build, batches[0])
+        for i in range(len(batches)):
+            pending = next_build.result()
+
+            # prepare the next batch while the current one is executed
+            if i + 1 < len(batches):
+                next_build = builder.submit(build, batches[i + 1])
+
+            result = execute(pending)
+            decoded.append(decoder.submit(decode, pending, result))
+
+        return [d.result() for d in decoded]
+
+
+def merge_results(results: Sequence) -> tuple:
+    """
+    Concatenate the results of `StrobeBackend.run` for consecutive hardware batches.
+    """
+
+    n_layers = len(results[0][0])
+    spikes = [[s for r in results for s in r[0][l]] for l in range(n_layers)]
+    traces = [np.concatenate([r[1][l] for r in results]) for l in range(n_layers)]
+    durations = list(np.max([r[2] for r in results], axis=0))
+    causal_traces = [c for r in results for c in r[3]]
+    return spikes, traces, durations, causal_traces
@@ -0,0 +1,83 @@
+from typing import NamedTuple
+
+import numpy as np
+
+FPGA_MEMORY_SIZE = 131072  # bytes
+
+# delay of the first sample within a playback program
+TIMING_OFFSET = 100e-6  # s
+
+# idle time at the end of a playback program, 10000 FPGA cycles
+PROGRAM_TAIL = 80e-6  # s
+
+# timer values are limited to 32 bit at 125 MHz (cf. `fisch.fpga_clock_cycles_per_us`)
+MAX_PROGRAM_DURATION = (2**32 - 1) / 125e6  # s
+
+# sub-batches have to be reduced by this factor for the correlation readout of every sample (found empirically)
+CORRELATION_BATCH_DIVISOR = 16
+
+# conservative bound on continuous MADC recordings, keeping the returned sample stream at a few million samples
+MAX_MADC_DURATION = 0.1  # s
+
+
+class HWBatchPlan(NamedTuple):
+    """
+    Size of a hardware batch together with the estimated duration of its playback program on chip. The duration
+    excludes the transfer of the program and its results, i.e. it is a lower bound of the wall time.
+    """
+
+    size: int
+    duration: float
+
+
+def plan_hw_batch(
+        n_samples: int,
+        n_vectors: int,
+        sample_separation: float,
+        measure_correlation: bool = False,
+        record_madc: bool = False,
+        fpga_memory_size: int = FPGA_MEMORY_SIZE,
+        record_traces: bool = True) -> HWBatchPlan:
+    """
+    Determine the largest number of samples that can safely be processed in a single playback program.
+
+    :param n_samples: Number of CADC samples recorded per sample.
+    :param n_vectors: Number of 128 byte CADC vectors recorded per CADC sample.
+    :param sample_separation: Separation of samples in a hardware batch.
+    :param measure_correlation: Whether the correlation is read out after every sample.
+    :param record_madc: Whether the MADC records during the whole program.
+    :param fpga_memory_size: Size of the FPGA memory buffering the CADC traces in bytes.
+    :param record_traces: Whether CADC traces are recorded. Otherwise, only spikes are returned and the size is
+        bounded by the largest traced plan for samples of this length, i.e. the one recording a single CADC vector.
+    """
+
+    # recorded traces have to fit into the FPGA memory
+    memory_size = fpga_memory_size // (n_samples * n_vectors * 128)
+    if record_traces:
+        size = memory_size
+    else:
+        # the instructions of the program and its buffered spike events are bounded by a size known to work
+        size = fpga_memory_size // (n_samples * 128)
+
+    if measure_correlation:
+        # the reduction was found for batches limited by the FPGA memory, it is kept as a bound without traces
+        size = min(size, memory_size) // CORRELATION_BATCH_DIVISOR
+
+    # the program duration is bounded by the timer and, when recording, by the MADC
+    max_duration = MAX_PROGRAM_DURATION
+    if record_madc:
+        max_duration = min(max_duration, MAX_MADC_DURATION)
+    size = min(size, int(np.floor((max_duration - TIMING_OFFSET - PROGRAM_TAIL) / sample_separation)) - 1)
+
+    if size < 1:
+        raise ValueError("Not even a single sample fits into a playback program.")
+
+    return HWBatchPlan(size, program_duration(size, sample_separation))
+
+
+def program_duration(hw_batch_size: int, sample_separation: float) -> float:
+    """
+    Duration of a playback program processing `hw_batch_size` samples on chip.
+    """
+
+    return TIMING_OFFSET + sample_separation * (hw_batch_size + 1) + PROGRAM_TAIL
@@ -1,8 +1,44 @@
+from typing import Iterable, Tuple
+
 import torch
 
 from .base import StrobeLayer
 
 
+def weight_version(modules: Iterable[torch.nn.Module]) -> Tuple:
+    """
+    Key identifying the state of all weights, weight scales and dropout masks of `modules`. It changes whenever a
+    weight is modified in place (e.g. by an optimizer step) or replaced, or a dropout mask is redrawn.
+    Modifications through `.data` bypass the version counters of PyTorch and are not detected.
+    """
+
+    key = []
+    for module in modules:
+        for parameter in module.parameters(recurse=False):
+            key.append((id(parameter), parameter.data_ptr(), parameter._version))
+        if isinstance(module, Dropout):
+            key.append((module.version, module.training or module.in_eval))
+        key.append(getattr(module, "scale", None))
+    return tuple(key)
+
+
+def _project(x: torch.Tensor, weight: torch.Tensor) -> torch.Tensor:
+    """
+    Project dense or sparse COO spikes of shape `(batch_size, time_steps, units)` through `weight` of shape
+    `(size, units)`. Sparse spikes are multiplied without densifying them, the result is always dense.
+    """
+
+    if not x.is_sparse:
+        return torch.matmul(x.to(weight.dtype), weight.T)
+
+    x = x.coalesce()
+    batch_size, n_steps, units = x.shape
+    batch, step, unit = x.indices()
+    flat = torch.sparse_coo_tensor(
+            torch.stack([batch * n_steps + step, unit]), x.values().to(weight.dtype), (batch_size * n_steps, units))
+    return torch.sparse.mm(flat, weight.T).view(batch_size, n_steps, -1)
+
+
 class Dropout(StrobeLayer):
     def __init__(
             self,
@@ -15,9 +51,11 @@ class Dropout(StrobeLayer):
         self.in_eval = in_eval
 
         self._mask = torch.ones(self.shape)
+        self.version = 0
 
     def step(self):
         self._mask = torch.rand(self.shape) > self.p
+        self.version += 1
 
     @property
     def mask(self):
@@ -27,7 +65,12 @@ class Dropout(StrobeLayer):
             return torch.ones(self.shape)
 
     def forward(self, x: torch.Tensor):
-        return x * self.mask.to(x.device)
+        mask = self.mask.to(x.device, x.dtype)
+        if x.is_sparse:
+            # scale the events individually to keep the input sparse
+            x = x.coalesce()
+            return torch.sparse_coo_tensor(x.indices(), x.values() * mask[x.indices()[-1]], x.shape)
+        return x * mask
 
 
 class Linear(torch.nn.Linear, StrobeLayer):
@@ -36,7 +79,7 @@ class Linear(torch.nn.Linear, StrobeLayer):
         self.scale = scale
 
     def forward(self, x: torch.Tensor):
-        y = torch.nn.Linear.forward(self, x)
+        y = _project(x, self.weight)
         return y
 
 
@@ -49,7 +92,7 @@ class SigmoidalWeights(StrobeLayer):
         self._weight.data.normal_()
 
     def forward(self, x: torch.Tensor):
-        return torch.matmul(x, self.weight.T)
+        return _project(x, self.weight)
 
     @property
     def weight(self):
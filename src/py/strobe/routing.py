@@ -7,6 +7,8 @@ import pyfisch_vx as fisch
 import pyhalco_hicann_dls_vx_v2 as halco
 import gonzales
 
+from .addressing import routing_addresses
+
 
 class RoutingGenerator(stadls.PlaybackGenerator):
     def __init__(self, neuron_size=1, signed_synapses=False):
@@ -14,45 +16,13 @@ class RoutingGenerator(stadls.PlaybackGenerator):
         self._neuron_size = neuron_size
         self._signed_synapses = signed_synapses
 
-        sources = np.arange(1024)
-        blocks = (sources // (32 // self._neuron_size)) % 8
-        sources_on_block = (sources - blocks * (32 // self._neuron_size)) % 256
-        self._neuron_buses = blocks % 4
-        unshifted_addresses = (sources_on_block % (32 // self._neuron_size) + (32 // self._neuron_size)
-                               * ((sources % 256) // (128 // self._neuron_size))) % 256
-        self._neuron_addresses = ((unshifted_addresses >> 2) + ((unshifted_addresses & 0b11) << 4)) << 2
-        self._neuron_addresses += 1*(sources // 256)
-
-        self._neuron_lookup = np.zeros((self._neuron_addresses.max() + 1, 4), dtype=int)
-        for a in np.unique(self._neuron_addresses):
-            for b in np.unique(self._neuron_buses):
-                self._neuron_lookup[a, b] = np.where((self._neuron_addresses == a) & (self._neuron_buses == b))[0][0]
-
-        # specification of synapse row assignment
-        rows = np.arange(256)
-        drivers = rows // 2
-        odds = rows % 2
-
-        padi_buses = drivers % 4
-
-        self._driver_masks = (drivers // 4) % 4
-        labels = (2*(drivers // 16)) << 2
-
-        if not signed_synapses:
-            labels += odds << 2
-
-        new = ((labels >> 5) & 0b1) << 2
-        new += ((labels >> 4) & 0b1) << 3
-        new += ((labels >> 3) & 0b1) << 4
-        new += ((labels >> 2) & 0b1) << 5
-
-        self._synapse_labels = new
-
-        addresses = (self._driver_masks << 6) + self._synapse_labels
-
-        self._lookup = np.empty_like(addresses)
-        for i, (address, bus) in enumerate(zip(addresses, padi_buses)):
-            self._lookup[i] = np.where((self._neuron_addresses == address) & (self._neuron_buses == bus))[0][0]
+        addresses = routing_addresses(self._neuron_size, self._signed_synapses)
+        self._neuron_addresses = addresses.neuron_addresses
+        self._neuron_buses = addresses.neuron_buses
+        self._neuron_lookup = addresses.neuron_lookup
+        self._driver_masks = addresses.driver_masks
+        self._synapse_labels = addresses.synapse_labels
+        self._lookup = addresses.lookup
 
         ########################################
         # neuron backends                      #
@@ -186,7 +156,12 @@ class RoutingGenerator(stadls.PlaybackGenerator):
 
         return builder
 
-    def transform_weights(self, weights, sources=None):
+    def assign_weights(self, weights, sources=None):
+        """
+        Map weights and sources to the synapse array. Returns the signed weights and the labels of all synapse rows,
+        each of shape `(256, 512)` with the columns of the top and bottom synram side by side.
+        """
+
         if len(weights.shape) < 3:
             weights = weights.reshape((1, ) + weights.shape)
         if len(sources.shape) < 3:
@@ -211,21 +186,52 @@ class RoutingGenerator(stadls.PlaybackGenerator):
         weights_assigned[0::2, :] = +np.clip(weights_assigned[0::2, :], 0, 63)
         weights_assigned[1::2, :] = -np.clip(weights_assigned[1::2, :], -63, 0)
 
-        label_matrix_top = label_matrix + sources_flat[self._lookup, 0:256]
-        label_matrix_bottom = label_matrix + sources_flat[self._lookup, 256:512]
+        labels_assigned = np.hstack([
+                label_matrix + sources_flat[self._lookup, 0:256],
+                label_matrix + sources_flat[self._lookup, 256:512]])
+
+        return weights_assigned, labels_assigned
+
+    def transform_weights(self, weights, sources=None):
+        weights_assigned, labels_assigned = self.assign_weights(weights, sources)
 
         synapse_matrix_top = lola.SynapseMatrix()
-        synapse_matrix_top.labels.from_numpy(label_matrix_top)
+        synapse_matrix_top.labels.from_numpy(labels_assigned[:, 0:256])
         synapse_matrix_top.weights.from_numpy(weights_assigned[:, 0:256])
 
         synapse_matrix_bottom = lola.SynapseMatrix()
-        synapse_matrix_bottom.labels.from_numpy(label_matrix_bottom)
+        synapse_matrix_bottom.labels.from_numpy(labels_assigned[:, 256:512])
         synapse_matrix_bottom.weights.from_numpy(weights_assigned[:, 256:512])
 
         self.weights_assigned = weights_assigned
+        self.labels_assigned = labels_assigned
 
         return synapse_matrix_top, synapse_matrix_bottom
 
+    def transform_weight_rows(self, weights, sources, previous_weights, previous_labels):
+        """
+        Generate writes only for the synapse rows whose weights or labels differ from a previous assignment (cf.
+        `assign_weights`). Returns a list of `(halco.SynapseRowOnDLS, lola.SynapseRow)` pairs.
+        """
+
+        weights_assigned, labels_assigned = self.assign_weights(weights, sources)
+
+        rows = []
+        for synram, columns in ((halco.SynramOnDLS.top, slice(0, 256)), (halco.SynramOnDLS.bottom, slice(256, 512))):
+            dirty = (weights_assigned[:, columns] != previous_weights[:, columns]).any(axis=1)
+            dirty |= (labels_assigned[:, columns] != previous_labels[:, columns]).any(axis=1)
+
+            for r in np.flatnonzero(dirty):
+                row = lola.SynapseRow()
+                row.weights.from_numpy(weights_assigned[r, columns])
+                row.labels.from_numpy(labels_assigned[r, columns])
+                rows.append((halco.SynapseRowOnDLS(halco.SynapseRowOnSynram(int(r)), synram), row))
+
+        self.weights_assigned = weights_assigned
+        self.labels_assigned = labels_assigned
+
+        return rows
+
     def transform_events_from_chip(self, spikes):
         spike_times = spikes["chip_time"] / fisch.fpga_clock_cycles_per_us * 1e-6
         spike_labels = spikes["label"]
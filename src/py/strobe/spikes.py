@@ -1,5 +1,4 @@
 import numpy as np
-
 import torch
 
 
@@ -14,56 +13,174 @@ class PixelsToSpikeTimes(torch.nn.Module):
         self._epsilon = epsilon
 
     def forward(self, x):
-        device = x.device
         x = x[:, 0]  # we only use the first (in most cases only) color channel
         non_spiking = x < self._threshold
 
-        # TODO: move this to torch
-
-        x = np.clip(x.cpu(), self._threshold + self._epsilon, 1e9)
-        times = self._tau * np.log(x / (x - self._threshold))
+        x = torch.clamp(x, self._threshold + self._epsilon, 1e9)
+        times = self._tau * torch.log(x / (x - self._threshold))
 
-        times[non_spiking] = self._t_max
+        times = torch.where(non_spiking, torch.full_like(times, self._t_max), times)
         times = torch.clamp(times, 0, self._t_max)
 
-        times = times.to(device)
-
         return times
 
 
 class SpikeTimesToDense(torch.nn.Module):
     """Convert spike times to a dense matrix of zeros and ones."""
 
-    def __init__(self, time_step, size=None):
+    def __init__(self, time_step, size=None, dtype=torch.float32, sparse=False):
         """Initialize the conversion of spike times to a dense matrix of zeros and ones.
 
         time_step -- binning interval in seconds
         size      -- number of bins along time axis (calculate from data, if `size is None`)
+        dtype     -- data type of the dense matrix (e.g. `torch.uint8` or `torch.bool` to save memory)
+        sparse    -- return a sparse COO tensor instead of a dense matrix
         """
 
         super().__init__()
 
         self._time_step = time_step
         self._size = size
+        self._dtype = dtype
+        self._sparse = sparse
 
     def forward(self, x):
         """Convert spike times to dense matrix of zeros and ones.
 
         x -- spike times of shape `(batch_size, x0[, x1, …])`.
 
-        Returns a dense matrix of shape `(batch_size, n_time_steps, x0[, x1, …])`.
+        Returns a dense (or sparse) matrix of shape `(batch_size, n_time_steps, x0[, x1, …])`. Spikes beyond
+        `n_time_steps` are dropped.
         """
 
-        bins = (x / self._time_step).long()
+        bins = (x / self._time_step).long().reshape(x.shape[0], -1)
 
         if self._size is not None:
             n_time_steps = self._size
-            n_time_steps_tmp = max(self._size, int(bins.max()) + 1)
         else:
-            n_time_steps = n_time_steps_tmp = int(bins.max()) + 1
+            n_time_steps = int(bins.max()) + 1
+
+        batch, unit = torch.nonzero(bins < n_time_steps, as_tuple=True)
+        step = bins[batch, unit]
+        shape = (x.shape[0], n_time_steps, *x.shape[1:])
+
+        if self._sparse:
+            indices = torch.stack([batch, step, *torch.unravel_index(unit, x.shape[1:])])
+            values = torch.ones(indices.shape[1], dtype=self._dtype, device=x.device)
+            return torch.sparse_coo_tensor(indices, values, shape).coalesce()
+
+        # scatter into the flattened matrix, every input element spikes at most once
+        n_units = bins.shape[1]
+        dense = torch.zeros(shape, dtype=self._dtype, device=x.device)
+        dense.view(-1)[(batch * n_time_steps + step) * n_units + unit] = 1
+        return dense
 
-        dense = torch.zeros((x.shape[0], n_time_steps_tmp, *x.shape[1:]), device=x.device)
-        mesh = torch.meshgrid([torch.arange(s) for s in x.shape])
-        slc = (mesh[0], ) + (bins, ) + mesh[1:]
-        dense[slc] = 1
-        return dense[:, :n_time_steps]
+
+class SpikeTrains:
+    """Input spike trains of a batch of samples for hardware injection.
+
+    All `(time, label)` events are stored in a single array, sorted by sample and time, together with the
+    offsets of each sample's events. Indexing with an integer returns the events of one sample, slicing a
+    contiguous sub-batch, both without copying.
+    """
+
+    def __init__(self, events, offsets):
+        """Wrap sorted events.
+
+        events  -- array of shape `(n_events, 2)` holding times and labels, sorted by sample and time
+        offsets -- array of shape `(batch_size + 1,)` delimiting the events of each sample
+        """
+
+        self.events = events
+        self.offsets = offsets
+
+    @classmethod
+    def from_events(cls, samples, times, labels, batch_size):
+        """Sort unordered events of a batch in a single pass.
+
+        samples    -- sample index of each event
+        times      -- injection time of each event
+        labels     -- label of each event
+        batch_size -- number of samples (samples without events receive empty spike trains)
+        """
+
+        order = np.lexsort((times, samples))
+        events = np.stack([times[order], labels[order]], axis=1)
+        offsets = np.searchsorted(samples[order], np.arange(batch_size + 1))
+        return cls(events, offsets)
+
+    @classmethod
+    def from_tensor(cls, x, time_step, time_offset=0.0, label_offset=0):
+        """Encode a dense or sparse COO spike tensor of shape `(batch_size, n_steps, units)`.
+
+        time_step    -- duration of a time step in seconds
+        time_offset  -- shift applied to all injection times
+        label_offset -- shift applied to all unit indices
+        """
+
+        if x.is_sparse:
+            samples, steps, units = x.coalesce().indices().cpu().numpy()
+        else:
+            samples, steps, units = torch.nonzero(x).T.cpu().numpy()
+
+        # events are enumerated in row-major order and hence already sorted by sample and time step
+        events = np.stack([steps * time_step + time_offset, (units + label_offset).astype(float)], axis=1)
+        offsets = np.searchsorted(samples, np.arange(x.shape[0] + 1))
+        return cls(events, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("Spike trains can only be sliced contiguously.")
+            offsets = self.offsets[start:max(start, stop) + 1]
+            return SpikeTrains(self.events[offsets[0]:offsets[-1]], offsets - offsets[0])
+        return self.events[self.offsets[index]:self.offsets[index + 1]]
+
+
+def dissect_spikes(raw_spikes, hw_batch_size, sample_separation, boundaries):
+    """Split the spikes recorded during a hardware batch by sample and layer.
+
+    Spikes are sorted by sample, layer and time once, the returned arrays are views of this single copy. Spikes
+    outside of the sample windows or from neurons beyond the last layer are dropped.
+
+    raw_spikes        -- array of shape `(n_spikes, 2)` holding times and neuron indices
+    hw_batch_size     -- number of samples in the hardware batch
+    sample_separation -- duration of the window of each sample, windows are open intervals
+    boundaries        -- indices of the first neuron of each layer, followed by the total number of neurons
+
+    Returns a list per layer holding an array of `(time, unit)` pairs per sample, with times relative to the
+    beginning of the sample and units relative to the first neuron of the layer.
+    """
+
+    times = raw_spikes[:, 0]
+    labels = raw_spikes[:, 1]
+    n_layers = len(boundaries) - 1
+
+    # windows are open intervals, spikes on their edges do not belong to any sample
+    edges = np.arange(hw_batch_size + 1) * sample_separation
+    samples = np.searchsorted(edges, times, side="left") - 1
+    layers = np.searchsorted(boundaries, labels, side="right") - 1
+    valid = (samples >= 0) & (samples < hw_batch_size) & (layers >= 0) & (layers < n_layers)
+    valid[valid] &= times[valid] < edges[samples[valid] + 1]
+
+    samples = samples[valid]
+    layers = layers[valid]
+    order = np.lexsort((times[valid], layers, samples))
+
+    samples = samples[order]
+    layers = layers[order]
+    spikes = raw_spikes[valid][order]
+    spikes[:, 0] -= edges[samples]
+    spikes[:, 1] -= np.asarray(boundaries)[layers]
+
+    # delimit each pair of sample and layer in the sorted keys
+    keys = samples * n_layers + layers
+    offsets = np.searchsorted(keys, np.arange(hw_batch_size * n_layers + 1))
+
+    return [
+            [spikes[offsets[b * n_layers + l]:offsets[b * n_layers + l + 1]] for b in range(hw_batch_size)]
+            for l in range(n_layers)]
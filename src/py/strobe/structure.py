@@ -0,0 +1,100 @@
+from typing import List, Tuple
+
+import numpy as np
+
+
+class LayerSize(int):
+    def __new__(cls, size, recurrent=False, spiking=True):
+        self = int.__new__(cls, size)
+        self.recurrent = recurrent
+        self.spiking = spiking
+        return self
+
+
+def structure_key(structure: List[int]) -> Tuple:
+    """
+    Hashable representation of `structure`, including the properties of its layers.
+    """
+
+    return tuple(
+            (int(layer), getattr(layer, "recurrent", False), getattr(layer, "spiking", True)) for layer in structure)
+
+
+def layer_boundaries(structure: List[int]) -> np.ndarray:
+    """
+    Indices of the first neuron of every layer in `structure[1:]`, followed by the total number of neurons.
+    """
+
+    return np.hstack([np.zeros(1, dtype=int), np.array(structure[1:]).cumsum()])
+
+
+def weight_shapes(structure: List[int]) -> List[Tuple[int, int]]:
+    """
+    Expected shapes `(inputs, size)` of the weight matrices of all layers. Recurrent layers receive their own
+    spikes as additional inputs following the feedforward ones.
+    """
+
+    shapes = []
+    for l, layer in enumerate(structure[:-1]):
+        next_layer = structure[l + 1]
+        if not isinstance(next_layer, LayerSize) or not next_layer.recurrent:
+            shape = (layer, next_layer)
+        else:
+            shape = (layer + next_layer, next_layer)
+        shapes.append(shape)
+    return shapes
+
+
+def unroll_weights(structure: List[int], weights, input_shift: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Place the weight matrices of all layers on a single `(256, 256)` grid of sources and neurons, as laid out on
+    the synapse array. Inputs and neuron outputs share the rows of the grid and are told apart by their offsets:
+    entries fed by external inputs carry an offset of 1, entries fed by neurons an offset of 0.
+
+    :param structure: Number of inputs followed by the sizes of all layers.
+    :param weights: Weight matrices of shape `(inputs, size)` per layer.
+    :param input_shift: Row of the first external input.
+
+    Returns the unrolled weights and offsets.
+    """
+
+    shapes = weight_shapes(structure)
+
+    weights_unrolled = np.zeros((256, 256), dtype=int)
+    offsets_unrolled = np.zeros((256, 256), dtype=int)
+
+    boundaries = layer_boundaries(structure)
+
+    assert len(weights) == len(shapes)
+    for l, (shape, w, layer) in enumerate(zip(shapes, weights, structure[1:])):
+        if shape != w.shape:
+            msg = f"Shape of weights for layer {layer} is not compatible with the layer specification."
+            raise IndexError(msg)
+
+        recurrent = isinstance(layer, LayerSize) and layer.recurrent
+        if recurrent:
+            a = boundaries[l]
+            b = boundaries[l + 1]
+            offset = 0
+
+            c = boundaries[l]
+            d = boundaries[l + 1]
+            weights_unrolled[a:b, c:d] = w[a - b:, :]
+            offsets_unrolled[a:b, c:d] = offset
+
+        # non-reccurent weights
+        if l == 0:
+            a = input_shift + 0
+            b = input_shift + structure[0]
+            offset = 1
+        else:
+            a = boundaries[l - 1]
+            b = boundaries[l]
+            offset = 0
+
+        c = boundaries[l]
+        d = boundaries[l + 1]
+        weights_unrolled[a:b, c:d] = w[0:b - a, :]
+        offsets_unrolled[a:b, c:d] = offset
+
+    return weights_unrolled, offsets_unrolled
@@ -0,0 +1,63 @@
+import unittest
+
+import pyhalco_hicann_dls_vx_v2 as halco
+import pyhxcomm_vx as hxcomm
+import pystadls_vx_v2 as stadls
+import calix.common
+import calix.spiking.neuron
+
+from strobe import backend as strobe_backend
+from strobe.backend import StrobeBackend
+from strobe.structure import LayerSize
+
+
+class TestConfigurationCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.connection_manager = hxcomm.ManagedConnection()
+        cls.connection = cls.connection_manager.__enter__()
+
+        builder, _ = stadls.ExperimentInit().generate()
+        stadls.run(cls.connection, builder.done())
+        cls.calibration = {
+                "cadc": calix.common.cadc.calibrate(cls.connection),
+                "neuron": calix.spiking.neuron.calibrate(cls.connection)}
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.connection_manager.__exit__(None, None, None)
+
+    def test_cache_hit(self):
+        strobe_backend.clear_configuration_cache()
+        structure = [20, LayerSize(30), LayerSize(5, spiking=False)]
+
+        # both backends share the calibration object, as the trials of an experiment do
+        backends = [StrobeBackend(self.connection, structure, self.calibration) for i in range(2)]
+        for backend in backends:
+            backend.configure()
+            backend.set_readout(3)
+        self.assertEqual(len(strobe_backend._configuration_cache), 1)
+        self.assertEqual(backends[0]._calibration_digest, backends[1]._calibration_digest)
+
+        # the backend served from the cache writes patched neuron configs
+        for c in halco.iter_all(halco.AtomicNeuronOnDLS):
+            configs = [b._neuron_calib.neurons[c] for b in backends]
+            self.assertEqual(configs[0], configs[1])
+
+            compartment = int(c.toEnum()) % 2
+            population = int(c.toEnum()) // 2
+            if compartment == 0:
+                self.assertTrue(configs[1].multicompartment.connect_right)
+                self.assertEqual(configs[1].threshold.enable, population < 30)
+                self.assertEqual(configs[1].readout.enable_buffered_access, population == 3)
+            else:
+                self.assertEqual(configs[1].membrane_capacitance.capacitance, 0)
+                self.assertFalse(configs[1].threshold.enable)
+
+        for c in halco.iter_all(halco.NeuronBackendConfigOnDLS):
+            self.assertEqual(
+                    backends[0]._routing.neuron_backend_configs[c], backends[1]._routing.neuron_backend_configs[c])
+
+        # the shared calibration is not patched, later backends hit the cache as well
+        backend = StrobeBackend(self.connection, structure, self.calibration)
+        self.assertEqual(backend._calibration_digest, backends[0]._calibration_digest)
@@ -0,0 +1,166 @@
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from strobe.correlation import (
+    BaselineCache, correlation_index, correlation_rows, subset_index, unroll_correlation)
+from strobe.structure import LayerSize, unroll_weights, weight_shapes
+
+
+def unroll_reference(measurement, ordering):
+    """Former per-sample decoding of a single readout."""
+
+    measurement = measurement.T[ordering, :]
+    flattened = np.zeros((128, 512))
+    flattened += measurement[0::2, :]
+    flattened += measurement[1::2, :]
+    inverted = np.swapaxes(flattened.reshape(128, 2, 256, order="F"), 0, 1)
+
+    unrolled = np.empty((256, 256))
+    unrolled[:128, :] = inverted[0, ...]
+    unrolled[128:, :] = inverted[1, ...]
+    return unrolled
+
+
+class TestCorrelation(unittest.TestCase):
+    def setUp(self):
+        random = np.random.default_rng(1234)
+        self.lookup = random.permutation(256)
+        self.baseline = random.integers(150, 250, (512, 256))
+        self.raw = random.integers(0, 150, (5, 512, 256))
+
+    def test_batch(self):
+        index = correlation_index(self.lookup)
+        ordering = np.argsort(self.lookup)
+
+        measurement = unroll_correlation(self.baseline - self.raw, index)
+        self.assertEqual(measurement.shape, (5, 256, 256))
+        for b in range(5):
+            reference = unroll_reference(self.baseline - self.raw[b], ordering)
+            self.assertTrue(np.array_equal(measurement[b], reference))
+
+        # single readouts are supported as well
+        single = unroll_correlation(self.baseline - self.raw[0], index)
+        self.assertTrue(np.array_equal(single, measurement[0]))
+
+    def test_weights(self):
+        # signed pairs of synapse rows recover the weights
+        weights = np.zeros((256, 256), dtype=int)
+        weights[:10, :20] = np.arange(200).reshape(10, 20) % 127 - 63
+
+        index = correlation_index(self.lookup)
+
+        # every synapse is read exactly once, hence the weights can be placed by the inverse of the gather
+        self.assertTrue(np.array_equal(np.sort(index.flatten()), np.arange(512 * 256)))
+        rows = index // 256
+        columns = index % 256
+        assigned = np.zeros((512, 256), dtype=int)
+        assigned[rows[0], columns[0]] = np.clip(weights, 0, 63)
+        assigned[rows[1], columns[1]] = np.clip(weights, -63, 0)
+        self.assertTrue(np.array_equal(unroll_correlation(assigned, index), weights))
+
+    def test_subset(self):
+        index = correlation_index(self.lookup)
+        measurement = self.baseline - self.raw
+        full = unroll_correlation(measurement, index)
+
+        recurrent = [20, LayerSize(30, recurrent=True), 5]
+        for structure, input_shift in (([20, 30, 5], 0), ([200, 40, 10], 0), (recurrent, 30)):
+            rows = correlation_rows(structure, index, input_shift)
+            self.assertLess(len(rows), 512)
+
+            weights = [np.ones(shape, dtype=int) for shape in weight_shapes(structure)]
+            used = unroll_weights(structure, weights, input_shift)[0] != 0
+
+            padded = np.concatenate([measurement[:, rows, :], np.zeros((5, 1, 256))], axis=1)
+            partial = unroll_correlation(padded, subset_index(index, rows))
+            self.assertTrue(np.array_equal(partial[:, used], full[:, used]))
+
+        # all rows reproduce the full readout
+        rows = np.arange(512)
+        padded = np.concatenate([measurement, np.zeros((5, 1, 256))], axis=1)
+        self.assertTrue(np.array_equal(unroll_correlation(padded, subset_index(index, rows)), full))
+
+
+class TestBaselineCache(unittest.TestCase):
+    def setUp(self):
+        self.measured = 0
+
+    def measure(self):
+        self.measured += 1
+        return np.full((512, 256), 200)
+
+    def test_runs(self):
+        cache = BaselineCache(refresh_runs=3)
+        for i in range(7):
+            cache.get(self.measure)
+        self.assertEqual(self.measured, 3)
+
+        cache.invalidate()
+        cache.get(self.measure)
+        self.assertEqual(self.measured, 4)
+
+    def test_interval(self):
+        cache = BaselineCache(refresh_runs=None, refresh_interval=0.05)
+        cache.get(self.measure)
+        refreshed_at = cache.refreshed_at
+        cache.get(self.measure)
+        self.assertEqual(self.measured, 1)
+
+        time.sleep(0.06)
+        cache.get(self.measure)
+        self.assertEqual(self.measured, 2)
+        self.assertGreater(cache.refreshed_at, refreshed_at)
+
+    def test_drift(self):
+        cache = BaselineCache(refresh_runs=None, drift_threshold=2.0)
+        baseline = cache.get(self.measure)
+
+        # sparse correlation does not affect the drift estimate
+        measurement = np.zeros((4, 512, 256))
+        measurement[:, :10, :10] = 50
+        cache.observe(baseline, measurement)
+        cache.get(self.measure)
+        self.assertEqual(self.measured, 1)
+
+        # readouts of an outdated baseline are ignored
+        cache.observe(baseline.copy(), measurement - 5)
+        cache.get(self.measure)
+        self.assertEqual(self.measured, 1)
+
+        cache.observe(baseline, measurement - 5)
+        self.assertAlmostEqual(cache.drift, 5)
+        cache.get(self.measure)
+        self.assertEqual(self.measured, 2)
+        self.assertEqual(cache.drift, 0)
+
+    def test_threads(self):
+        # runs are executed and decoded on different threads by `run_pipelined`
+        cache = BaselineCache(refresh_runs=5, drift_threshold=1e6)
+
+        def execute():
+            for i in range(200):
+                baseline = cache.get(self.measure)
+                self.assertEqual(baseline.shape, (512, 256))
+
+        def decode():
+            for i in range(200):
+                cache.observe(cache.baseline, np.zeros((2, 512, 256)))
+
+        threads = [threading.Thread(target=execute), threading.Thread(target=execute), threading.Thread(target=decode)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # every baseline serves exactly five runs
+        self.assertEqual(self.measured, 400 // 5)
+        self.assertEqual(cache.drift, 0)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            BaselineCache(refresh_runs=0)
+        with self.assertRaises(ValueError):
+            BaselineCache(refresh_interval=-1)
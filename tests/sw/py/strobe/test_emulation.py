@@ -0,0 +1,193 @@
+import unittest
+
+import numpy as np
+import torch
+
+from strobe.addressing import routing_addresses
+from strobe.emulation import EmulatedStrobeBackend, expand_target
+from strobe.lif import LIFLayer, LILayer
+from strobe.nn import Network
+from strobe.projections import Linear
+from strobe.structure import LayerSize
+
+from test_correlation import unroll_reference
+
+N_SAMPLES = 20
+
+
+def make_inputs(hw_batch_size, n_inputs=4, seed=1234):
+    # inputs carry the offset of external events, cf. `Network.forward`
+    random = np.random.default_rng(seed)
+    inputs = []
+    for b in range(hw_batch_size):
+        n_events = random.integers(4, 12)
+        times = np.sort(random.uniform(0, 15e-6, n_events))
+        labels = random.integers(0, n_inputs, n_events) + 256
+        inputs.append(np.stack([times, labels], axis=1))
+    return inputs
+
+
+class TestEmulatedStrobeBackend(unittest.TestCase):
+    def setUp(self):
+        self.structure = [4, LayerSize(6), LayerSize(2)]
+        self.weights = (np.full((4, 6), 63), np.full((6, 2), 63))
+
+    def make_backend(self, structure=None, **kwargs):
+        backend = EmulatedStrobeBackend(None, structure or self.structure, **kwargs)
+        backend.write_weights(*self.weights)
+        return backend
+
+    def test_formats(self):
+        backend = self.make_backend()
+        spikes, traces, durations, causal_traces = backend.run(make_inputs(3), n_samples=N_SAMPLES)
+
+        self.assertEqual(len(spikes), 2)
+        self.assertEqual(len(traces), 2)
+        for l, size in enumerate(self.structure[1:]):
+            self.assertEqual(len(spikes[l]), 3)
+            for s in spikes[l]:
+                self.assertEqual(s.shape[1], 2)
+                self.assertTrue(((s[:, 1] >= 0) & (s[:, 1] < size)).all())
+            self.assertEqual(traces[l].shape, (3, N_SAMPLES, size))
+
+            # traces are quantized like CADC readings
+            cadc = traces[l] / 1.2 * 256
+            self.assertTrue(np.allclose(cadc, np.round(cadc)))
+
+        self.assertTrue(sum(len(s) for s in spikes[1]) > 0)
+        self.assertEqual(len(durations), 2)
+        self.assertEqual(causal_traces, [])
+
+    def test_spikes_only(self):
+        backend = self.make_backend()
+        inputs = make_inputs(3)
+        spikes_ref, _, _, _ = backend.run(inputs, n_samples=N_SAMPLES)
+        spikes, traces, _, _ = backend.run(inputs, n_samples=N_SAMPLES, record_traces=False)
+        for l, size in enumerate(self.structure[1:]):
+            self.assertEqual(traces[l].shape, (3, 0, size))
+            for s, s_ref in zip(spikes[l], spikes_ref[l]):
+                self.assertTrue(np.array_equal(s, s_ref))
+
+        # the network is recorded by a single CADC vector, which also bounds programs without traces
+        self.assertEqual(
+                backend.plan_hw_batch(N_SAMPLES, record_traces=False).size, backend.plan_hw_batch(N_SAMPLES).size)
+
+    def test_rest(self):
+        backend = self.make_backend()
+        inputs = [np.empty((0, 2)) for b in range(2)]
+        spikes, traces, _, _ = backend.run(inputs, n_samples=N_SAMPLES)
+        self.assertTrue(all(len(s) == 0 for layer in spikes for s in layer))
+        self.assertTrue(np.allclose(traces[0], 80 / 256 * 1.2))
+
+    def test_batch_independence(self):
+        backend = self.make_backend()
+        inputs = make_inputs(4)
+        spikes, traces, _, _ = backend.run(inputs, n_samples=N_SAMPLES)
+        for b in range(4):
+            single_spikes, single_traces, _, _ = backend.run(inputs[b:b + 1], n_samples=N_SAMPLES)
+            for l in range(2):
+                self.assertTrue(np.array_equal(spikes[l][b], single_spikes[l][0]))
+                self.assertTrue(np.array_equal(traces[l][b], single_traces[l][0]))
+
+    def test_refractoriness(self):
+        refractory_time = 3e-6
+        backend = self.make_backend(calibration={"refractory_time": refractory_time})
+        times = np.arange(60) * 0.5e-6
+        inputs = [np.stack([times, np.full(len(times), 256)], axis=1)]
+        spikes, _, _, _ = backend.run(inputs, n_samples=N_SAMPLES)
+
+        hidden = spikes[0][0]
+        self.assertTrue(len(hidden) > 6)
+        for unit in range(6):
+            intervals = np.diff(hidden[hidden[:, 1] == unit, 0])
+            self.assertTrue((intervals > refractory_time).all())
+
+    def test_sub_populations(self):
+        values = expand_target({0: 1.0, 4: 2.0}, 4)
+        self.assertTrue(np.array_equal(values, [1.0, 1.0, 2.0, 2.0]))
+        with self.assertRaises(ValueError):
+            expand_target({2: 1.0}, 4)
+
+    def test_non_spiking(self):
+        structure = [4, LayerSize(6), LayerSize(2, spiking=False)]
+        backend = self.make_backend(structure)
+        spikes, traces, _, _ = backend.run(make_inputs(3), n_samples=N_SAMPLES)
+        self.assertTrue(sum(len(s) for s in spikes[0]) > 0)
+        self.assertTrue(all(len(s) == 0 for s in spikes[1]))
+        self.assertTrue(traces[1].max() > 150 / 256 * 1.2)
+
+    def test_correlation(self):
+        backend = self.make_backend(measure_correlation=True)
+        inputs = [np.array([[2e-6, 256], [2.1e-6, 257], [2.2e-6, 258]])]
+        spikes, _, _, causal_traces = backend.run(inputs, n_samples=N_SAMPLES)
+        self.assertEqual(len(causal_traces), 1)
+
+        measurement, measure_hidden, measure_output, raw = causal_traces[0]
+        self.assertEqual(measurement.shape, (256, 256))
+        # by default, only the rows covering the network are read out
+        self.assertEqual(raw.shape, (len(backend.correlation_rows), 256))
+        self.assertLess(len(backend.correlation_rows), 512)
+        self.assertEqual(measure_hidden.shape, (4, 6))
+        self.assertEqual(measure_output.shape, (6, 2))
+
+        # only inputs preceding postsynaptic spikes are correlated
+        self.assertTrue((measure_hidden[:3] > 0).all())
+        self.assertTrue((measure_hidden[3] == 0).all())
+        self.assertTrue((measure_output > 0).all())
+
+    def test_correlation_layout(self):
+        # readouts are decoded like those of the chip, cf. the former per-sample decoding of the `StrobeBackend`
+        backend = self.make_backend(measure_correlation=True, correlation_readout="all")
+        causal_traces = backend.run(make_inputs(3), n_samples=N_SAMPLES)[3]
+        ordering = np.argsort(routing_addresses(2, True).lookup)
+
+        for measurement, measure_hidden, measure_output, raw in causal_traces:
+            self.assertEqual(raw.shape, (512, 256))
+            self.assertTrue(np.array_equal(unroll_reference(backend.baseline - raw, ordering), measurement))
+            self.assertTrue(np.array_equal(measurement[:4, :6], measure_hidden))
+            self.assertTrue(np.array_equal(measurement[:6, 6:8], measure_output))
+
+        # signed pairs of synapses accumulate the same correlation
+        self.assertTrue((measurement % 2 == 0).all())
+
+        # the rows covering the network suffice to decode all layers
+        backend.set_correlation_readout()
+        self.assertLess(len(backend.correlation_rows), 512)
+        partial = backend.run(make_inputs(3), n_samples=N_SAMPLES)[3]
+        for (measurement, *blocks, raw), (_, *blocks_partial, raw_partial) in zip(causal_traces, partial):
+            self.assertEqual(raw_partial.shape, (len(backend.correlation_rows), 256))
+            self.assertEqual(backend.baseline.shape, raw_partial.shape)
+            for block, block_partial in zip(blocks, blocks_partial):
+                self.assertTrue(np.array_equal(block, block_partial))
+
+
+class TestEmulatedNetwork(unittest.TestCase):
+    def test_forward(self):
+        torch.manual_seed(1234)
+        params = {"tau_mem": 6e-6, "tau_syn": 6e-6}
+        network = Network(Linear(10, 20), LIFLayer(20, params), Linear(20, 3), LILayer(3, params))
+        network.connect(None, dict(params), emulate=True)
+
+        x = (torch.rand(8, 30, 10) > 0.8).float()
+        y = network(x)
+
+        self.assertEqual(y.shape, (8, 30, 3))
+        self.assertEqual(network[1].spikes.shape, (8, 30, 20))
+        self.assertTrue(network[1].spikes.sum() > 0)
+        self.assertTrue((network[1].traces[:, 0] == 0).all())
+
+    def test_inference(self):
+        torch.manual_seed(1234)
+        params = {"tau_mem": 6e-6, "tau_syn": 6e-6}
+        network = Network(Linear(10, 20), LIFLayer(20, params), Linear(20, 3), LIFLayer(3, params))
+        network.connect(None, dict(params), emulate=True, inference_mode=True)
+
+        x = (torch.rand(8, 30, 10) > 0.8).float()
+        y_ref = network(x)
+        self.assertIsNotNone(network[3].traces)
+
+        # spiking layers are evaluated without traces
+        network.eval()
+        y = network(x)
+        self.assertIsNone(network[3].traces)
+        self.assertTrue(torch.equal(y, y_ref))
@@ -0,0 +1,258 @@
+import unittest
+
+import torch
+
+from strobe.base import Precision
+from strobe.lif import LILayer, LIFLayer, RecurrentLIFLayer
+from strobe.projections import Linear
+
+PARAMS = {"tau_mem": 6e-6, "tau_syn": 6e-6}
+TIME_STEP = 1.7e-6
+
+
+def make_layer(layer_type, integration, **kwargs):
+    if layer_type is RecurrentLIFLayer:
+        torch.manual_seed(42)
+        layer = layer_type(16, PARAMS, Linear(16, 16), **kwargs)
+    else:
+        layer = layer_type(16, PARAMS, integration=integration, **kwargs)
+    layer.time_step = TIME_STEP
+    return layer
+
+
+def run_layer(layer, x, hx=None):
+    x = x.clone().requires_grad_(True)
+    if hx is not None:
+        spikes, traces = hx
+        layer.inject(spikes.clone(), traces.clone(), PARAMS, TIME_STEP)
+    y = layer(x)
+    y.sum().backward()
+    return y.detach(), x.grad
+
+
+class TestIntegration(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1234)
+        self.x = 0.5 * (torch.rand(4, 50, 16) > 0.8).float()
+
+    def assert_matches_euler(self, layer_type, integration, hx=None, **kwargs):
+        y_ref, grad_ref = run_layer(make_layer(layer_type, "euler"), self.x, hx)
+        y, grad = run_layer(make_layer(layer_type, integration, **kwargs), self.x, hx)
+        self.assertTrue(torch.allclose(y, y_ref, atol=1e-5))
+        self.assertTrue(torch.allclose(grad, grad_ref, atol=1e-4))
+
+    def hx_data(self):
+        traces = torch.rand(4, 50, 16)
+        traces[:, 0, :] = 0
+        spikes = (torch.rand(4, 50, 16) > 0.9).float()
+        return spikes, traces
+
+    def test_li_scan(self):
+        self.assert_matches_euler(LILayer, "scan")
+
+    def test_li_scan_hx(self):
+        self.assert_matches_euler(LILayer, "scan", hx=self.hx_data())
+
+    def test_lif_scan(self):
+        self.assert_matches_euler(LIFLayer, "scan")
+
+    def test_lif_scan_hx(self):
+        self.assert_matches_euler(LIFLayer, "scan", hx=self.hx_data())
+
+    def test_lif_fused(self):
+        self.assert_matches_euler(LIFLayer, "fused")
+
+    def test_lif_fused_hx(self):
+        self.assert_matches_euler(LIFLayer, "fused", hx=self.hx_data())
+
+    def test_li_checkpoint(self):
+        self.assert_matches_euler(LILayer, "euler", checkpoint_steps=7)
+
+    def test_lif_checkpoint(self):
+        self.assert_matches_euler(LIFLayer, "euler", checkpoint_steps=7)
+
+    def test_lif_checkpoint_hx(self):
+        self.assert_matches_euler(LIFLayer, "euler", hx=self.hx_data(), checkpoint_steps=7)
+
+    def test_recurrent_checkpoint_hx(self):
+        self.assert_matches_euler(RecurrentLIFLayer, "euler", hx=self.hx_data(), checkpoint_steps=7)
+
+    def test_lif_event(self):
+        x = self.x.clone()
+        x[:, 10:30, :] = 0
+        reference = make_layer(LIFLayer, "euler")
+        layer = make_layer(LIFLayer, "event").eval()
+        with torch.no_grad():
+            self.assertTrue(torch.equal(layer(x), reference(x)))
+
+    def test_lif_event_sparse(self):
+        reference = make_layer(LIFLayer, "euler")
+        layer = make_layer(LIFLayer, "event", sparse_spikes=True).eval()
+        with torch.no_grad():
+            self.assertTrue(torch.equal(layer(self.x).to_dense(), reference(self.x)))
+
+    def test_recurrent_checkpoint(self):
+        self.assert_matches_euler(RecurrentLIFLayer, "euler", checkpoint_steps=7)
+
+    def test_recurrent_sparse(self):
+        self.assert_matches_euler(RecurrentLIFLayer, "euler", sparse_threshold=1.0)
+
+    def test_recurrent_sparse_hx(self):
+        self.assert_matches_euler(RecurrentLIFLayer, "euler", hx=self.hx_data(), sparse_threshold=1.0)
+
+
+class TestPrecision(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1234)
+        self.x = 0.5 * (torch.rand(4, 50, 16) > 0.8).float()
+
+    def test_lif_bfloat16(self):
+        layer = make_layer(LIFLayer, "euler")
+        layer.precision = Precision(traces=torch.bfloat16)
+        y, grad = run_layer(layer, self.x)
+        self.assertEqual(y.dtype, torch.bfloat16)
+        self.assertEqual(grad.dtype, self.x.dtype)
+
+    def test_recurrent_half_precision(self):
+        for dtype in (torch.bfloat16, torch.float16):
+            # a threshold of one always takes the sparse projection
+            for sparse_threshold in (None, 1.0):
+                layer = make_layer(RecurrentLIFLayer, "euler", sparse_threshold=sparse_threshold)
+                layer.precision = Precision(traces=dtype)
+                y, grad = run_layer(layer, self.x)
+                self.assertEqual(y.dtype, dtype)
+                self.assertEqual(grad.dtype, self.x.dtype)
+                self.assertTrue(torch.isfinite(grad).all())
+
+                weight_grad = layer.recurrent_projection.weight.grad
+                self.assertEqual(weight_grad.dtype, torch.float32)
+                self.assertTrue(torch.isfinite(weight_grad).all())
+
+    def test_hx_uint8_spikes(self):
+        spikes = (torch.rand(4, 50, 16) > 0.9).to(torch.uint8)
+        traces = torch.rand(4, 50, 16, dtype=torch.float16)
+        traces[:, 0, :] = 0
+        layer = make_layer(LIFLayer, "euler")
+        y, grad = run_layer(layer, self.x, hx=(spikes, traces))
+        self.assertTrue(torch.equal(y, spikes.float()))
+
+    def test_linear_uint8_input(self):
+        projection = Linear(16, 8)
+        y = projection((self.x > 0).to(torch.uint8))
+        self.assertTrue(torch.allclose(y, projection(self.x > 0)))
+
+
+class TestNeuronParameters(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1234)
+        self.x = 0.5 * (torch.rand(4, 50, 16) > 0.8).float()
+        self.params = {"tau_mem": torch.linspace(3e-6, 12e-6, 16), "tau_syn": torch.linspace(12e-6, 3e-6, 16)}
+
+    def make_layer(self, layer_type, integration, params, **kwargs):
+        if layer_type is RecurrentLIFLayer:
+            torch.manual_seed(42)
+            layer = layer_type(16, params, Linear(16, 16), **kwargs)
+        else:
+            layer = layer_type(16, params, integration=integration, **kwargs)
+        layer.time_step = TIME_STEP
+        return layer
+
+    def test_shared_values(self):
+        params = {"tau_mem": torch.full((16, ), PARAMS["tau_mem"]), "tau_syn": [PARAMS["tau_syn"]] * 16}
+        for layer_type in (LILayer, LIFLayer, RecurrentLIFLayer):
+            y_ref, grad_ref = run_layer(self.make_layer(layer_type, "euler", PARAMS), self.x)
+            y, grad = run_layer(self.make_layer(layer_type, "euler", params), self.x)
+            self.assertTrue(torch.allclose(y, y_ref, atol=1e-5))
+            self.assertTrue(torch.allclose(grad, grad_ref, atol=1e-4))
+
+    def test_per_neuron_integrations(self):
+        for layer_type, integration in ((LILayer, "scan"), (LIFLayer, "scan"), (LIFLayer, "fused")):
+            y_ref, grad_ref = run_layer(self.make_layer(layer_type, "euler", self.params), self.x)
+            y, grad = run_layer(self.make_layer(layer_type, integration, self.params), self.x)
+            self.assertTrue(torch.allclose(y, y_ref, atol=1e-5))
+            self.assertTrue(torch.allclose(grad, grad_ref, atol=1e-4))
+
+    def test_cached_decays(self):
+        layer = self.make_layer(LIFLayer, "euler", self.params)
+        decays = layer.decay_factors()
+        self.assertIs(layer.decay_factors(), decays)
+        layer.time_step = 2 * TIME_STEP
+        self.assertIsNot(layer.decay_factors(), decays)
+
+    def test_refractoriness(self):
+        refractory_steps = torch.arange(16) % 4
+        params = dict(PARAMS, refractory_time=refractory_steps * TIME_STEP)
+        x = 4 * self.x
+        for layer_type in (LIFLayer, RecurrentLIFLayer):
+            y, _ = run_layer(self.make_layer(layer_type, "euler", params), x)
+            self.assertTrue(y.sum() > 0)
+            for batch, t, unit in torch.nonzero(y):
+                n = int(refractory_steps[unit])
+                self.assertEqual(y[batch, t + 1:t + 1 + n, unit].sum(), 0)
+
+        # without refractory steps, the reference dynamics are recovered
+        params = dict(PARAMS, refractory_time=0.0)
+        y_ref, _ = run_layer(self.make_layer(LIFLayer, "euler", PARAMS), x)
+        y, _ = run_layer(self.make_layer(LIFLayer, "euler", params), x)
+        self.assertTrue(torch.equal(y, y_ref))
+
+    def test_invalid_shape(self):
+        layer = self.make_layer(LIFLayer, "euler", {"tau_mem": torch.ones(3), "tau_syn": 1.0})
+        with self.assertRaises(ValueError):
+            layer(self.x)
+
+    def test_sub_populations(self):
+        # calibration targets of sub-populations are rejected instead of failing on the conversion to float
+        populations = {0: 1e-6, 32: 20e-6}
+        for layer_type in (LIFLayer, RecurrentLIFLayer):
+            for name in ("tau_mem", "tau_syn", "refractory_time"):
+                layer = self.make_layer(layer_type, "euler", dict(PARAMS, **{name: populations}))
+                with self.assertRaises(ValueError):
+                    layer(self.x)
+
+
+class TestAdjoint(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1234)
+        self.x = 0.5 * (torch.rand(4, 50, 16) > 0.8).float()
+
+    def test_forward(self):
+        y_ref, _ = run_layer(make_layer(LIFLayer, "euler"), self.x)
+        y, grad = run_layer(make_layer(LIFLayer, "euler", gradient="adjoint"), self.x)
+        self.assertTrue(torch.equal(y, y_ref))
+        self.assertEqual(grad.shape, self.x.shape)
+
+    def test_hx(self):
+        spikes = (torch.rand(4, 50, 16) > 0.9).float()
+        traces = torch.rand(4, 50, 16)
+        traces[:, 0, :] = 0
+        y, grad = run_layer(make_layer(LIFLayer, "euler", gradient="adjoint"), self.x, hx=(spikes, traces))
+        self.assertTrue(torch.equal(y, spikes))
+        self.assertTrue(torch.isfinite(grad).all())
+
+    def test_spike_time_gradient(self):
+        x = torch.zeros(1, 50, 2)
+        x[:, 2, :] = torch.tensor([0.6, 0.1])
+        x.requires_grad_(True)
+        layer = make_layer(LIFLayer, "euler", gradient="adjoint")
+        y = layer(x)
+        self.assertEqual(y[0, :, 0].sum(), 1)
+
+        # penalizing late spikes pushes the input of the spiking unit up, the silent unit gets no gradient
+        (y * torch.arange(50.0)[None, :, None]).sum().backward()
+        self.assertTrue(x.grad[0, 2, 0] < 0)
+        self.assertTrue((x.grad[0, :, 1] == 0).all())
+
+    def test_memory(self):
+        def saved_elements(**kwargs):
+            layer = make_layer(LIFLayer, "euler", **kwargs)
+            x = self.x.clone().requires_grad_(True)
+            numel = []
+            with torch.autograd.graph.saved_tensors_hooks(lambda t: numel.append(t.numel()) or t, lambda t: t):
+                y = layer(x)
+            return sum(numel), int(y.sum())
+
+        saved_adjoint, n_spikes = saved_elements(gradient="adjoint")
+        saved_surrogate, _ = saved_elements()
+        self.assertEqual(saved_adjoint, 4 * n_spikes)
+        self.assertTrue(saved_adjoint < saved_surrogate)
@@ -0,0 +1,148 @@
+import threading
+import time
+import unittest
+
+import numpy as np
+import torch
+
+from strobe.emulation import EmulatedStrobeBackend
+from strobe.lif import LIFLayer, LILayer
+from strobe.nn import Network
+from strobe.parallel import DataParallelBackend
+from strobe.planning import HWBatchPlan
+from strobe.projections import Linear
+from strobe.structure import LayerSize
+
+
+class MockBackend:
+    structure = [4, 2]
+
+    def __init__(self, max_hw_batch_size=8, delay=0.05):
+        self.max_hw_batch_size = max_hw_batch_size
+        self.delay = delay
+        self.batches = []
+        self.weights = []
+        self.threads = set()
+
+    def write_weights(self, *weights, dirty_rows_only=True):
+        self.weights.append(weights)
+
+    def plan_hw_batch(self, n_samples, record_madc=False, record_traces=True):
+        return HWBatchPlan(self.max_hw_batch_size, 1e-3)
+
+    def run(
+            self, input_spikes, n_samples=None, duration=None, measure_power=False, trigger_reset=False,
+            record_madc=False, record_traces=True):
+        # stands in for the execution on chip, the batch is identified by its samples
+        self.threads.add(threading.get_ident())
+        self.batches.append(list(input_spikes))
+        time.sleep(self.delay)
+        spikes = [list(input_spikes)]
+        traces = [np.array(input_spikes, dtype=float)[:, np.newaxis, np.newaxis]]
+        return spikes, traces, [0, 0], []
+
+    def run_pipelined(self, batches, **kwargs):
+        return [self.run(b, **kwargs) for b in batches]
+
+
+class TestDataParallelBackend(unittest.TestCase):
+    def setUp(self):
+        self.batches = [list(range(i, i + 4)) for i in range(0, 32, 4)]
+
+    def test_order(self):
+        for schedule, pipelined in (("load", False), ("round_robin", False), ("round_robin", True)):
+            backends = [MockBackend() for i in range(3)]
+            parallel = DataParallelBackend(backends, schedule=schedule, pipelined=pipelined)
+            results = parallel.run_pipelined(self.batches, n_samples=10)
+            self.assertEqual([r[0][0] for r in results], self.batches)
+            self.assertEqual(sum(len(b.batches) for b in backends), len(self.batches))
+
+    def test_round_robin(self):
+        backends = [MockBackend() for i in range(3)]
+        DataParallelBackend(backends, schedule="round_robin").run_pipelined(self.batches, n_samples=10)
+        for i, backend in enumerate(backends):
+            self.assertEqual(backend.batches, self.batches[i::3])
+
+    def test_load(self):
+        # a slow chip receives fewer batches
+        backends = [MockBackend(delay=0.2), MockBackend(delay=0.02)]
+        DataParallelBackend(backends).run_pipelined(self.batches, n_samples=10)
+        self.assertLess(len(backends[0].batches), len(backends[1].batches))
+
+    def test_concurrency(self):
+        backends = [MockBackend() for i in range(4)]
+        start = time.time()
+        DataParallelBackend(backends).run_pipelined(self.batches, n_samples=10)
+        duration = time.time() - start
+
+        # sequential execution takes 8 * 0.05 s
+        self.assertLess(duration, 0.3)
+        self.assertEqual(len(set.union(*[b.threads for b in backends])), 4)
+
+    def test_run(self):
+        backends = [MockBackend(max_hw_batch_size=4) for i in range(2)]
+        parallel = DataParallelBackend(backends)
+        spikes, traces, durations, _ = parallel.run(list(range(16)), n_samples=10)
+        self.assertEqual(spikes[0], list(range(16)))
+        self.assertTrue(np.array_equal(traces[0][:, 0, 0], np.arange(16)))
+        self.assertTrue(all(len(b.batches) > 0 for b in backends))
+
+        # small batches are passed to the backends in turns
+        parallel.run([0], n_samples=10)
+        parallel.run([1], n_samples=10)
+        self.assertEqual(backends[0].batches[-1], [0])
+        self.assertEqual(backends[1].batches[-1], [1])
+
+    def test_broadcast(self):
+        backends = [MockBackend() for i in range(3)]
+        parallel = DataParallelBackend(backends)
+        parallel.write_weights(np.ones((4, 2)))
+        self.assertTrue(all(len(b.weights) == 1 for b in backends))
+
+    def test_plan(self):
+        parallel = DataParallelBackend([MockBackend(8), MockBackend(5)])
+        self.assertEqual(parallel.plan_hw_batch(10).size, 5)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            DataParallelBackend([])
+        with self.assertRaises(ValueError):
+            DataParallelBackend([MockBackend()], schedule="load", pipelined=True)
+
+
+class TestEmulatedDataParallel(unittest.TestCase):
+    def test_backends(self):
+        structure = [4, LayerSize(6), LayerSize(2)]
+        weights = (np.full((4, 6), 63), np.full((6, 2), 63))
+        random = np.random.default_rng(1234)
+        inputs = []
+        for b in range(10):
+            times = np.sort(random.uniform(0, 15e-6, 8))
+            inputs.append(np.stack([times, random.integers(0, 4, 8) + 256], axis=1))
+
+        single = EmulatedStrobeBackend(None, structure)
+        parallel = DataParallelBackend([EmulatedStrobeBackend(None, structure) for i in range(3)])
+        single.write_weights(*weights)
+        parallel.write_weights(*weights)
+
+        spikes_ref, traces_ref, _, _ = single.run(inputs, n_samples=20)
+        spikes, traces, _, _ = parallel.run(inputs, n_samples=20)
+        for l in range(2):
+            self.assertTrue(np.array_equal(traces[l], traces_ref[l]))
+            for s, s_ref in zip(spikes[l], spikes_ref[l]):
+                self.assertTrue(np.array_equal(s, s_ref))
+
+    def test_network(self):
+        params = {"tau_mem": 6e-6, "tau_syn": 6e-6}
+        x = (torch.rand(12, 30, 10, generator=torch.Generator().manual_seed(1)) > 0.8).float()
+
+        outputs = []
+        for connections in ([None], [None, None, None]):
+            torch.manual_seed(1234)
+            network = Network(Linear(10, 20), LIFLayer(20, params), Linear(20, 3), LILayer(3, params))
+            network.connect(connections, dict(params), emulate=True)
+            outputs.append((network(x), network[1].spikes))
+
+        self.assertIsInstance(network.backend, DataParallelBackend)
+        self.assertTrue(torch.equal(outputs[0][0], outputs[1][0]))
+        self.assertTrue(torch.equal(outputs[0][1], outputs[1][1]))
@@ -0,0 +1,101 @@
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+
+from strobe.pipeline import run_pipelined
+
+try:
+    from strobe import backend as strobe_backend
+except ImportError:
+    strobe_backend = None
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.executed = []
+
+    def build(self, batch):
+        time.sleep(0.05)
+        return batch
+
+    def execute(self, pending):
+        # stands in for `stadls.run`, blocking while the chip executes
+        self.executed.append((pending, threading.get_ident()))
+        time.sleep(0.05)
+        return pending * 2
+
+    def decode(self, pending, result):
+        time.sleep(0.05)
+        return pending, result
+
+    def test_order(self):
+        results = run_pipelined(self.build, self.execute, self.decode, list(range(8)))
+        self.assertEqual(results, [(b, 2 * b) for b in range(8)])
+        self.assertEqual([p for p, _ in self.executed], list(range(8)))
+        self.assertEqual({t for _, t in self.executed}, {threading.get_ident()})
+
+    def test_overlap(self):
+        start = time.time()
+        run_pipelined(self.build, self.execute, self.decode, list(range(8)))
+        duration = time.time() - start
+
+        # sequential processing takes 8 * 0.15 s, pipelined about (8 + 2) * 0.05 s
+        self.assertLess(duration, 0.9)
+
+    def test_empty(self):
+        self.assertEqual(run_pipelined(self.build, self.execute, self.decode, []), [])
+
+
+@unittest.skipIf(strobe_backend is None, "requires the BrainScaleS-2 software stack")
+class TestBackendPipeline(unittest.TestCase):
+    def setUp(self):
+        # no chip is configured, all stages touching the hardware are replaced
+        self.backend = strobe_backend.StrobeBackend(None, [20, 30, 5], {"cadc": None, "neuron": None})
+        self.stages = []
+        self.lock = threading.Lock()
+
+    def record(self, stage, batch, start):
+        with self.lock:
+            self.stages.append((stage, batch, start, time.time(), threading.get_ident()))
+
+    def build(self, input_spikes, *args):
+        start = time.time()
+        time.sleep(0.05)
+        self.record("build", input_spikes, start)
+        return types.SimpleNamespace(program=input_spikes)
+
+    def run_program(self, connection, program):
+        start = time.time()
+        time.sleep(0.05)
+        self.record("execute", program, start)
+
+    def decode(self, pending, baseline):
+        start = time.time()
+        time.sleep(0.05)
+        self.record("decode", pending.program, start)
+        return pending.program, baseline
+
+    def intervals(self, stage):
+        return {batch: (start, end, thread) for s, batch, start, end, thread in self.stages if s == stage}
+
+    def test_pipelined(self):
+        batches = list(range(6))
+        with mock.patch.object(self.backend, "_build_program", self.build), \
+                mock.patch.object(self.backend, "_decode", self.decode), \
+                mock.patch.object(strobe_backend.stadls, "run", self.run_program):
+            results = self.backend.run_pipelined(batches, n_samples=20)
+
+        self.assertEqual(results, [(b, None) for b in batches])
+
+        built, executed, decoded = self.intervals("build"), self.intervals("execute"), self.intervals("decode")
+        self.assertEqual(sorted(executed, key=lambda b: executed[b][0]), batches)
+        self.assertEqual({t for _, _, t in executed.values()}, {threading.get_ident()})
+        self.assertNotIn(threading.get_ident(), {t for _, _, t in built.values()})
+        self.assertNotIn(threading.get_ident(), {t for _, _, t in decoded.values()})
+
+        for b in batches[:-1]:
+            # the next batch is built and the current one decoded while the chip executes
+            self.assertLess(built[b + 1][0], executed[b][1])
+            self.assertLess(executed[b + 1][0], decoded[b][1])
@@ -0,0 +1,41 @@
+import unittest
+
+from strobe.planning import FPGA_MEMORY_SIZE, MAX_MADC_DURATION, MAX_PROGRAM_DURATION, plan_hw_batch, program_duration
+
+
+class TestPlanning(unittest.TestCase):
+    def test_fpga_memory(self):
+        plan = plan_hw_batch(32, 2, 100e-6)
+        self.assertEqual(plan.size, FPGA_MEMORY_SIZE // (32 * 2 * 128))
+        self.assertEqual(plan.duration, program_duration(plan.size, 100e-6))
+
+    def test_correlation(self):
+        self.assertEqual(plan_hw_batch(32, 2, 100e-6, measure_correlation=True).size, 16 // 16)
+        self.assertEqual(plan_hw_batch(4, 1, 100e-6, measure_correlation=True).size, 256 // 16)
+
+    def test_madc(self):
+        plan = plan_hw_batch(1, 1, 1e-3, record_madc=True)
+        self.assertTrue(plan.duration <= MAX_MADC_DURATION + 1e-3)
+        self.assertTrue(program_duration(plan.size + 1, 1e-3) > MAX_MADC_DURATION)
+
+    def test_infeasible(self):
+        with self.assertRaises(ValueError):
+            plan_hw_batch(FPGA_MEMORY_SIZE, 1, 100e-6)
+
+    def test_spikes_only(self):
+        # without traces, the size is that of the traced plan recording a single CADC vector
+        plan = plan_hw_batch(32, 2, 100e-6, record_traces=False)
+        self.assertEqual(plan.size, FPGA_MEMORY_SIZE // (32 * 128))
+        self.assertEqual(plan.size, plan_hw_batch(32, 1, 100e-6).size)
+        self.assertTrue(plan.size > plan_hw_batch(32, 2, 100e-6).size)
+        self.assertTrue(plan.duration <= MAX_PROGRAM_DURATION)
+
+        # samples which can not be traced are not planned without traces either
+        with self.assertRaises(ValueError):
+            plan_hw_batch(FPGA_MEMORY_SIZE, 1, 100e-6, record_traces=False)
+
+    def test_spikes_only_timer(self):
+        # long samples are still bounded by the timer
+        plan = plan_hw_batch(32, 2, 2.0, record_traces=False)
+        self.assertTrue(plan.size < FPGA_MEMORY_SIZE // (32 * 128))
+        self.assertTrue(plan.duration <= MAX_PROGRAM_DURATION)
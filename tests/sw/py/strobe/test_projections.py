@@ -0,0 +1,69 @@
+import unittest
+
+import torch
+
+from strobe.lif import LIFLayer
+from strobe.projections import Dropout, Linear, SigmoidalWeights, weight_version
+
+
+class TestSparseInput(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1234)
+        self.x = (torch.rand(4, 50, 16) > 0.95).float()
+
+    def test_projections(self):
+        for projection in (Linear(16, 8), SigmoidalWeights(16, 8)):
+            y_ref = projection(self.x)
+            grad_ref, = torch.autograd.grad(y_ref.sum(), projection.parameters())
+
+            y = projection(self.x.to_sparse())
+            grad, = torch.autograd.grad(y.sum(), projection.parameters())
+            self.assertFalse(y.is_sparse)
+            self.assertTrue(torch.allclose(y, y_ref, atol=1e-6))
+            self.assertTrue(torch.allclose(grad, grad_ref, atol=1e-5))
+
+    def test_dropout(self):
+        dropout = Dropout(0.5, 16)
+        dropout.step()
+        y = dropout(self.x.to_sparse())
+        self.assertTrue(y.is_sparse)
+        self.assertTrue(torch.equal(y.to_dense(), dropout(self.x)))
+
+    def test_lif(self):
+        layer = LIFLayer(16, {"tau_mem": 6e-6, "tau_syn": 6e-6})
+        layer.time_step = 1.7e-6
+        self.assertTrue(torch.equal(layer(self.x.to_sparse()), layer(self.x)))
+
+    def test_injected_sparse_spikes(self):
+        spikes = (torch.rand(4, 50, 16) > 0.9).float()
+        traces = torch.rand(4, 50, 16)
+        traces[:, 0, :] = 0
+        layer = LIFLayer(16, {"tau_mem": 6e-6, "tau_syn": 6e-6})
+        layer.inject(spikes.to_sparse(), traces, {"tau_mem": 6e-6, "tau_syn": 6e-6}, 1.7e-6)
+
+        layer.eval()
+        self.assertTrue(layer(self.x).is_sparse)
+
+        layer.train()
+        self.assertTrue(torch.equal(layer(self.x), spikes))
+
+
+class TestWeightVersion(unittest.TestCase):
+    def test_changes(self):
+        model = torch.nn.Sequential(Linear(16, 8), Dropout(0.5, 8), SigmoidalWeights(8, 4))
+        version = weight_version(model.modules())
+        self.assertEqual(weight_version(model.modules()), version)
+
+        # optimizer steps modify weights in place
+        optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+        model(torch.rand(2, 5, 16)).sum().backward()
+        optimizer.step()
+        self.assertNotEqual(weight_version(model.modules()), version)
+
+        version = weight_version(model.modules())
+        model[1].step()
+        self.assertNotEqual(weight_version(model.modules()), version)
+
+        version = weight_version(model.modules())
+        model[0].scale = 2.0
+        self.assertNotEqual(weight_version(model.modules()), version)
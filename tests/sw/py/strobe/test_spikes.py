@@ -0,0 +1,147 @@
+import unittest
+
+import numpy as np
+import torch
+
+from strobe.spikes import PixelsToSpikeTimes, SpikeTimesToDense, SpikeTrains, dissect_spikes
+
+
+class TestPixelsToSpikeTimes(unittest.TestCase):
+    def test_reference(self):
+        torch.manual_seed(1234)
+        x = torch.rand(8, 1, 16, 16)
+        encoder = PixelsToSpikeTimes(tau=20, threshold=0.2, t_max=1.0)
+
+        # reference encoding evaluated in numpy
+        pixels = x[:, 0].numpy()
+        clipped = np.clip(pixels, 0.2 + 1e-7, 1e9)
+        expected = 20 * np.log(clipped / (clipped - 0.2))
+        expected[pixels < 0.2] = 1.0
+        expected = np.clip(expected, 0, 1.0)
+
+        times = encoder(x)
+        self.assertEqual(times.device, x.device)
+        self.assertTrue(np.allclose(times.numpy(), expected, atol=1e-6))
+
+
+class TestSpikeTimesToDense(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1234)
+        self.times = torch.rand(8, 4, 5) * 1e-4
+
+    def reference(self, times, n_time_steps):
+        bins = (times / 1e-5).long()
+        dense = torch.zeros((times.shape[0], max(n_time_steps, int(bins.max()) + 1), *times.shape[1:]))
+        for index in np.ndindex(*times.shape):
+            dense[(index[0], bins[index], *index[1:])] = 1
+        return dense[:, :n_time_steps]
+
+    def test_dense(self):
+        for size in (None, 4, 20):
+            encoder = SpikeTimesToDense(1e-5, size)
+            expected = self.reference(self.times, size or 10)
+            self.assertTrue(torch.equal(encoder(self.times), expected))
+
+    def test_dtypes(self):
+        expected = self.reference(self.times, 5)
+        for dtype in (torch.bool, torch.uint8):
+            dense = SpikeTimesToDense(1e-5, 5, dtype=dtype)(self.times)
+            self.assertEqual(dense.dtype, dtype)
+            self.assertTrue(torch.equal(dense.float(), expected))
+
+    def test_sparse(self):
+        sparse = SpikeTimesToDense(1e-5, 5, sparse=True)(self.times)
+        self.assertTrue(sparse.is_sparse)
+        self.assertTrue(torch.equal(sparse.to_dense(), self.reference(self.times, 5)))
+
+
+class TestSpikeTrains(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(1234)
+        self.x = (torch.rand(6, 30, 8) > 0.9).float()
+        self.x[3] = 0
+
+    def reference(self, b):
+        spike_bins = np.where(self.x[b].T)
+        labels = spike_bins[0] + 256
+        times = spike_bins[1].astype(float) * 1e-6 + 2e-6
+        order = np.argsort(times, kind="stable")
+        return np.vstack([times[order], labels[order]]).T
+
+    def assert_same_events(self, events, expected):
+        # events have to be sorted by time, the order within a time step is arbitrary
+        self.assertTrue((np.diff(events[:, 0]) >= 0).all())
+        self.assertTrue(np.allclose(events[np.lexsort(events.T)], expected[np.lexsort(expected.T)]))
+
+    def test_from_tensor(self):
+        for x in (self.x, self.x.to_sparse()):
+            trains = SpikeTrains.from_tensor(x, 1e-6, 2e-6, 256)
+            self.assertEqual(len(trains), 6)
+            for b in range(6):
+                self.assert_same_events(trains[b], self.reference(b))
+
+    def test_slicing(self):
+        trains = SpikeTrains.from_tensor(self.x, 1e-6, 2e-6, 256)
+        sub_batch = trains[2:5]
+        self.assertEqual(len(sub_batch), 3)
+        for b in range(3):
+            self.assert_same_events(sub_batch[b], self.reference(b + 2))
+        self.assertEqual(len(trains[3]), 0)
+
+    def test_from_events(self):
+        times = np.random.rand(2, 5)
+        samples = np.repeat(np.arange(2), 10)
+        labels = np.tile(np.arange(10) + 256, 2)
+        trains = SpikeTrains.from_events(samples, np.tile(times, 2).flatten(), labels, 2)
+        for b in range(2):
+            expected = np.hstack(2 * [times[b]])
+            order = np.argsort(expected, kind="stable")
+            self.assertTrue(np.array_equal(trains[b], np.vstack([expected[order], np.arange(10)[order] + 256]).T))
+
+
+class TestDissectSpikes(unittest.TestCase):
+    def reference(self, raw_spikes, hw_batch_size, sample_separation, boundaries):
+        # per-sample and per-layer masking as previously done in `StrobeBackend._decode`
+        spikes = [[] for l in range(len(boundaries) - 1)]
+        for b in range(hw_batch_size):
+            b_begin = b * sample_separation
+            b_end = (b + 1) * sample_separation
+            mask = (raw_spikes[:, 0] > b_begin) & (raw_spikes[:, 0] < b_end)
+            dissected_spikes = raw_spikes[mask, :]
+            for l in range(len(boundaries) - 1):
+                layer_mask = (dissected_spikes[:, 1] >= boundaries[l]) & (dissected_spikes[:, 1] < boundaries[l + 1])
+                s = dissected_spikes[layer_mask, :]
+                s[:, 0] -= b_begin
+                s[:, 1] -= boundaries[l]
+                spikes[l].append(s)
+        return spikes
+
+    def test_reference(self):
+        random = np.random.default_rng(1234)
+        times = np.sort(random.uniform(-20e-6, 11 * 50e-6, 2000))
+
+        # spikes on the window edges are dropped
+        times[::100] = np.round(times[::100] / 50e-6) * 50e-6
+        labels = random.integers(0, 30, len(times)).astype(float)
+        raw_spikes = np.stack([times, labels], axis=1)
+        boundaries = np.array([0, 12, 20, 25])
+
+        expected = self.reference(raw_spikes.copy(), 10, 50e-6, boundaries)
+        spikes = dissect_spikes(raw_spikes, 10, 50e-6, boundaries)
+        self.assertEqual(len(spikes), 3)
+        for l in range(3):
+            self.assertEqual(len(spikes[l]), 10)
+            for s, s_ref in zip(spikes[l], expected[l]):
+                self.assertTrue(np.array_equal(s, s_ref))
+
+    def test_views(self):
+        raw_spikes = np.array([[1e-6, 0], [2e-6, 3], [51e-6, 1], [52e-6, 4]])
+        spikes = dissect_spikes(raw_spikes, 2, 50e-6, [0, 3, 5])
+        self.assertTrue(np.allclose(spikes[1][1], [[2e-6, 1]]))
+        self.assertIs(spikes[0][0].base, spikes[1][1].base)
+        self.assertEqual(raw_spikes[2, 0], 51e-6)
+
+    def test_empty(self):
+        spikes = dissect_spikes(np.empty((0, 2)), 3, 50e-6, [0, 3, 5])
+        self.assertTrue(all(len(s) == 0 for layer in spikes for s in layer))
+        self.assertEqual([len(layer) for layer in spikes], [3, 3])
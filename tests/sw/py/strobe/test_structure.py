@@ -0,0 +1,39 @@
+import unittest
+
+import numpy as np
+
+from strobe.structure import LayerSize, layer_boundaries, structure_key, unroll_weights
+
+
+class TestStructure(unittest.TestCase):
+    def test_key(self):
+        self.assertEqual(structure_key([4, LayerSize(6), 2]), structure_key([4, 6, LayerSize(2)]))
+        self.assertNotEqual(structure_key([4, 6, 2]), structure_key([4, LayerSize(6, recurrent=True), 2]))
+        self.assertNotEqual(structure_key([4, 6, 2]), structure_key([4, 6, LayerSize(2, spiking=False)]))
+        self.assertEqual(len({structure_key([4, 6, 2]), structure_key([4, 6, 2])}), 1)
+
+    def test_boundaries(self):
+        self.assertTrue(np.array_equal(layer_boundaries([4, 6, 2]), [0, 6, 8]))
+
+    def test_unroll(self):
+        weights = (np.ones((4, 6), dtype=int), 2 * np.ones((6, 2), dtype=int))
+        weights_unrolled, offsets_unrolled = unroll_weights([4, 6, 2], weights)
+        self.assertTrue((weights_unrolled[:4, :6] == 1).all())
+        self.assertTrue((offsets_unrolled[:4, :6] == 1).all())
+        self.assertTrue((weights_unrolled[:6, 6:8] == 2).all())
+        self.assertTrue((offsets_unrolled[:6, 6:8] == 0).all())
+        self.assertEqual(weights_unrolled.sum(), 4 * 6 + 2 * 6 * 2)
+
+        with self.assertRaises(IndexError):
+            unroll_weights([4, 6, 2], (np.ones((3, 6)), np.ones((6, 2))))
+
+    def test_unroll_recurrent(self):
+        structure = [4, LayerSize(6, recurrent=True), 2]
+        weights = (np.vstack([np.ones((4, 6)), 3 * np.ones((6, 6))]), 2 * np.ones((6, 2)))
+        weights_unrolled, offsets_unrolled = unroll_weights(structure, weights, input_shift=6)
+
+        # recurrent weights occupy the rows of the layer itself, inputs are shifted behind them
+        self.assertTrue((weights_unrolled[:6, :6] == 3).all())
+        self.assertTrue((offsets_unrolled[:6, :6] == 0).all())
+        self.assertTrue((weights_unrolled[6:10, :6] == 1).all())
+        self.assertTrue((offsets_unrolled[6:10, :6] == 1).all())